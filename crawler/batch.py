@@ -0,0 +1,124 @@
+import json
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+from .dedup import NearDuplicateIndex
+from .quotas import QUOTA_MAX_WAIT, QuotaExceeded
+from .result_store import RESULT_WRITER
+from .scraper import scrape_page_content, search_web
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_ITEMS = 500
+MAX_BATCH_CONCURRENCY = 16
+DEFAULT_BATCH_CONCURRENCY = 8
+
+
+def parse_batch_items(data):
+    """Turns a request body's "urls"/"keywords" lists into ("url"|"keyword", value) items."""
+    items = []
+    for kind, field in (("url", "urls"), ("keyword", "keywords")):
+        values = data.get(field) or []
+        if not isinstance(values, list):
+            raise ValueError(f"'{field}' must be a list")
+        for value in values:
+            if isinstance(value, str) and value.strip():
+                items.append((kind, value.strip()))
+    if not items:
+        raise ValueError("Please provide a list of urls and/or keywords.")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f"A batch may contain at most {MAX_BATCH_ITEMS} items.")
+    return items
+
+
+def crawl_item(kind, value, search_results, quota=None):
+    """Runs one batch item and returns its result line."""
+    try:
+        with quota.activate() if quota is not None else nullcontext():
+            return _crawl_item(kind, value, search_results)
+    except Exception as e:
+        logger.error(f"❌ Batch item {value} failed: {e}")
+        return {"type": kind, "input": value, "status": "error", "error": str(e)}
+
+
+def _crawl_item(kind, value, search_results):
+    if kind == "keyword":
+        return {"type": kind, "input": value, "status": "success", "links": search_web(value, search_results)}
+    data = scrape_page_content(value)
+    if "error" in data:
+        return {"type": kind, "input": value, "status": "error", "error": data["error"]}
+    return {"type": kind, "input": value, "status": "success", **data}
+
+
+def quota_error(kind, value, error):
+    return {
+        "type": kind, "input": value, "status": "error", "error": str(error),
+        "retry_after": round(error.retry_after, 1) if error.retry_after else None,
+    }
+
+
+def collapse_duplicate(result, original):
+    """Replaces a near-duplicate page's content with a pointer to the first copy."""
+    collapsed = {key: result[key] for key in ("type", "input", "url", "headline") if key in result}
+    return dict(collapsed, status="duplicate", duplicate_of=original)
+
+
+def run_batch(items, concurrency=DEFAULT_BATCH_CONCURRENCY, search_results=100, dedupe=None, quota=None):
+    """Crawls items concurrently and yields each result as soon as it completes.
+
+    dedupe="drop" omits pages whose text nearly duplicates an earlier result; "collapse" keeps a stub.
+    With a UserQuota, each item is admitted (waiting briefly for rate tokens) before it starts.
+    """
+    duplicates = NearDuplicateIndex() if dedupe else None
+    concurrency = max(1, min(concurrency, MAX_BATCH_CONCURRENCY, len(items)))
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-crawl")
+    pending = iter(enumerate(items))
+    running = {}
+
+    def start(index, kind, value):
+        """Submits an item, or returns its quota error line without running it."""
+        if quota is not None:
+            try:
+                quota.admit(wait=QUOTA_MAX_WAIT)
+            except QuotaExceeded as e:
+                return quota_error(kind, value, e)
+        running[executor.submit(crawl_item, kind, value, search_results, quota)] = index
+        return None
+
+    try:
+        for index, (kind, value) in pending:
+            rejected = start(index, kind, value)
+            if rejected is not None:
+                yield dict(rejected, index=index)
+            if len(running) >= concurrency:
+                break
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                result = future.result()
+                if duplicates is not None and result.get("text_content"):
+                    original = duplicates.check(result["text_content"], result["input"])
+                    if original is not None:
+                        result = None if dedupe == "drop" else collapse_duplicate(result, original)
+                if result is not None:
+                    yield dict(result, index=index)
+                RESULT_WRITER.flush_if_due()
+                if quota is not None:
+                    quota.meter.flush_if_due()
+                for next_index, (kind, value) in pending:
+                    rejected = start(next_index, kind, value)
+                    if rejected is None:
+                        break
+                    yield dict(rejected, index=next_index)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        RESULT_WRITER.flush()
+        if quota is not None:
+            quota.meter.flush()
+
+
+def ndjson_lines(results):
+    for result in results:
+        yield json.dumps(result) + "\n"
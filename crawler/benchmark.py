@@ -0,0 +1,292 @@
+import contextlib
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import psutil
+
+from . import scraper
+from .engine import crawl_site
+from .extract import extract_html
+from .page_cache import PageCache
+from .politeness import SCHEDULER
+from .quotas import METER
+from .result_store import RESULT_WRITER
+
+BENCHMARK_TARGETS = ("crawl_website", "scrape_page_content", "extract_data", "extract_html", "crawl_view")
+RSS_SAMPLE_INTERVAL = 0.01
+BENCHMARK_USER_ID = 999999
+
+WORDS = (
+    "crawler index latency throughput parser network socket buffer render page content link "
+    "search result cache queue worker thread request response header body token stream"
+).split()
+
+
+class SyntheticSite:
+    """Deterministic generated website served from a local ThreadingHTTPServer."""
+
+    def __init__(self, pages=200, fanout=5, page_kb=20, latency_ms=0, js_shell_ratio=0.1, seed=0):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_kb = page_kb
+        self.latency_ms = latency_ms
+        self.js_shell_ratio = js_shell_ratio
+        self.seed = seed
+        self.base_url = None
+        self._server = None
+
+    def is_js_shell(self, n):
+        return n > 0 and random.Random(self.seed * 7919 + n).random() < self.js_shell_ratio
+
+    def _paragraphs(self, n):
+        rng = random.Random(self.seed * 104729 + n)
+        target = self.page_kb * 1024
+        parts, size = [], 0
+        while size < target:
+            paragraph = "<p>" + " ".join(rng.choice(WORDS) for _ in range(60)) + f" page{n}</p>"
+            parts.append(paragraph)
+            size += len(paragraph)
+        return "".join(parts)
+
+    def links(self, n):
+        return [(n * self.fanout + i + 1) % self.pages for i in range(self.fanout)]
+
+    def render(self, n):
+        links = "".join(f'<a href="/p/{target}">Page {target}</a>' for target in self.links(n))
+        if self.is_js_shell(n):
+            state = {"props": {"pageProps": {"article": {"title": f"Page {n}", "body": self._paragraphs(n)[:4000]}}}}
+            return (
+                f"<html><head><title>Page {n}</title></head><body><div id=\"root\"></div>"
+                f"<script id=\"__NEXT_DATA__\" type=\"application/json\">{json.dumps(state)}</script>"
+                f"<script src=\"/static/app.js\"></script>{links}</body></html>"
+            )
+        return (
+            f"<html><head><title>Page {n}</title></head><body><h1>Page {n}</h1>"
+            f"{self._paragraphs(n)}<img src=\"/img/{n}.png\">{links}</body></html>"
+        )
+
+    def url(self, n, run=0):
+        # Distinct query strings per run keep repeated fetches from being answered by the page cache
+        return f"{self.base_url}/p/{n}" + (f"?run={run}" if run else "")
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body go out separately; don't let delayed ACKs add 40ms
+
+            def do_GET(self):
+                if site.latency_ms:
+                    time.sleep(site.latency_ms / 1000)
+                path = self.path.split("?", 1)[0]
+                if path == "/robots.txt":
+                    self._send(200, "User-agent: *\nAllow: /\n", "text/plain")
+                elif path.startswith("/p/") and path[3:].isdigit() and int(path[3:]) < site.pages:
+                    self._send(200, site.render(int(path[3:])), "text/html; charset=utf-8")
+                else:
+                    self._send(404, "", "text/plain")
+
+            def _send(self, status, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ResourceMonitor:
+    """Measures CPU time and samples peak RSS of this process while active."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self.peak_rss = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_rss = self.process.memory_info().rss
+        self._cpu = self.process.cpu_times()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self._started
+        self._stop.set()
+        self._thread.join()
+        cpu = self.process.cpu_times()
+        self.cpu_seconds = (cpu.user - self._cpu.user) + (cpu.system - self._cpu.system)
+
+
+def summarize(latencies, pages, monitor):
+    latencies_ms = np.asarray(latencies, dtype=float) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (0.0, 0.0, 0.0)
+    return {
+        "operations": len(latencies),
+        "pages": pages,
+        "wall_seconds": round(monitor.wall, 4),
+        "pages_per_second": round(pages / monitor.wall, 2) if monitor.wall else None,
+        "latency_ms": {
+            "mean": round(float(latencies_ms.mean()), 3) if len(latencies_ms) else 0.0,
+            "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3),
+        },
+        "cpu_seconds": round(monitor.cpu_seconds, 4),
+        "cpu_percent": round(100 * monitor.cpu_seconds / monitor.wall, 1) if monitor.wall else None,
+        "peak_rss_mb": round(monitor.peak_rss / (1024 * 1024), 2),
+    }
+
+
+def _timed(fn, args_list):
+    latencies = []
+    with ResourceMonitor() as monitor:
+        for args in args_list:
+            started = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - started)
+    return latencies, monitor
+
+
+@contextlib.contextmanager
+def isolated_crawler_state():
+    """Lifts politeness and quota limits and swaps in a throwaway page cache so benchmarks leave nothing behind."""
+    saved_rate = SCHEDULER.default_rate, SCHEDULER.burst
+    saved_cache = scraper.PAGE_CACHE
+    saved_plans = METER.plans
+    SCHEDULER.default_rate, SCHEDULER.burst = 1e9, 1e9
+    SCHEDULER.clear()
+    METER.plans = {plan: dict.fromkeys(limits, 1e12) for plan, limits in saved_plans.items()}
+    METER.clear()
+    with tempfile.TemporaryDirectory() as directory:
+        scraper.PAGE_CACHE = PageCache(directory=directory)
+        try:
+            yield
+        finally:
+            scraper.PAGE_CACHE = saved_cache
+            SCHEDULER.default_rate, SCHEDULER.burst = saved_rate
+            SCHEDULER.clear()
+            METER.plans = saved_plans
+            METER.clear()
+            RESULT_WRITER.clear()
+
+
+def bench_crawl_website(site, repeat):
+    # crawl_website() is a thin wrapper over crawl_site(); calling the engine directly lets us count pages
+    pages = []
+
+    def crawl():
+        result = crawl_site(site.url(0), max_depth=site.pages, max_pages=site.pages)
+        pages.append(len(result["pages"]))
+
+    latencies, monitor = _timed(crawl, [()] * repeat)
+    return summarize(latencies, sum(pages), monitor)
+
+
+def bench_scrape_page_content(site, repeat):
+    urls = [(site.url(n, run),) for run in range(repeat) for n in range(site.pages)]
+    latencies, monitor = _timed(scraper.scrape_page_content, urls)
+    return summarize(latencies, len(urls), monitor)
+
+
+def bench_extract_data(site, repeat):
+    from bs4 import BeautifulSoup
+
+    documents = [(site.render(n), site.url(n)) for n in range(site.pages)] * repeat
+    latencies, monitor = _timed(
+        lambda html, url: scraper.extract_data(BeautifulSoup(html, "html.parser"), url), documents
+    )
+    return summarize(latencies, len(documents), monitor)
+
+
+def bench_extract_html(site, repeat):
+    documents = [(site.render(n), site.url(n)) for n in range(site.pages)] * repeat
+    latencies, monitor = _timed(extract_html, documents)
+    return summarize(latencies, len(documents), monitor)
+
+
+def bench_crawl_view(site, repeat):
+    from django.test import Client
+    from django.utils import timezone
+
+    from .entitlements import invalidate_entitlement
+    from .models import UserSubscription
+
+    UserSubscription.objects.update_or_create(
+        user_id=BENCHMARK_USER_ID, defaults={"status": "active", "trial_end": timezone.now()}
+    )
+    invalidate_entitlement(BENCHMARK_USER_ID)
+    client = Client()
+    bodies = [
+        (json.dumps({"user_id": BENCHMARK_USER_ID, "url": site.url(n, run)}),)
+        for run in range(repeat) for n in range(site.pages)
+    ]
+    latencies, monitor = _timed(lambda body: client.post("/api/crawl/", body, content_type="application/json"), bodies)
+    return summarize(latencies, len(bodies), monitor)
+
+
+BENCHMARKS = {
+    "crawl_website": bench_crawl_website,
+    "scrape_page_content": bench_scrape_page_content,
+    "extract_data": bench_extract_data,
+    "extract_html": bench_extract_html,
+    "crawl_view": bench_crawl_view,
+}
+
+
+def run_benchmarks(targets=BENCHMARK_TARGETS, repeat=1, **site_options):
+    """Runs the selected benchmarks against a fresh synthetic site and returns a JSON-ready report."""
+    site = SyntheticSite(**site_options)
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "site": {
+            "pages": site.pages,
+            "fanout": site.fanout,
+            "page_kb": site.page_kb,
+            "latency_ms": site.latency_ms,
+            "js_shell_ratio": site.js_shell_ratio,
+            "seed": site.seed,
+        },
+        "results": {},
+    }
+    with site:
+        for target in targets:
+            # Each benchmark starts cold: no cached pages, robots.txt or host buckets from the previous one
+            with isolated_crawler_state():
+                report["results"][target] = BENCHMARKS[target](site, repeat)
+    return report
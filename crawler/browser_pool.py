@@ -0,0 +1,233 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import JavascriptException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+from .render import BLOCKED_RESOURCE_PATTERNS, RENDER_TIME_BUDGET
+
+logger = logging.getLogger(__name__)
+
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", 2))
+BROWSER_MAX_USES = int(os.environ.get("BROWSER_MAX_USES", 50))
+BROWSER_CHECKOUT_TIMEOUT = 60
+BROWSER_PAGE_LOAD_TIMEOUT = RENDER_TIME_BUDGET
+BROWSER_WARM_COUNT = int(os.environ.get("BROWSER_WARM_COUNT", 1))
+
+# Session storage lives with the tab, so it is cleared in-page; the origins are then wiped over CDP
+RESET_TAB_SCRIPT = """
+try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}
+const origins = new Set([location.origin]);
+for (const entry of performance.getEntriesByType("resource")) {
+    try { origins.add(new URL(entry.name).origin); } catch (e) {}
+}
+return [...origins].filter(origin => origin.startsWith("http"));
+"""
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path():
+    """Resolves the chromedriver binary once per process (CHROMEDRIVER_PATH wins)."""
+    global _driver_path
+    if _driver_path is None:
+        with _driver_path_lock:
+            if _driver_path is None:
+                _driver_path = os.environ.get("CHROMEDRIVER_PATH") or ChromeDriverManager().install()
+                logger.info(f"🧭 Using chromedriver at {_driver_path}")
+    return _driver_path
+
+
+def chrome_options():
+    """Lightweight render profile: no images, fonts or media, and DOM-ready page loads."""
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--mute-audio")
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.media_stream": 2,
+    })
+    options.page_load_strategy = "eager"
+    return options
+
+
+class BrowserSession:
+    """A live Chrome driver plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+    def _visited_origins(self):
+        """Clears the current tab's web storage and returns the origins it loaded documents or resources from."""
+        try:
+            return self.driver.execute_script(RESET_TAB_SCRIPT) or []
+        except JavascriptException:
+            return []
+
+    def reset(self):
+        """Clears cookies, cache and storage from every site this session touched, leaving one blank tab."""
+        handles = self.driver.window_handles
+        origins = set()
+        for handle in handles[1:]:
+            self.driver.switch_to.window(handle)
+            origins.update(self._visited_origins())
+            self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        origins.update(self._visited_origins())
+        # delete_all_cookies() only reaches the current origin; these clear the whole profile
+        self.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        self.driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        for origin in sorted(origins):
+            self.driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        self.driver.get("about:blank")
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to quit browser session: {e}")
+
+
+class BrowserPool:
+    """Bounded pool of warm headless Chrome sessions with checkout/checkin."""
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_USES, driver_factory=None):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self._driver_factory = driver_factory or self._launch
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._live = 0
+        self._live_lock = threading.Lock()
+        self._closed = False
+
+    @staticmethod
+    def _launch():
+        service = Service(resolve_driver_path())
+        driver = webdriver.Chrome(service=service, options=chrome_options())
+        driver.set_page_load_timeout(BROWSER_PAGE_LOAD_TIMEOUT)
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_PATTERNS})
+        return driver
+
+    def _spawn(self):
+        with self._live_lock:
+            self._live += 1
+        try:
+            return BrowserSession(self._driver_factory())
+        except Exception:
+            with self._live_lock:
+                self._live -= 1
+            raise
+
+    def _retire(self, browser):
+        browser.quit()
+        with self._live_lock:
+            self._live -= 1
+
+    def _checkout(self, timeout):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("No browser session became available")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._spawn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, browser, healthy):
+        try:
+            if healthy and not self._closed and browser.uses < self.max_uses:
+                try:
+                    browser.reset()
+                    self._idle.put(browser)
+                    return
+                except WebDriverException as e:
+                    logger.warning(f"⚠️ Browser reset failed, recycling: {e}")
+            self._retire(browser)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self, timeout=BROWSER_CHECKOUT_TIMEOUT):
+        """Checks out a driver; crashed or worn-out sessions are replaced on checkin."""
+        browser = self._checkout(timeout)
+        healthy = True
+        try:
+            browser.uses += 1
+            yield browser.driver
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            self._checkin(browser, healthy)
+
+    def warm(self, count=1):
+        """Launches sessions ahead of the first render."""
+        resolve_driver_path()
+        for _ in range(min(count, self.size)):
+            with self._live_lock:
+                if self._live >= self.size:
+                    break
+            self._idle.put(self._spawn())
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._retire(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Returns the process-wide browser pool, rebuilding it after a fork."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = BrowserPool()
+                _pool_pid = pid
+    return _pool
+
+
+def warm_in_background(count=BROWSER_WARM_COUNT):
+    """Resolves chromedriver and launches sessions off the boot path, so the first render finds one ready."""
+    def warm():
+        try:
+            get_browser_pool().warm(count)
+            logger.info(f"🔥 Warmed {count} browser session(s)")
+        except Exception as e:
+            logger.warning(f"⚠️ Browser warm-up failed, sessions will start on first render: {e}")
+
+    thread = threading.Thread(target=warm, name="browser-warm", daemon=True)
+    thread.start()
+    return thread
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
@@ -0,0 +1,144 @@
+import hashlib
+import math
+from urllib.parse import unquote_plus, urljoin, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "oly_anon_id", "oly_enc_id",
+    "vero_id", "rb_clickid", "s_cid", "ref_src",
+})
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+
+BLOOM_ERROR_RATE = 0.001
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def remove_dot_segments(path):
+    """Resolves "." and ".." path segments (RFC 3986, section 5.2.4)."""
+    if "." not in path:
+        return path
+    segments = path.split("/")
+    output = []
+    for segment in segments:
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        output.append("")
+    return "/".join(output)
+
+
+def canonical_query(query):
+    """Drops tracking parameters and orders the rest by name, keeping every segment byte-for-byte.
+
+    Segments are never decoded and re-encoded: servers may treat %20 and +, or "?amp" and "?amp=", differently.
+    """
+    segments = [segment for segment in query.split("&") if segment]
+    kept = [segment for segment in segments if not _is_tracking(unquote_plus(segment.split("=", 1)[0]))]
+    # Stable sort on the name only, so repeated parameters keep their relative order
+    return "&".join(sorted(kept, key=lambda segment: segment.split("=", 1)[0]))
+
+
+def canonicalize(url, base=None):
+    """Returns the canonical form of an http(s) URL (resolved against base), or None for other schemes."""
+    url = url.strip()
+    if base:
+        url = urljoin(base, url)
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower().rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+
+    return urlunsplit((scheme, host, remove_dot_segments(parts.path) or "/", canonical_query(parts.query), ""))
+
+
+def fingerprint(url):
+    """64-bit fingerprint of an already-canonical URL."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for capacity items at the given false-positive rate."""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        """Sets key's bits; returns True if at least one bit was unset (key is new)."""
+        added = False
+        for pos in self._positions(key):
+            byte, bit = divmod(pos, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                added = True
+        return added
+
+    def __contains__(self, key):
+        return all(self._bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(key))
+
+
+class SeenSet:
+    """Set of canonical URLs stored as 64-bit fingerprints, or in a Bloom filter when bloom_capacity is given."""
+
+    def __init__(self, urls=(), bloom_capacity=None, error_rate=BLOOM_ERROR_RATE):
+        self._bloom = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else None
+        self._fingerprints = set()
+        self._count = 0
+        for url in urls:
+            self.add(url)
+
+    def add(self, url):
+        """Records a canonical URL; returns True if it had not been seen before."""
+        if self._bloom is not None:
+            added = self._bloom.add(url)
+        else:
+            key = fingerprint(url)
+            added = key not in self._fingerprints
+            self._fingerprints.add(key)
+        self._count += added
+        return added
+
+    def __contains__(self, url):
+        if self._bloom is not None:
+            return url in self._bloom
+        return fingerprint(url) in self._fingerprints
+
+    def __len__(self):
+        return self._count
+
+
+def unique_urls(urls, base=None):
+    """Canonicalizes urls and drops duplicates, keeping first-seen order."""
+    seen = SeenSet()
+    links = []
+    for url in urls:
+        canonical = canonicalize(url, base)
+        if canonical and seen.add(canonical):
+            links.append(canonical)
+    return links
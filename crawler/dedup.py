@@ -0,0 +1,116 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+MAX_SIGNATURE_TOKENS = 2000  # Enough text to tell pages apart without hashing whole books
+MIN_SIGNATURE_TOKENS = 8  # Shorter texts ("No Content Extracted", error pages) are never duplicates
+MINHASH_PERMUTATIONS = 128
+# 32 bands of 4 rows: a pair at Jaccard s shares a band with probability 1 - (1 - s^4)^32, which is
+# ~0.9998 at 0.7 and ~1.0 at SIMILARITY_THRESHOLD. (16x8 found only ~95% at 0.8 and ~61% at 0.7.)
+# Candidates are verified against the threshold, so the extra ones (~23% of pairs at 0.3) only cost a compare.
+LSH_BANDS = 32
+SIMILARITY_THRESHOLD = 0.8
+
+DEDUPE_MODES = ("drop", "collapse")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_PERMUTATION_SEEDS = np.random.default_rng(20240607).integers(
+    0, np.iinfo(np.uint64).max, size=MINHASH_PERMUTATIONS, dtype=np.uint64
+)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_SHINGLE_PRIMES = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9))
+
+
+def _mix(values):
+    """splitmix64 finalizer, vectorized over a uint64 array."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * _MIX_1
+    values = values ^ (values >> np.uint64(27))
+    values = values * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+def shingle_hashes(text):
+    """64-bit hashes of the word 3-grams of text (at most MAX_SIGNATURE_TOKENS words)."""
+    tokens = _TOKEN_RE.findall(text.lower())[:MAX_SIGNATURE_TOKENS]
+    if len(tokens) < MIN_SIGNATURE_TOKENS:
+        return None
+    words = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64, count=len(tokens))
+    count = len(words) - SHINGLE_SIZE + 1
+    with np.errstate(over="ignore"):
+        combined = np.zeros(count, dtype=np.uint64)
+        for offset, prime in enumerate(_SHINGLE_PRIMES):
+            combined ^= words[offset:offset + count] * prime
+        return _mix(combined)
+
+
+def minhash(text):
+    """MinHash signature (MINHASH_PERMUTATIONS uint64 values) of text, or None if it is too short."""
+    hashes = shingle_hashes(text)
+    if hashes is None:
+        return None
+    with np.errstate(over="ignore"):
+        return _mix(hashes[:, None] ^ _PERMUTATION_SEEDS).min(axis=0)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """Banded LSH index over MinHash signatures; finds earlier texts at or above a Jaccard threshold."""
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self._rows = MINHASH_PERMUTATIONS // bands
+        self._buckets = {}
+        self._signatures = []
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self._rows:(band + 1) * self._rows].tobytes()) for band in range(self.bands)]
+
+    def _find(self, signature, band_keys):
+        checked = set()
+        for key in band_keys:
+            for position in self._buckets.get(key, ()):
+                if position in checked:
+                    continue
+                checked.add(position)
+                other, label = self._signatures[position]
+                if similarity(signature, other) >= self.threshold:
+                    return label
+        return None
+
+    def check(self, text, label):
+        """Returns the label of an earlier near-duplicate of text; otherwise indexes text under label and returns None."""
+        signature = minhash(text or "")
+        if signature is None:
+            return None
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            original = self._find(signature, band_keys)
+            if original is not None:
+                return original
+            self._signatures.append((signature, label))
+            for key in band_keys:
+                self._buckets.setdefault(key, []).append(len(self._signatures) - 1)
+        return None
+
+    def __len__(self):
+        return len(self._signatures)
+
+
+def parse_dedupe(value):
+    """Validates a request's "dedupe" option: None, "drop" or "collapse"."""
+    if value in (None, "", False, "off"):
+        return None
+    if value not in DEDUPE_MODES:
+        raise ValueError(f"'dedupe' must be one of: {', '.join(DEDUPE_MODES)}")
+    return value
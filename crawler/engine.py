@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import threading
+from urllib.parse import urlparse
+
+import httpx
+from lxml import etree, html as lxml_html
+
+from .canonical import SeenSet, canonicalize, unique_urls
+from .dedup import NearDuplicateIndex
+from .http_client import MAX_BODY_BYTES, ContentRejected, aiter_text, aopen_stream, get_async_client
+from .metrics import FETCH_ERRORS, STAGE_SECONDS, host_label
+from .politeness import SCHEDULER, FairFrontier, RobotsDisallowed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DEPTH = 2
+DEFAULT_MAX_PAGES = 100
+DEFAULT_CONCURRENCY = 32
+DEFAULT_PER_HOST_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 10
+
+
+def parse_document(body):
+    try:
+        return lxml_html.fromstring(body)
+    except ValueError:
+        # lxml refuses str input that carries an <?xml encoding?> declaration; hand it bytes instead
+        return parse_document(body.encode("utf-8")) if isinstance(body, str) else None
+    except etree.ParserError:
+        return None
+
+
+def document_links(doc, base_url):
+    return unique_urls((href for href in doc.xpath("//a/@href") if href.strip()), base_url)
+
+
+def document_text(doc):
+    return " ".join(doc.xpath("//body//text()[not(ancestor::script) and not(ancestor::style)]"))
+
+
+def extract_links(body, base_url):
+    """Returns the canonical, de-duplicated http(s) links found in an HTML document."""
+    doc = parse_document(body)
+    return document_links(doc, base_url) if doc is not None else []
+
+
+class CrawlEngine:
+    """Breadth-first asyncio crawler with a per-host fair frontier, robots.txt and concurrency caps."""
+
+    def __init__(
+        self,
+        max_depth=DEFAULT_MAX_DEPTH,
+        max_pages=DEFAULT_MAX_PAGES,
+        same_domain=True,
+        concurrency=DEFAULT_CONCURRENCY,
+        per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY,
+        timeout=DEFAULT_TIMEOUT,
+        headers=None,
+        scheduler=None,
+        bloom_capacity=None,
+        dedupe=None,
+        max_bytes=MAX_BODY_BYTES,
+    ):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.same_domain = same_domain
+        self.concurrency = max(1, concurrency)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.timeout = timeout
+        self.headers = headers  # Sent on top of the pooled client's default headers
+        self.scheduler = scheduler or SCHEDULER
+        self.bloom_capacity = bloom_capacity
+        self.dedupe = dedupe
+        self.max_bytes = max_bytes
+
+    def _in_scope(self, url, root_host):
+        if not self.same_domain:
+            return True
+        return urlparse(url).hostname == root_host
+
+    def _host_slot(self, host):
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(self.per_host_concurrency)
+            self._host_slots[host] = slot
+        return slot
+
+    async def _fetch(self, client, url, depth):
+        host = urlparse(url).hostname
+        page = {"url": url, "depth": depth, "status": None, "links": [], "error": None}
+        try:
+            await self.scheduler.await_turn(url, client)
+        except RobotsDisallowed as e:
+            logger.info(f"🤖 {e}")
+            page["error"] = str(e)
+            return page
+
+        async with self._host_slot(host):
+            try:
+                # Streamed like single-page fetches: non-HTML and oversized bodies are refused before download
+                async with aopen_stream(
+                    url, client=client, max_bytes=self.max_bytes, headers=self.headers, timeout=self.timeout
+                ) as response:
+                    page["status"] = response.status_code
+                    body = "".join([text async for text in aiter_text(response, self.max_bytes)])
+                    final_url = str(response.url)
+            except ContentRejected as e:
+                logger.info(f"⏭️ Skipping {url}: {e}")
+                page["error"] = str(e)
+                return page
+            except httpx.HTTPError as e:
+                if isinstance(e, httpx.HTTPStatusError):
+                    page["status"] = e.response.status_code
+                logger.error(f"❌ Crawl fetch failed for {url}: {e}")
+                FETCH_ERRORS.inc(host=host_label(host), reason=type(e).__name__)
+                page["error"] = str(e)
+                return page
+
+        with STAGE_SECONDS.time(stage="parse"):
+            doc = parse_document(body)
+        if doc is None:
+            return page
+        if self._duplicates is not None:
+            original = self._duplicates.check(document_text(doc), url)
+            if original is not None:
+                # A mirror or paginated copy: don't report or follow its links again
+                page["duplicate_of"] = original
+                return page
+        page["links"] = document_links(doc, final_url)
+        return page
+
+    async def _worker(self, client, queue, root_host, pages):
+        while True:
+            url, depth = await queue.get()
+            try:
+                page = await self._fetch(client, url, depth)
+                pages.append(page)
+                if depth >= self.max_depth:
+                    continue
+                for link in page["links"]:
+                    if len(self._seen) >= self.max_pages:
+                        break
+                    if not self._in_scope(link, root_host) or not self._seen.add(link):
+                        continue
+                    queue.put_nowait((link, depth + 1))
+            except Exception as e:
+                logger.error(f"❌ Crawl worker error on {url}: {e}")
+            finally:
+                queue.task_done()
+
+    async def crawl(self, start_url, client=None):
+        """Crawls from start_url and returns the de-duplicated links plus per-page results."""
+        start_url = canonicalize(start_url) or start_url
+        root_host = urlparse(start_url).hostname
+        self._seen = SeenSet([start_url], bloom_capacity=self.bloom_capacity)
+        self._host_slots = {}
+        self._duplicates = NearDuplicateIndex() if self.dedupe else None
+        pages = []
+
+        queue = FairFrontier(self.scheduler)
+        queue.put_nowait((start_url, 0))
+
+        if client is None:
+            client = get_async_client()  # The loop's shared pool: keep-alive connections outlive this crawl
+
+        workers = [
+            asyncio.create_task(self._worker(client, queue, root_host, pages))
+            for _ in range(self.concurrency)
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        if self.dedupe == "drop":
+            pages = [page for page in pages if "duplicate_of" not in page]
+        links = unique_urls(link for page in pages for link in page["links"])
+
+        return {"url": start_url, "links": links, "pages": pages}
+
+
+_crawl_loop = None
+_crawl_loop_pid = None
+_crawl_loop_lock = threading.Lock()
+
+
+def crawl_loop():
+    """Returns the process-wide event loop that synchronous callers run crawls on, starting it after a fork."""
+    global _crawl_loop, _crawl_loop_pid
+    pid = os.getpid()
+    if _crawl_loop is not None and _crawl_loop_pid == pid:
+        return _crawl_loop
+    with _crawl_loop_lock:
+        if _crawl_loop is None or _crawl_loop_pid != pid:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="crawl-loop", daemon=True).start()
+            _crawl_loop, _crawl_loop_pid = loop, pid
+            logger.info("🔁 Crawl event loop started")
+    return _crawl_loop
+
+
+def crawl_site(url, **options):
+    """Runs a CrawlEngine crawl to completion from synchronous code.
+
+    Crawls share one long-lived loop, so its pooled AsyncClient and DNS cache are reused across requests.
+    """
+    return asyncio.run_coroutine_threadsafe(CrawlEngine(**options).crawl(url), crawl_loop()).result()
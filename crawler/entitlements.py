@@ -0,0 +1,82 @@
+import logging
+
+from django.utils import timezone
+
+from .models import UserSubscription
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Each worker process keeps its own copy; webhooks invalidate the local entry and
+# the TTL bounds how long another process can serve a stale status.
+ENTITLEMENT_TTL = 60
+ENTITLEMENT_CACHE_SIZE = 50000
+
+ENTITLEMENT_FIELDS = ("id", "user_id", "subscription_id", "status", "trial_end", "created_at")
+
+_entitlements = TTLCache(maxsize=ENTITLEMENT_CACHE_SIZE, ttl=ENTITLEMENT_TTL)
+
+
+def _remember(values):
+    _entitlements.set(values["user_id"], values)
+    return UserSubscription(**values)
+
+
+def remember_subscription(user_sub):
+    """Caches the entitlement of a subscription row just read or written."""
+    return _remember({field: getattr(user_sub, field) for field in ENTITLEMENT_FIELDS})
+
+
+def get_entitlement(user_id):
+    """Returns a read-only UserSubscription for user_id from memory, loading it on a miss; None if unregistered."""
+    user_id = int(user_id)
+    values = _entitlements.get(user_id)
+    if values is not None:
+        return UserSubscription(**values)
+    values = UserSubscription.objects.filter(user_id=user_id).values(*ENTITLEMENT_FIELDS).first()
+    if values is None:
+        return None
+    return _remember(values)
+
+
+async def aget_entitlement(user_id):
+    """Async counterpart of get_entitlement; cache hits never leave the event loop."""
+    user_id = int(user_id)
+    values = _entitlements.get(user_id)
+    if values is not None:
+        return UserSubscription(**values)
+    values = await UserSubscription.objects.filter(user_id=user_id).values(*ENTITLEMENT_FIELDS).afirst()
+    if values is None:
+        return None
+    return _remember(values)
+
+
+def trial_expired(user_sub, now=None):
+    return user_sub.status == 'trial' and user_sub.trial_end < (now or timezone.now())
+
+
+def expire_trials(now=None):
+    """Marks every lapsed trial as expired in a single UPDATE; returns the row count."""
+    now = now or timezone.now()
+    expired = UserSubscription.objects.filter(status='trial', trial_end__lt=now).update(status='expired')
+    if expired:
+        logger.info(f"⌛ Expired {expired} trial subscriptions")
+    return expired
+
+
+def invalidate_entitlement(user_id):
+    """Drops a user's cached entitlement after their subscription changes."""
+    if user_id is None:
+        return
+    try:
+        _entitlements.pop(int(user_id))
+    except (TypeError, ValueError):
+        logger.warning(f"⚠️ Cannot invalidate entitlement for user_id {user_id!r}")
+
+
+def clear_entitlements():
+    _entitlements.clear()
+
+
+def entitlement_stats():
+    return {"entries": len(_entitlements), "hits": _entitlements.hits, "misses": _entitlements.misses}
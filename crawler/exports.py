@@ -0,0 +1,165 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+from django.http import HttpResponse, StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "odin_exports"))
+EXPORT_TTL = 24 * 3600
+EXPORT_CLEANUP_INTERVAL = 10 * 60
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+RESULT_COLUMNS = (
+    "type", "input", "status", "url", "headline", "text_content", "images", "links", "error", "duplicate_of",
+)
+
+_EXPORT_NAME_RE = re.compile(r"^[0-9a-f]{32}\.(csv|ndjson)(\.gz)?$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_cleanup_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+def export_name(export_id, fmt="csv", compress=False):
+    return f"{export_id}.{fmt}" + (".gz" if compress else "")
+
+
+def export_path(name, directory=None):
+    """Absolute path of an export file, or None if name is not a valid export name."""
+    if not _EXPORT_NAME_RE.match(name):
+        return None
+    return os.path.join(directory or EXPORT_DIR, name)
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _write_rows(stream, rows, fmt, columns):
+    if fmt == "ndjson":
+        for row in rows:
+            stream.write(json.dumps(row) + "\n")
+        return
+    writer = csv.writer(stream)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_cell(row.get(column)) for column in columns])
+
+
+def write_export(rows, fmt="csv", compress=False, export_id=None, columns=RESULT_COLUMNS, directory=None):
+    """Writes rows (dicts) to a new export file one at a time and returns its name."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    directory = directory or EXPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    cleanup_exports(directory=directory, throttle=True)
+
+    name = export_name(export_id or uuid.uuid4().hex, fmt, compress)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            binary = gzip.GzipFile(fileobj=raw, mode="wb") if compress else raw
+            with io.TextIOWrapper(binary, encoding="utf-8", newline="") as stream:
+                _write_rows(stream, rows, fmt, columns)
+        # Readers only ever see complete files
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"✅ Export written to {name}")
+    return name
+
+
+def cleanup_exports(ttl=EXPORT_TTL, directory=None, throttle=False, now=None):
+    """Deletes export files older than ttl seconds; returns how many were removed."""
+    global _last_cleanup
+    now = now or time.time()
+    if throttle:
+        with _cleanup_lock:
+            if now - _last_cleanup < EXPORT_CLEANUP_INTERVAL:
+                return 0
+            _last_cleanup = now
+
+    removed = 0
+    try:
+        entries = list(os.scandir(directory or EXPORT_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime > ttl:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        logger.info(f"🧹 Removed {removed} expired exports")
+    return removed
+
+
+def _iter_file(handle, length):
+    try:
+        while length > 0:
+            chunk = handle.read(min(EXPORT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def parse_range(header, size):
+    """Parses a single "bytes=start-end" Range header into (start, end), or None if unsatisfiable."""
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    else:
+        start, end = max(0, size - int(end)), size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def export_response(request, path, filename):
+    """Streams an export file, honouring single byte-range requests."""
+    size = os.path.getsize(path)
+    fmt = filename.split(".")[1]
+    content_type = "application/gzip" if filename.endswith(".gz") else EXPORT_FORMATS[fmt]
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("Range")
+    if range_header and size:
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        (start, end), status = byte_range, 206
+
+    handle = open(path, "rb")
+    handle.seek(start)
+    response = StreamingHttpResponse(_iter_file(handle, end - start + 1), status=status, content_type=content_type)
+    response["Content-Length"] = str(end - start + 1)
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
@@ -0,0 +1,169 @@
+import os
+from urllib.parse import urljoin
+
+from lxml import etree
+
+TEXT_BUDGET = 5000
+IMAGE_BUDGET = 5
+TEXT_TAGS = ("p", "h1", "h2", "h3", "h4", "h5", "h6")
+SKIP_TAGS = ("script", "style", "noscript", "template")
+EXTRACTION_BACKEND = os.environ.get("EXTRACTION_BACKEND", "lxml")
+FEED_CHUNK_SIZE = 64 * 1024
+
+
+def build_result(url, headline, text_content, images):
+    return {
+        "url": url,
+        "headline": headline,
+        "text_content": text_content[:TEXT_BUDGET] if text_content else "No Content Extracted",
+        "images": images[:IMAGE_BUDGET],
+    }
+
+
+class SoupExtractor:
+    """BeautifulSoup backend; walks the parsed tree once per field."""
+
+    name = "soup"
+
+    def __init__(self, url="Unknown"):
+        self.url = url
+        self._chunks = []
+        self.done = False
+
+    def feed(self, chunk):
+        self._chunks.append(chunk)
+        return False
+
+    def close(self):
+        from bs4 import BeautifulSoup
+
+        chunks = self._chunks
+        html = b"".join(chunks) if chunks and isinstance(chunks[0], bytes) else "".join(chunks)
+        return self.extract_soup(BeautifulSoup(html, "html.parser"), self.url)
+
+    @staticmethod
+    def extract_soup(soup, url="Unknown"):
+        title = soup.find("title")
+        headline = title.text if title else "No Title Available"
+        paragraphs = soup.find_all(TEXT_TAGS)
+        text_content = "\n".join([p.text.strip() for p in paragraphs if p.text.strip()])
+
+        if not text_content:
+            text_content = soup.get_text().strip()[:TEXT_BUDGET]  # Fallback if structured content isn't found
+
+        # Convert relative image URLs to absolute URLs
+        images = [urljoin(url, img.get("src")) for img in soup.find_all("img") if img.get("src")]
+        return build_result(url, headline, text_content, images)
+
+
+class LxmlExtractor:
+    """lxml pull-parser backend; collects title, text blocks and images in one pass and stops once budgets are full."""
+
+    name = "lxml"
+
+    def __init__(self, url="Unknown"):
+        self.url = url
+        self._parser = etree.HTMLPullParser(events=("start", "end"))
+        self._headline = None
+        self._blocks = []
+        self._text_length = 0
+        self._images = []
+        self._in_body = False
+        self._root = None
+        self.done = False
+
+    def _text_full(self):
+        return self._text_length >= TEXT_BUDGET
+
+    def _handle(self, event, element):
+        tag = element.tag
+        if not isinstance(tag, str):
+            return
+        if self._root is None:
+            self._root = element.getroottree().getroot()
+        if event == "start":
+            if tag == "body":
+                self._in_body = True
+            elif tag == "img" and len(self._images) < IMAGE_BUDGET:
+                src = element.get("src")
+                if src:
+                    self._images.append(urljoin(self.url, src))
+            return
+
+        if tag == "title" and self._headline is None:
+            self._headline = element.text or ""
+        elif tag in TEXT_TAGS and not self._text_full():
+            text = "".join(element.itertext()).strip()
+            if text:
+                self._text_length += len(text) + (1 if self._blocks else 0)
+                self._blocks.append(text)
+            element.clear(keep_tail=True)
+
+        if self._text_full() and len(self._images) >= IMAGE_BUDGET and (self._headline is not None or self._in_body):
+            self.done = True
+
+    def feed(self, chunk):
+        """Parses another chunk; returns True once every budget is full."""
+        if self.done:
+            return True
+        self._parser.feed(chunk)
+        for event, element in self._parser.read_events():
+            self._handle(event, element)
+            if self.done:
+                break
+        return self.done
+
+    def _fallback_text(self):
+        if self._root is None:
+            return ""
+        parts = []
+        length = 0
+        for node in self._root.iter():
+            if not isinstance(node.tag, str):
+                continue
+            skip = node.tag in SKIP_TAGS
+            if node.text and not skip:
+                parts.append(node.text)
+                length += len(node.text)
+            parent = node.getparent()
+            if node.tail and (parent is None or parent.tag not in SKIP_TAGS):
+                parts.append(node.tail)
+                length += len(node.tail)
+            if length >= TEXT_BUDGET * 2:
+                break
+        return "".join(parts).strip()[:TEXT_BUDGET]
+
+    def close(self):
+        if not self.done:
+            try:
+                self._parser.close()
+            except etree.XMLSyntaxError:
+                pass
+            for event, element in self._parser.read_events():
+                self._handle(event, element)
+
+        text_content = "\n".join(self._blocks)
+        if not text_content:
+            text_content = self._fallback_text()
+        headline = self._headline if self._headline is not None else "No Title Available"
+        return build_result(self.url, headline, text_content, self._images)
+
+
+EXTRACTORS = {
+    SoupExtractor.name: SoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+
+
+def get_extractor(url="Unknown", backend=None):
+    """Returns a fresh extractor for the configured (or requested) backend."""
+    return EXTRACTORS[backend or EXTRACTION_BACKEND](url)
+
+
+def extract_html(html, url="Unknown", backend=None):
+    """Extracts headline, text and images from a complete HTML document."""
+    extractor = get_extractor(url, backend)
+    for start in range(0, len(html or ""), FEED_CHUNK_SIZE):
+        if extractor.feed(html[start:start + FEED_CHUNK_SIZE]):
+            break
+    return extractor.close()
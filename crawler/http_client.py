@@ -0,0 +1,415 @@
+import asyncio
+import codecs
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+
+import httpcore
+import httpx
+
+from .metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Headers for web requests
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+}
+
+REQUEST_TIMEOUT = 10
+POOL_MAX_CONNECTIONS = 100
+POOL_MAX_KEEPALIVE = 40
+POOL_KEEPALIVE_EXPIRY = 30.0
+PER_HOST_CONNECTIONS = 6
+DNS_CACHE_TTL = 300
+DNS_CACHE_SIZE = 4096
+MAX_BODY_BYTES = int(os.environ.get("MAX_BODY_BYTES", 5 * 1024 * 1024))
+STREAM_CHUNK_SIZE = 64 * 1024
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+
+class ContentRejected(Exception):
+    """Raised when a response is refused before its body is downloaded."""
+
+
+def _is_ip_literal(host):
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    """Thread-safe LRU of getaddrinfo results that expire after a TTL."""
+
+    def __init__(self, ttl=DNS_CACHE_TTL, maxsize=DNS_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, host, port):
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, addresses = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return addresses
+
+    def put(self, host, port, addresses):
+        key = (host, port)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, addresses)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _addresses(infos):
+        addresses = []
+        for _, _, _, _, sockaddr in infos:
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return addresses
+
+    def resolve(self, host, port):
+        if _is_ip_literal(host) or host == "localhost":
+            return [host]
+        addresses = self.get(host, port)
+        if addresses is None:
+            with STAGE_SECONDS.time(stage="dns"):
+                infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            addresses = self._addresses(infos)
+            self.put(host, port, addresses)
+        return addresses
+
+    async def aresolve(self, host, port):
+        if _is_ip_literal(host) or host == "localhost":
+            return [host]
+        addresses = self.get(host, port)
+        if addresses is None:
+            loop = asyncio.get_running_loop()
+            with STAGE_SECONDS.time(stage="dns"):
+                infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            addresses = self._addresses(infos)
+            self.put(host, port, addresses)
+        return addresses
+
+
+DNS_CACHE = DNSCache()
+
+
+# httpcore trace events that open and close each timed stage
+TRACE_STAGES = {
+    "connection.connect_tcp.started": ("connect", True),
+    "connection.connect_tcp.complete": ("connect", False),
+    "connection.start_tls.started": ("tls", True),
+    "connection.start_tls.complete": ("tls", False),
+    "http11.send_request_headers.started": ("ttfb", True),
+    "http11.receive_response_headers.complete": ("ttfb", False),
+    "http2.send_request_headers.started": ("ttfb", True),
+    "http2.receive_response_headers.complete": ("ttfb", False),
+}
+
+
+class StageTrace:
+    """httpx "trace" extension that records connect, TLS and time-to-first-byte per request."""
+
+    def __init__(self):
+        self._started = {}
+
+    def __call__(self, event_name, info):
+        stage = TRACE_STAGES.get(event_name)
+        if stage is None:
+            return
+        name, starting = stage
+        if starting:
+            self._started[name] = time.perf_counter()
+        elif name in self._started:
+            STAGE_SECONDS.observe(time.perf_counter() - self._started.pop(name), stage=name)
+
+    async def atrace(self, event_name, info):
+        self(event_name, info)
+
+
+class CachingNetworkBackend(httpcore.NetworkBackend):
+    """Resolves hosts through DNS_CACHE before handing the connect to httpcore."""
+
+    def __init__(self, backend=None, dns_cache=DNS_CACHE):
+        self._backend = backend or httpcore.SyncBackend()
+        self._dns_cache = dns_cache
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = self._dns_cache.resolve(host, port)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        error = None
+        for address in addresses:
+            try:
+                return self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    def sleep(self, seconds):
+        self._backend.sleep(seconds)
+
+
+class AsyncCachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """Async counterpart of CachingNetworkBackend."""
+
+    def __init__(self, backend=None, dns_cache=DNS_CACHE):
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._dns_cache = dns_cache
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = await self._dns_cache.aresolve(host, port)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds):
+        await self._backend.sleep(seconds)
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """HTTPTransport whose connection pool resolves hosts through the DNS cache."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if isinstance(self._pool, httpcore.ConnectionPool):
+            self._pool._network_backend = CachingNetworkBackend(self._pool._network_backend)
+
+
+class AsyncPooledTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport whose connection pool resolves hosts through the DNS cache."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if isinstance(self._pool, httpcore.AsyncConnectionPool):
+            self._pool._network_backend = AsyncCachingNetworkBackend(self._pool._network_backend)
+
+
+def _limits(max_connections=POOL_MAX_CONNECTIONS):
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(POOL_MAX_KEEPALIVE, max_connections),
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def new_client(max_connections=POOL_MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT, headers=None):
+    """Builds a keep-alive httpx.Client with HTTP/2 and cached DNS."""
+    transport = PooledTransport(http2=HTTP2_ENABLED, limits=_limits(max_connections))
+    return httpx.Client(
+        transport=transport, headers=headers or HEADERS, timeout=timeout, follow_redirects=True
+    )
+
+
+def new_async_client(max_connections=POOL_MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT, headers=None):
+    """Builds a keep-alive httpx.AsyncClient with HTTP/2 and cached DNS."""
+    transport = AsyncPooledTransport(http2=HTTP2_ENABLED, limits=_limits(max_connections))
+    return httpx.AsyncClient(
+        transport=transport, headers=headers or HEADERS, timeout=timeout, follow_redirects=True
+    )
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the process-wide pooled client, rebuilding it after a fork."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = new_client()
+            _client_pid = pid
+            logger.info(f"🔌 HTTP client pool created (http2={HTTP2_ENABLED})")
+    return _client
+
+
+def close_client():
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+class _LoopPool:
+    """An AsyncClient and per-host semaphores belonging to one event loop."""
+
+    def __init__(self):
+        self.client = new_async_client()
+        self.host_slots = {}
+
+
+# httpx.AsyncClient connections are bound to the loop that opened them, so each loop gets its own pool
+_loop_pools = weakref.WeakKeyDictionary()
+
+
+def _loop_pool():
+    loop = asyncio.get_running_loop()
+    pool = _loop_pools.get(loop)
+    if pool is None:
+        pool = _loop_pools[loop] = _LoopPool()
+        logger.info(f"🔌 Async HTTP client pool created (http2={HTTP2_ENABLED})")
+    return pool
+
+
+def get_async_client():
+    """Returns the pooled AsyncClient of the running event loop."""
+    return _loop_pool().client
+
+
+async def close_async_client():
+    pool = _loop_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.client.aclose()
+
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+@contextmanager
+def host_slot(host):
+    """Caps concurrent requests to one host at PER_HOST_CONNECTIONS."""
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(PER_HOST_CONNECTIONS)
+            _host_slots[host] = slot
+    with slot:
+        yield
+
+
+@contextmanager
+def open_stream(url, method="GET", max_bytes=MAX_BODY_BYTES, content_types=HTML_CONTENT_TYPES, **kwargs):
+    """Opens a streamed response, rejecting wrong content types or oversized bodies before reading them."""
+    kwargs.setdefault("extensions", {}).setdefault("trace", StageTrace())
+    with host_slot(urlparse(url).hostname):
+        with get_client().stream(method, url, **kwargs) as response:
+            if response.status_code != 304:
+                _check_response(response, max_bytes, content_types)
+            yield response
+
+
+@asynccontextmanager
+async def ahost_slot(host):
+    """Async counterpart of host_slot for the running event loop's pool."""
+    slots = _loop_pool().host_slots
+    slot = slots.get(host)
+    if slot is None:
+        slot = slots[host] = asyncio.Semaphore(PER_HOST_CONNECTIONS)
+    async with slot:
+        yield
+
+
+def _check_response(response, max_bytes, content_types):
+    response.raise_for_status()
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_types and content_type and content_type not in content_types:
+        raise ContentRejected(f"Unsupported content type: {content_type}")
+    length = response.headers.get("content-length")
+    if max_bytes and length and length.isdigit() and int(length) > max_bytes:
+        raise ContentRejected(f"Response too large: {length} bytes")
+
+
+@asynccontextmanager
+async def aopen_stream(url, method="GET", max_bytes=MAX_BODY_BYTES, content_types=HTML_CONTENT_TYPES, client=None,
+                       **kwargs):
+    """Async counterpart of open_stream, using the running event loop's pooled client unless given one."""
+    kwargs.setdefault("extensions", {}).setdefault("trace", StageTrace().atrace)
+    async with ahost_slot(urlparse(url).hostname):
+        async with (client or get_async_client()).stream(method, url, **kwargs) as response:
+            if response.status_code != 304:
+                _check_response(response, max_bytes, content_types)
+            yield response
+
+
+def iter_text(response, max_bytes=MAX_BODY_BYTES, chunk_size=STREAM_CHUNK_SIZE):
+    """Decodes a streamed body incrementally, stopping once max_bytes have been read."""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    received = 0
+    for chunk in response.iter_bytes(chunk_size):
+        if max_bytes and received + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - received]
+        received += len(chunk)
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+        if max_bytes and received >= max_bytes:
+            logger.warning(f"⚠️ Body of {response.url} truncated at {max_bytes} bytes")
+            return
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def aiter_text(response, max_bytes=MAX_BODY_BYTES, chunk_size=STREAM_CHUNK_SIZE):
+    """Async counterpart of iter_text."""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    received = 0
+    async for chunk in response.aiter_bytes(chunk_size):
+        if max_bytes and received + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - received]
+        received += len(chunk)
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+        if max_bytes and received >= max_bytes:
+            logger.warning(f"⚠️ Body of {response.url} truncated at {max_bytes} bytes")
+            return
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
@@ -0,0 +1,209 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .batch import DEFAULT_BATCH_CONCURRENCY, run_batch
+from .models import CrawlJob
+from .quotas import UserQuota
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_INTERVAL = 1.0
+JOB_LEASE = timezone.timedelta(minutes=2)  # A running job whose heartbeat is older than this is requeued
+JOB_HEARTBEAT_INTERVAL = 20.0  # Seconds between lease renewals while a job streams results
+JOB_REQUEUE_INTERVAL = 60.0  # Seconds between stale-job sweeps in a worker pool
+JOB_MAX_ATTEMPTS = 3
+
+
+def submit_job(user_id, items, search_results=100, concurrency=DEFAULT_BATCH_CONCURRENCY, dedupe=None, plan=None):
+    """Queues a crawl of ("url"|"keyword", value) items and returns the CrawlJob."""
+    job = CrawlJob.objects.create(
+        user_id=user_id,
+        payload={
+            "items": [list(item) for item in items],
+            "search_results": search_results,
+            "concurrency": concurrency,
+            "dedupe": dedupe,
+            "plan": plan,
+        },
+    )
+    logger.info(f"📥 Queued crawl job {job.id} ({len(items)} items) for user {user_id}")
+    return job
+
+
+def cancel_job(job):
+    """Cancels a queued job outright, or flags a running one for its worker to stop."""
+    if job.status == CrawlJob.QUEUED:
+        cancelled = CrawlJob.objects.filter(pk=job.pk, status=CrawlJob.QUEUED).update(
+            status=CrawlJob.CANCELLED, cancel_requested=True, finished_at=timezone.now()
+        )
+        if cancelled:
+            job.refresh_from_db()
+            return job
+    if job.status == CrawlJob.RUNNING:
+        CrawlJob.objects.filter(pk=job.pk).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def claim_next_job(worker_id):
+    """Atomically moves the oldest queued job to running for this worker, starting its lease."""
+    while True:
+        job_id = (
+            CrawlJob.objects.filter(status=CrawlJob.QUEUED)
+            .order_by("created_at")
+            .values_list("id", flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = CrawlJob.objects.filter(pk=job_id, status=CrawlJob.QUEUED).update(
+                status=CrawlJob.RUNNING, worker=worker_id, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1
+            )
+        if claimed:
+            return CrawlJob.objects.get(pk=job_id)
+
+
+def requeue_stale_jobs(lease=JOB_LEASE):
+    """Returns jobs whose worker stopped renewing their lease to the queue (or fails them after JOB_MAX_ATTEMPTS)."""
+    cutoff = timezone.now() - lease
+    stale = CrawlJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status=CrawlJob.RUNNING
+    )
+    failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=CrawlJob.FAILED, error="Worker lost the job too many times", finished_at=timezone.now()
+    )
+    requeued = stale.update(status=CrawlJob.QUEUED, worker="", started_at=None, heartbeat_at=None)
+    if failed or requeued:
+        logger.warning(f"⚠️ Requeued {requeued} and failed {failed} stale crawl jobs")
+    return requeued
+
+
+def renew_lease(job):
+    """Refreshes a running job's heartbeat; False means the lease was lost to a requeue."""
+    return bool(
+        CrawlJob.objects.filter(pk=job.pk, status=CrawlJob.RUNNING, worker=job.worker).update(heartbeat_at=timezone.now())
+    )
+
+
+def _cancel_requested(job):
+    return CrawlJob.objects.filter(pk=job.pk, cancel_requested=True).exists()
+
+
+def _fail_job(job, error):
+    logger.error(f"❌ Crawl job {job.id} failed: {error}")
+    CrawlJob.objects.filter(pk=job.pk).update(
+        status=CrawlJob.FAILED, error=str(error), finished_at=timezone.now()
+    )
+
+
+def run_job(job):
+    """Runs a claimed job to completion, renewing its lease and honouring cancellation between results."""
+    payload = job.payload
+    items = [tuple(item) for item in payload["items"]]
+    results = [None] * len(items)
+    stream = run_batch(
+        items,
+        concurrency=payload.get("concurrency", DEFAULT_BATCH_CONCURRENCY),
+        search_results=payload.get("search_results", 100),
+        dedupe=payload.get("dedupe"),
+        quota=UserQuota(job.user_id, payload["plan"]) if payload.get("plan") else None,
+    )
+    renewed = time.monotonic()
+    try:
+        for result in stream:
+            results[result.pop("index")] = result
+            if time.monotonic() - renewed >= JOB_HEARTBEAT_INTERVAL:
+                renewed = time.monotonic()
+                if not renew_lease(job):
+                    stream.close()
+                    logger.warning(f"⚠️ Crawl job {job.id} lost its lease, leaving it to the next worker")
+                    return
+            if _cancel_requested(job):
+                stream.close()
+                CrawlJob.objects.filter(pk=job.pk).update(
+                    status=CrawlJob.CANCELLED, finished_at=timezone.now()
+                )
+                logger.info(f"🛑 Crawl job {job.id} cancelled")
+                return
+
+        CrawlJob.objects.filter(pk=job.pk, status=CrawlJob.RUNNING, worker=job.worker).update(
+            status=CrawlJob.SUCCEEDED, result={"results": [result for result in results if result is not None]}, finished_at=timezone.now()
+        )
+    except Exception as e:
+        _fail_job(job, e)
+        return
+    logger.info(f"✅ Crawl job {job.id} finished")
+
+
+class JobWorkerPool:
+    """Thread pool that pulls CrawlJobs from the database-backed queue."""
+
+    def __init__(self, workers=2, poll_interval=JOB_POLL_INTERVAL, requeue_interval=JOB_REQUEUE_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.requeue_interval = requeue_interval
+        self._next_requeue = 0.0
+        self._requeue_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _requeue_if_due(self):
+        # One thread per pool sweeps for jobs whose workers died, every requeue_interval seconds
+        with self._requeue_lock:
+            now = time.monotonic()
+            if now < self._next_requeue:
+                return
+            self._next_requeue = now + self.requeue_interval
+        try:
+            requeue_stale_jobs()
+        except Exception as e:
+            logger.error(f"❌ Could not requeue stale crawl jobs: {e}")
+
+    def _loop(self, worker_id):
+        while not self._stop.is_set():
+            close_old_connections()
+            self._requeue_if_due()
+            try:
+                job = claim_next_job(worker_id)
+            except Exception as e:
+                logger.error(f"❌ Could not claim a crawl job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                run_job(job)
+            except Exception as e:
+                # Even marking the job failed can hit a locked database; keep the worker alive regardless
+                try:
+                    _fail_job(job, e)
+                except Exception as e:
+                    logger.error(f"❌ Could not mark crawl job {job.id} failed: {e}")
+        close_old_connections()
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._loop, args=(f"{self._prefix}:{index}",), name=f"crawl-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
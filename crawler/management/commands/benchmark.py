@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crawler.benchmark import BENCHMARK_TARGETS, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmarks crawling, scraping, extraction and CrawlView against a local synthetic site (no network)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=200, help="Pages in the synthetic site")
+        parser.add_argument("--fanout", type=int, default=5, help="Links per page")
+        parser.add_argument("--page-kb", type=int, default=20, help="Approximate text weight of each page in KB")
+        parser.add_argument("--latency-ms", type=int, default=0, help="Artificial server latency per request")
+        parser.add_argument("--js-shell-ratio", type=float, default=0.1, help="Share of JavaScript-shell pages")
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the generated content")
+        parser.add_argument("--repeat", type=int, default=1, help="Passes over the site per benchmark")
+        parser.add_argument(
+            "--targets", default=",".join(BENCHMARK_TARGETS),
+            help=f"Comma-separated benchmarks to run (default: {','.join(BENCHMARK_TARGETS)})",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        targets = [target.strip() for target in options["targets"].split(",") if target.strip()]
+        unknown = set(targets) - set(BENCHMARK_TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown benchmark targets: {', '.join(sorted(unknown))}")
+
+        # CrawlView writes subscriptions and results; keep them out of the real database
+        old_name = None
+        if "crawl_view" in targets:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = run_benchmarks(
+                targets=targets,
+                repeat=options["repeat"],
+                pages=options["pages"],
+                fanout=options["fanout"],
+                page_kb=options["page_kb"],
+                latency_ms=options["latency_ms"],
+                js_shell_ratio=options["js_shell_ratio"],
+                seed=options["seed"],
+            )
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Benchmark report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
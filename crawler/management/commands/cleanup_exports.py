@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crawler.exports import EXPORT_TTL, cleanup_exports
+
+
+class Command(BaseCommand):
+    help = "Deletes export files older than the export TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", type=int, default=EXPORT_TTL, help="Maximum export age in seconds")
+        parser.add_argument(
+            "--interval", type=int, default=0,
+            help="Keep running and sweep every N seconds (default: sweep once and exit)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            removed = cleanup_exports(ttl=options["ttl"])
+            self.stdout.write(f"Removed {removed} expired exports")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,38 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from crawler.jobs import JobWorkerPool
+from crawler.result_store import RESULT_WRITER
+
+
+class Command(BaseCommand):
+    help = "Runs background workers that process queued crawl jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Number of worker threads")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between queue polls when idle")
+
+    def handle(self, *args, **options):
+        pool = JobWorkerPool(workers=options["workers"], poll_interval=options["poll_interval"])
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping crawl workers...")
+            pool.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        if settings.BROWSER_WARM_ON_START:
+            from crawler.browser_pool import warm_in_background
+
+            warm_in_background()
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(f"Crawl workers running ({options['workers']} threads)"))
+        try:
+            pool.join()
+        finally:
+            written = RESULT_WRITER.flush()  # Results buffered after the last batch flush
+            if written:
+                self.stdout.write(f"Stored {written} buffered crawl results")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crawler.entitlements import expire_trials
+
+
+class Command(BaseCommand):
+    help = "Marks lapsed trial subscriptions as expired in one bulk update."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=int, default=0,
+            help="Keep running and sweep every N seconds (default: sweep once and exit)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_trials()
+            self.stdout.write(f"Expired {expired} trial subscriptions")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,267 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Every worker process snapshots its own metrics to a file here; /metrics sums them all.
+# Empty it before (re)starting gunicorn, otherwise counters carry over from the last deploy.
+METRICS_DIR = os.environ.get(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "odin_metrics")
+)
+METRICS_FLUSH_INTERVAL = 1.0
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_HOST_LABELS = 200  # Hosts beyond this share the "other" label to bound series cardinality
+
+
+class Registry:
+    """Process-local metric values, periodically written to METRICS_DIR for cross-process aggregation."""
+
+    def __init__(self, directory=None, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory or METRICS_DIR
+        self.flush_interval = flush_interval
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._reset_process()
+
+    def _reset_process(self):
+        self._pid = os.getpid()
+        self._path = os.path.join(self.directory, f"metrics_{self._pid}_{uuid.uuid4().hex[:8]}.json")
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def _check_fork(self):
+        # Values inherited from the parent were already reported by it
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    for metric in self.metrics.values():
+                        metric.samples.clear()
+                    self._reset_process()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def flush(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # A temp file per write: concurrent flushes each replace the snapshot whole, never interleaved
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=self.directory, prefix="tmp_metrics_", suffix=".json", delete=False
+        ) as handle:
+            try:
+                json.dump(self.snapshot(), handle)
+            except BaseException:
+                handle.close()
+                os.unlink(handle.name)
+                raise
+        os.replace(handle.name, self._path)
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        try:
+            self.flush()
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write metrics snapshot: {e}")
+            self._last_flush = time.monotonic()
+
+    def collect(self):
+        """Merges every process snapshot in the directory (including this process, flushed first)."""
+        self._check_fork()
+        try:
+            self.flush()
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write metrics snapshot: {e}")
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            try:
+                with open(path, encoding="utf-8") as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Skipping unreadable metrics snapshot {path}: {e}")
+                continue
+            for name, data in snapshot.items():
+                target = merged.setdefault(name, dict(data, samples={}))
+                for key, value in data["samples"].items():
+                    current = target["samples"].get(key)
+                    if current is None:
+                        target["samples"][key] = value
+                    elif data["type"] == "histogram":
+                        target["samples"][key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target["samples"][key] = current + value
+        return merged
+
+    def clear(self):
+        """Resets all values and removes every snapshot file (for tests)."""
+        with self._lock:
+            for metric in self.metrics.values():
+                metric.samples.clear()
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self.samples = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return json.dumps([str(labels.get(name, "")) for name in self.labelnames])
+
+    def dump(self):
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": dict(self.samples),
+        }
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry._check_fork()
+        key = self._key(labels)
+        with self.registry._lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        """Records value; samples are stored as [per-bucket counts..., +Inf count, sum]."""
+        self.registry._check_fork()
+        key = self._key(labels)
+        with self.registry._lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[index] += 1
+                    break
+            else:
+                sample[len(self.buckets)] += 1
+            sample[-1] += value
+        self.registry.maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def dump(self):
+        return dict(super().dump(), buckets=list(self.buckets))
+
+
+_host_labels = set()
+_host_labels_lock = threading.Lock()
+
+
+def host_label(host):
+    """Returns host as a label value, or "other" once MAX_HOST_LABELS distinct hosts have been seen."""
+    host = (host or "").lower()
+    if host in _host_labels:
+        return host
+    with _host_labels_lock:
+        if len(_host_labels) < MAX_HOST_LABELS:
+            _host_labels.add(host)
+            return host
+    return "other"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_float(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(registry=REGISTRY):
+    """Renders the merged metrics of every worker process in the Prometheus text format."""
+    lines = []
+    for name, data in sorted(registry.collect().items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        for key, value in sorted(data["samples"].items()):
+            values = json.loads(key)
+            if data["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(data['labelnames'], values)} {_format_float(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(data["buckets"] + [float("inf")], value[:-1]):
+                cumulative += count
+                labels = _format_labels(data["labelnames"], values, [("le", _format_float(float(bound)))])
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _format_labels(data["labelnames"], values)
+            lines.append(f"{name}_sum{labels} {_format_float(value[-1])}")
+            lines.append(f"{name}_count{labels} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "odin_stage_seconds", "Time spent in each fetch/parse stage.", ["stage"]
+)
+FETCHED_BYTES = Counter("odin_fetched_bytes_total", "Response body bytes downloaded by the scraper.")
+FETCH_ERRORS = Counter("odin_fetch_errors_total", "Failed page fetches by host and reason.", ["host", "reason"])
+PAGE_CACHE_EVENTS = Counter("odin_page_cache_events_total", "Page cache lookups by outcome.", ["outcome"])
+RENDER_PATHS = Counter(
+    "odin_render_fallbacks_total", "Pages that needed embedded-data or Selenium fallbacks.", ["path"]
+)
+QUOTA_REJECTIONS = Counter(
+    "odin_quota_rejections_total", "Crawl requests refused by per-user quotas.", ["plan", "kind"]
+)
+HTTP_REQUESTS = Counter("odin_http_requests_total", "API requests by view and status code.", ["view", "status"])
+HTTP_REQUEST_SECONDS = Histogram("odin_http_request_seconds", "API request latency by view.", ["view"])
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        REGISTRY.flush()
+    except OSError:
+        pass
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0007_crawljob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['status', 'trial_end'], name='usersub_status_trial_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['subscription_id'], name='usersub_subscription_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 16:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0009_webhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=32, unique=True)),
+                ('url', models.TextField()),
+                ('content_hash', models.CharField(blank=True, default='', max_length=32)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('error', 'Error')], default='success', max_length=20)),
+                ('error', models.TextField(blank=True, default='')),
+                ('headline', models.TextField(blank=True, default='')),
+                ('text_content', models.TextField(blank=True, default='')),
+                ('images', models.JSONField(blank=True, default=list)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('first_seen_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Crawl Result',
+                'verbose_name_plural': 'Crawl Results',
+                'indexes': [models.Index(fields=['fetched_at'], name='crawlresult_fetched_at_idx'), models.Index(fields=['content_hash'], name='crawlresult_content_hash_idx')],
+            },
+        ),
+    ]
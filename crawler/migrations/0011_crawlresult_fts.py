@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# External-content FTS5 index over crawler_crawlresult, kept in sync by triggers so
+# every upsert from the result writer is indexed as it lands.
+CREATE_FTS = [
+    """
+    CREATE VIRTUAL TABLE crawler_crawlresult_fts USING fts5(
+        headline, text_content,
+        content='crawler_crawlresult', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER crawler_crawlresult_fts_insert AFTER INSERT ON crawler_crawlresult BEGIN
+        INSERT INTO crawler_crawlresult_fts(rowid, headline, text_content)
+        VALUES (new.id, new.headline, new.text_content);
+    END
+    """,
+    """
+    CREATE TRIGGER crawler_crawlresult_fts_delete AFTER DELETE ON crawler_crawlresult BEGIN
+        INSERT INTO crawler_crawlresult_fts(crawler_crawlresult_fts, rowid, headline, text_content)
+        VALUES ('delete', old.id, old.headline, old.text_content);
+    END
+    """,
+    """
+    CREATE TRIGGER crawler_crawlresult_fts_update AFTER UPDATE OF headline, text_content ON crawler_crawlresult
+    WHEN old.headline IS NOT new.headline OR old.text_content IS NOT new.text_content BEGIN
+        INSERT INTO crawler_crawlresult_fts(crawler_crawlresult_fts, rowid, headline, text_content)
+        VALUES ('delete', old.id, old.headline, old.text_content);
+        INSERT INTO crawler_crawlresult_fts(rowid, headline, text_content)
+        VALUES (new.id, new.headline, new.text_content);
+    END
+    """,
+    "INSERT INTO crawler_crawlresult_fts(crawler_crawlresult_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS = [
+    "DROP TRIGGER IF EXISTS crawler_crawlresult_fts_update",
+    "DROP TRIGGER IF EXISTS crawler_crawlresult_fts_delete",
+    "DROP TRIGGER IF EXISTS crawler_crawlresult_fts_insert",
+    "DROP TABLE IF EXISTS crawler_crawlresult_fts",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0010_crawlresult'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_FTS, reverse_sql=DROP_FTS),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0011_crawlresult_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('day', models.DateField()),
+                ('fetches', models.PositiveIntegerField(default=0)),
+                ('renders', models.PositiveIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Quota Usage',
+                'verbose_name_plural': 'Quota Usage',
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'day'), name='quotausage_user_day_uniq')],
+            },
+        ),
+    ]
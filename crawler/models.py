@@ -3,6 +3,7 @@ from django.db import models
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
+import uuid
 
 def default_trial_end():
     return timezone.now() + timedelta(days=settings.TRIAL_PERIOD_DAYS)
@@ -27,4 +28,137 @@ class UserSubscription(models.Model):
     
     class Meta:
         verbose_name = "User Subscription"
-        verbose_name_plural = "User Subscriptions"
\ No newline at end of file
+        verbose_name_plural = "User Subscriptions"
+        indexes = [
+            models.Index(fields=['status', 'trial_end'], name='usersub_status_trial_end_idx'),
+            models.Index(fields=['subscription_id'], name='usersub_subscription_id_idx'),
+        ]
+
+class CrawlJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.IntegerField()
+    status = models.CharField(max_length=20, choices=(
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled')
+    ), default=QUEUED)
+    payload = models.JSONField()
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def as_dict(self, include_result=True):
+        data = {
+            'job_id': str(self.id),
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if self.error:
+            data['error'] = self.error
+        if include_result and self.result is not None:
+            data['result'] = self.result
+        return data
+
+    class Meta:
+        verbose_name = "Crawl Job"
+        verbose_name_plural = "Crawl Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='crawljob_status_created_idx'),
+            models.Index(fields=['user_id', 'created_at'], name='crawljob_user_created_idx'),
+        ]
+
+
+class WebhookEvent(models.Model):
+    PROCESSING = 'processing'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+
+    provider = models.CharField(max_length=20)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100, blank=True, default='')
+    status = models.CharField(max_length=20, choices=(
+        (PROCESSING, 'Processing'),
+        (PROCESSED, 'Processed'),
+        (FAILED, 'Failed')
+    ), default=PROCESSING)
+    received_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Webhook Event"
+        verbose_name_plural = "Webhook Events"
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='webhookevent_provider_event_uniq'),
+        ]
+
+
+class CrawlResult(models.Model):
+    SUCCESS = 'success'
+    ERROR = 'error'
+
+    url_hash = models.CharField(max_length=32, unique=True)
+    url = models.TextField()
+    content_hash = models.CharField(max_length=32, blank=True, default='')
+    status = models.CharField(max_length=20, choices=(
+        (SUCCESS, 'Success'),
+        (ERROR, 'Error')
+    ), default=SUCCESS)
+    error = models.TextField(blank=True, default='')
+    headline = models.TextField(blank=True, default='')
+    text_content = models.TextField(blank=True, default='')
+    images = models.JSONField(default=list, blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    first_seen_at = models.DateTimeField(auto_now_add=True)
+
+    def as_dict(self):
+        return {
+            'url': self.url,
+            'status': self.status,
+            'headline': self.headline,
+            'text_content': self.text_content,
+            'images': self.images,
+            'fetched_at': self.fetched_at.isoformat() if self.fetched_at else None,
+        }
+
+    class Meta:
+        verbose_name = "Crawl Result"
+        verbose_name_plural = "Crawl Results"
+        indexes = [
+            models.Index(fields=['fetched_at'], name='crawlresult_fetched_at_idx'),
+            models.Index(fields=['content_hash'], name='crawlresult_content_hash_idx'),
+        ]
+
+
+class QuotaUsage(models.Model):
+    """Per-user, per-day crawl usage; the meter adds its in-memory counts in batches."""
+
+    user_id = models.IntegerField()
+    day = models.DateField()
+    fetches = models.PositiveIntegerField(default=0)
+    renders = models.PositiveIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Quota Usage"
+        verbose_name_plural = "Quota Usage"
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'day'], name='quotausage_user_day_uniq'),
+        ]
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+from .canonical import canonicalize
+from .metrics import PAGE_CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "odin_page_cache"))
+PAGE_CACHE_MEMORY_BYTES = 32 * 1024 * 1024
+PAGE_CACHE_DISK_BYTES = 512 * 1024 * 1024
+PAGE_CACHE_DEFAULT_TTL = 300
+PAGE_CACHE_MAX_TTL = 7 * 24 * 3600
+
+
+def cache_key(url):
+    """Normalizes a URL for cache lookups so tracking parameters and query order share one entry."""
+    return canonicalize(url) or url.strip()
+
+
+def parse_cache_control(value):
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def freshness_lifetime(headers, now=None):
+    """Returns how long a response may be served without revalidation, or None if it must not be stored."""
+    now = now or time.time()
+    directives = parse_cache_control(headers.get("cache-control"))
+    # The cache is shared between users, so "private" responses are as unstorable as "no-store" (RFC 9111 §3.5)
+    if "no-store" in directives or "private" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        value = directives.get(name)
+        if value and value.isdigit():
+            return min(int(value), PAGE_CACHE_MAX_TTL)
+    expires = headers.get("expires")
+    if expires:
+        try:
+            return max(0, min(parsedate_to_datetime(expires).timestamp() - now, PAGE_CACHE_MAX_TTL))
+        except (TypeError, ValueError):
+            return 0
+    return PAGE_CACHE_DEFAULT_TTL
+
+
+class PageCache:
+    """Two-tier (memory LRU over disk) cache of scrape results with HTTP validators."""
+
+    def __init__(
+        self,
+        directory=PAGE_CACHE_DIR,
+        memory_bytes=PAGE_CACHE_MEMORY_BYTES,
+        disk_bytes=PAGE_CACHE_DISK_BYTES,
+    ):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_index = None
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _load_disk_index(self):
+        if self._disk_index is not None:
+            return
+        self._disk_index = OrderedDict()
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for item in os.scandir(self.directory):
+            if item.name.endswith(".json"):
+                stat = item.stat()
+                entries.append((stat.st_mtime, item.path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._disk_index[path] = size
+            self._disk_size += size
+
+    def _remember(self, key, entry, size):
+        if key in self._memory:
+            self._memory_size -= self._memory.pop(key)[1]
+        self._memory[key] = (entry, size)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes and self._memory:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_size -= evicted_size
+            self._stats["evictions"] += 1
+
+    def _write_disk(self, key, payload):
+        self._load_disk_index()
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Page cache write failed: {e}")
+            return
+        self._disk_size -= self._disk_index.pop(path, 0)
+        self._disk_index[path] = len(payload)
+        self._disk_size += len(payload)
+        while self._disk_size > self.disk_bytes and self._disk_index:
+            old_path, old_size = self._disk_index.popitem(last=False)
+            self._disk_size -= old_size
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                payload = f.read()
+        except OSError:
+            return None, 0
+        try:
+            return json.loads(payload), len(payload)
+        except ValueError:
+            return None, 0
+
+    def lookup(self, url):
+        """Returns the cached entry for url (fresh or stale) or None."""
+        key = cache_key(url)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached[0]
+            entry, size = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, entry, size)
+            return entry
+
+    @staticmethod
+    def is_fresh(entry, now=None):
+        return entry is not None and entry["expires"] > (now or time.time())
+
+    @staticmethod
+    def validators(entry):
+        """Conditional request headers for revalidating a stale entry."""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, data, headers):
+        """Caches a scrape result under the response's freshness rules."""
+        lifetime = freshness_lifetime(headers)
+        if lifetime is None:
+            return None
+        now = time.time()
+        entry = {
+            "url": url,
+            "data": data,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "stored": now,
+            "expires": now + lifetime,
+        }
+        self._save(url, entry)
+        with self._lock:
+            self._stats["stores"] += 1
+        return entry
+
+    def revalidated(self, url, entry, headers):
+        """Extends a stale entry after a 304 Not Modified."""
+        lifetime = freshness_lifetime(headers)
+        entry = dict(entry, expires=time.time() + (lifetime or 0))
+        if headers.get("etag"):
+            entry["etag"] = headers["etag"]
+        self._save(url, entry)
+        self.record("revalidated")
+        return entry
+
+    def _save(self, url, entry):
+        key = cache_key(url)
+        payload = json.dumps(entry)
+        with self._lock:
+            self._remember(key, entry, len(payload))
+            self._write_disk(key, payload)
+
+    def record(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+        PAGE_CACHE_EVENTS.inc(outcome=outcome)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_size
+            stats["disk_bytes"] = self._disk_size
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._load_disk_index()
+            for path in self._disk_index:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._disk_index.clear()
+            self._disk_size = 0
+
+
+PAGE_CACHE = PageCache()
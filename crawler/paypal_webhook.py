@@ -1,22 +1,85 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from .entitlements import invalidate_entitlement
 from .models import UserSubscription
+from .webhook_ledger import DUPLICATE, IN_PROGRESS, begin_event, fail_event, finish_event
 import json
+import logging
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 
-@csrf_exempt
-def paypal_webhook(request):
-    if request.method != 'POST':
-        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
-    
-    headers = request.headers
-    body = request.body.decode('utf-8')
-    body_json = json.loads(body)
+logger = logging.getLogger(__name__)
 
-    # Step 1: Verify webhook signature via PayPal API
-    verification_url = "https://api-m.paypal.com/v1/notifications/verify-webhook-signature"
+PAYPAL_API_BASE = "https://api-m.paypal.com"
+PAYPAL_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+TOKEN_REFRESH_AHEAD = 300  # Refresh this many seconds before the token expires
+
+# One pooled, keep-alive session for every call to PayPal
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
+
+class PayPalTokenCache:
+    """Caches the OAuth access token and refreshes it shortly before it expires."""
 
+    def __init__(self, refresh_ahead=TOKEN_REFRESH_AHEAD):
+        self.refresh_ahead = refresh_ahead
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self):
+        response = session.post(
+            f"{PAYPAL_API_BASE}/v1/oauth2/token",
+            headers={"Accept": "application/json"},
+            data={"grant_type": "client_credentials"},
+            auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET),
+            timeout=PAYPAL_TIMEOUT
+        )
+        response.raise_for_status()
+        body = response.json()
+        with self._lock:
+            self._token = body["access_token"]
+            self._expires_at = time.monotonic() + int(body.get("expires_in", 3600))
+        return self._token
+
+    def _refresh_in_background(self):
+        try:
+            self._fetch()
+        except (requests.RequestException, KeyError, ValueError) as e:
+            logger.warning(f"⚠️ PayPal token refresh-ahead failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            token, expires_at = self._token, self._expires_at
+            if token and now < expires_at - self.refresh_ahead:
+                return token
+            if token and now < expires_at:
+                # Still valid: hand it out and refresh once in the background
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, daemon=True).start()
+                return token
+        return self._fetch()
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
+
+
+token_cache = PayPalTokenCache()
+
+
+def verify_signature(headers, body_json):
     verify_payload = {
         "auth_algo": headers.get('PAYPAL-AUTH-ALGO'),
         "cert_url": headers.get('PAYPAL-CERT-URL'),
@@ -27,30 +90,67 @@ def paypal_webhook(request):
         "webhook_event": body_json
     }
 
-    # Get access token
-    auth_response = requests.post(
-        "https://api-m.paypal.com/v1/oauth2/token",
-        headers={"Accept": "application/json"},
-        data={"grant_type": "client_credentials"},
-        auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET)
-    )
-
-    if auth_response.status_code != 200:
-        return JsonResponse({'status': 'error', 'message': 'Failed to get PayPal access token'}, status=500)
-
-    access_token = auth_response.json().get('access_token')
-
-    # Verify signature
-    verify_response = requests.post(
-        verification_url,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}"
-        },
-        json=verify_payload
-    )
-
-    if verify_response.status_code != 200 or verify_response.json().get('verification_status') != 'SUCCESS':
+    for attempt in range(2):
+        verify_response = session.post(
+            f"{PAYPAL_API_BASE}/v1/notifications/verify-webhook-signature",
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {token_cache.get()}"
+            },
+            json=verify_payload,
+            timeout=PAYPAL_TIMEOUT
+        )
+        if verify_response.status_code == 401 and attempt == 0:
+            # Token revoked or rotated early; fetch a new one and retry once
+            token_cache.invalidate()
+            continue
+        break
+
+    return verify_response.status_code == 200 and verify_response.json().get('verification_status') == 'SUCCESS'
+
+
+@csrf_exempt
+def paypal_webhook(request):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    headers = request.headers
+    body_json = json.loads(request.body)
+
+    # Step 0: Acknowledge retried deliveries without re-verifying or touching subscriptions
+    event_id = body_json.get('id') or headers.get('PAYPAL-TRANSMISSION-ID')
+    if not event_id:
+        return JsonResponse({'status': 'error', 'message': 'No event ID'}, status=400)
+
+    event, state = begin_event('paypal', event_id, body_json.get('event_type', ''))
+    if state == DUPLICATE:
+        return JsonResponse({'status': 'duplicate'})
+    if state == IN_PROGRESS:
+        return JsonResponse({'status': 'error', 'message': 'Event is being processed'}, status=409)
+
+    try:
+        response = process_event(headers, body_json)
+    except Exception:
+        fail_event(event)
+        raise
+
+    # Only handled events are final; rejected or failed ones may be redelivered
+    if response.status_code < 300:
+        finish_event(event)
+    else:
+        fail_event(event)
+    return response
+
+
+def process_event(headers, body_json):
+    # Step 1: Verify webhook signature via PayPal API
+    try:
+        verified = verify_signature(headers, body_json)
+    except (requests.RequestException, KeyError, ValueError) as e:
+        logger.error(f"PayPal verification request failed: {e}")
+        return JsonResponse({'status': 'error', 'message': 'Failed to verify with PayPal'}, status=500)
+
+    if not verified:
         return JsonResponse({'status': 'error', 'message': 'Invalid webhook signature'}, status=400)
 
     # Step 2: Process the event
@@ -76,6 +176,7 @@ def paypal_webhook(request):
             user_sub.status = 'trial'
 
         user_sub.save()
+        invalidate_entitlement(user_sub.user_id)
         return JsonResponse({'status': 'success'})
 
     except UserSubscription.DoesNotExist:
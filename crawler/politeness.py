@@ -0,0 +1,320 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from .http_client import aiter_text, aopen_stream, iter_text, open_stream
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ROBOTS_USER_AGENT = "OdinCrawler"
+ROBOTS_TTL = 3600
+ROBOTS_ERROR_TTL = 300
+ROBOTS_UNREACHABLE_TTL = 30  # A timeout or reset is often transient; don't block the host for long
+ROBOTS_CACHE_SIZE = 20000
+ROBOTS_MAX_BYTES = 512 * 1024
+ROBOTS_TIMEOUT = 5
+# Any content type, and no up-front size refusal: oversized files are read up to ROBOTS_MAX_BYTES
+ROBOTS_STREAM_OPTIONS = {"max_bytes": None, "content_types": None, "timeout": ROBOTS_TIMEOUT}
+
+DEFAULT_HOST_RATE = 2.0  # requests per second per host when robots.txt sets no Crawl-delay
+DEFAULT_HOST_BURST = 4
+MAX_CRAWL_DELAY = 30
+MAX_TURN_WAIT = 5.0  # Longest a fetch made on behalf of an API request sleeps for its host's turn
+HOST_BUCKETS_SIZE = 100000
+
+
+class RobotsDisallowed(Exception):
+    """Raised when robots.txt forbids fetching a URL."""
+
+
+class RateLimited(Exception):
+    """Raised when a host's next free slot is further away than the caller is willing to wait."""
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+def origin_of(url):
+    return f"{urlsplit(url).scheme.lower()}://{host_of(url)}"
+
+
+def parse_robots(text):
+    parser = RobotFileParser()
+    parser.parse(text.splitlines())
+    return parser
+
+
+def robots_for_status(status_code, text=""):
+    """Builds rules from a robots.txt response the way RFC 9309 reads status codes."""
+    parser = RobotFileParser()
+    if status_code < 300:
+        return parse_robots(text)
+    if status_code < 500:
+        parser.allow_all = True  # No robots.txt: everything is allowed
+    else:
+        parser.disallow_all = True  # Server error: assume a full disallow until we can read it
+    return parser
+
+
+def unreachable_robots():
+    """Rules for an origin whose robots.txt could not be fetched at all: disallow until the short retry."""
+    parser = RobotFileParser()
+    parser.disallow_all = True
+    parser.unreachable = True
+    return parser
+
+
+class RobotsCache:
+    """Parsed robots.txt per origin, kept for ROBOTS_TTL in a bounded LRU."""
+
+    def __init__(self, ttl=ROBOTS_TTL, maxsize=ROBOTS_CACHE_SIZE):
+        self.ttl = ttl
+        self._rules = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Pending robots.txt tasks per event loop: a task can only be awaited on the loop that runs it
+        self._inflight = weakref.WeakKeyDictionary()
+
+    def _store(self, origin, parser, status_code):
+        """Caches parser; status_code None means robots.txt was unreachable."""
+        if status_code is None:
+            ttl = ROBOTS_UNREACHABLE_TTL
+        else:
+            ttl = self.ttl if status_code < 500 else ROBOTS_ERROR_TTL
+        self._rules.set(origin, parser, ttl=ttl)
+        return parser
+
+    def rules(self, url):
+        origin = origin_of(url)
+        parser = self._rules.get(origin)
+        if parser is not None:
+            return parser
+        try:
+            # RFC 9309 lets crawlers stop reading at 500 KiB, so the rest is never downloaded
+            with open_stream(f"{origin}/robots.txt", **ROBOTS_STREAM_OPTIONS) as response:
+                status_code, text = response.status_code, "".join(iter_text(response, ROBOTS_MAX_BYTES))
+        except httpx.HTTPStatusError as e:
+            status_code, text = e.response.status_code, ""
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ robots.txt unavailable for {origin}: {e}")
+            return self._store(origin, unreachable_robots(), None)
+        return self._store(origin, robots_for_status(status_code, text), status_code)
+
+    async def arules(self, url, client):
+        origin = origin_of(url)
+        parser = self._rules.get(origin)
+        if parser is not None:
+            return parser
+        # One robots.txt request per origin, however many workers ask for it
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        task = inflight.get(origin)
+        if task is None:
+            task = asyncio.ensure_future(self._afetch(origin, client))
+            inflight[origin] = task
+            task.add_done_callback(lambda _: inflight.pop(origin, None))
+        return await asyncio.shield(task)
+
+    async def _afetch(self, origin, client):
+        try:
+            async with aopen_stream(f"{origin}/robots.txt", client=client, **ROBOTS_STREAM_OPTIONS) as response:
+                status_code = response.status_code
+                text = "".join([chunk async for chunk in aiter_text(response, ROBOTS_MAX_BYTES)])
+        except httpx.HTTPStatusError as e:
+            status_code, text = e.response.status_code, ""
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ robots.txt unavailable for {origin}: {e}")
+            return self._store(origin, unreachable_robots(), None)
+        return self._store(origin, robots_for_status(status_code, text), status_code)
+
+    def clear(self):
+        self._rules.clear()
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations; a negative balance means callers must wait."""
+
+    def __init__(self, rate=DEFAULT_HOST_RATE, capacity=DEFAULT_HOST_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def configure(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now=None):
+        """Takes a token and returns how many seconds the caller must wait before using it."""
+        now = now or time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, now=None):
+        """Takes a token if one is available now; returns 0.0, or the seconds until one will be (taking nothing)."""
+        now = now or time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def next_available(self, now=None):
+        now = now or time.monotonic()
+        self._refill(now)
+        return now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+
+
+class PolitenessScheduler:
+    """Checks robots.txt and paces requests per host with Crawl-delay-aware token buckets."""
+
+    def __init__(self, robots=None, default_rate=DEFAULT_HOST_RATE, burst=DEFAULT_HOST_BURST,
+                 max_buckets=HOST_BUCKETS_SIZE):
+        self.robots = robots or RobotsCache()
+        self.default_rate = default_rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _limits(self, parser):
+        delay = parser.crawl_delay(ROBOTS_USER_AGENT) if parser is not None else None
+        if delay:
+            return 1.0 / min(float(delay), MAX_CRAWL_DELAY), 1
+        rate = parser.request_rate(ROBOTS_USER_AGENT) if parser is not None else None
+        if rate and rate.requests and rate.seconds:
+            return rate.requests / rate.seconds, 1
+        return self.default_rate, self.burst
+
+    def _bucket(self, host, parser=None):
+        # Caller holds self._lock
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(*self._limits(parser))
+            self._buckets[host] = bucket
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)  # Idle buckets are full anyway
+        elif parser is not None:
+            bucket.configure(*self._limits(parser))
+        self._buckets.move_to_end(host)
+        return bucket
+
+    def _reserve(self, url, parser, max_wait=None):
+        if not parser.can_fetch(ROBOTS_USER_AGENT, url):
+            if getattr(parser, "unreachable", False):
+                raise RobotsDisallowed(f"robots.txt unreachable, retry shortly: {url}")
+            raise RobotsDisallowed(f"Blocked by robots.txt: {url}")
+        with self._lock:
+            bucket = self._bucket(host_of(url), parser)
+            now = time.monotonic()
+            wait = bucket.next_available(now) - now
+            if max_wait is not None and wait > max_wait:
+                # Fail without taking a token, so queued callers aren't pushed back further
+                raise RateLimited(f"Rate limited: {host_of(url)} is busy, retry in {wait:.0f}s")
+            return bucket.reserve(now)
+
+    def next_available(self, host):
+        with self._lock:
+            return self._bucket(host).next_available()
+
+    def interval(self, host):
+        with self._lock:
+            return 1.0 / self._bucket(host).rate
+
+    def wait_turn(self, url, max_wait=MAX_TURN_WAIT):
+        """Blocks until url may be fetched; raises RobotsDisallowed if it may not, RateLimited if not soon enough."""
+        delay = self._reserve(url, self.robots.rules(url), max_wait)
+        if delay:
+            time.sleep(delay)
+
+    async def await_turn(self, url, client, max_wait=None):
+        delay = self._reserve(url, await self.robots.arules(url, client), max_wait)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def clear(self):
+        self.robots.clear()
+        with self._lock:
+            self._buckets.clear()
+
+
+class FairFrontier:
+    """asyncio frontier with a queue per host, served earliest-available host first."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._queues = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._ready = asyncio.Event()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def _schedule(self, host, ready_at):
+        heapq.heappush(self._heap, (ready_at, next(self._counter), host))
+        self._ready.set()
+
+    def put_nowait(self, item):
+        host = host_of(item[0])
+        queue = self._queues.get(host)
+        if queue is None:
+            queue = self._queues[host] = deque()
+        if not queue:
+            self._schedule(host, self.scheduler.next_available(host))
+        queue.append(item)
+        self._unfinished += 1
+        self._finished.clear()
+
+    async def get(self):
+        while True:
+            if not self._heap:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            ready_at, _, host = self._heap[0]
+            wait = ready_at - time.monotonic()
+            if wait > 0:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            queue = self._queues[host]
+            item = queue.popleft()
+            if queue:
+                # Next turn for this host comes after the reservation this item is about to make
+                self._schedule(host, self.scheduler.next_available(host) + self.scheduler.interval(host))
+            else:
+                del self._queues[host]
+            return item
+
+    def task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    def qsize(self):
+        return self._unfinished
+
+
+SCHEDULER = PolitenessScheduler()
@@ -0,0 +1,263 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .metrics import QUOTA_REJECTIONS
+from .models import QuotaUsage
+from .politeness import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Per-plan admission limits: token buckets smooth bursts, daily caps bound total cost.
+# Paying users get the headroom, so trial traffic can't crowd them out.
+PLAN_LIMITS = {
+    "trial": {
+        "fetch_rate": 0.5, "fetch_burst": 5,
+        "render_rate": 1 / 60, "render_burst": 2,
+        "daily_fetches": 200, "daily_renders": 20, "daily_bytes": 50 * MB,
+    },
+    "active": {
+        "fetch_rate": 5.0, "fetch_burst": 30,
+        "render_rate": 0.2, "render_burst": 5,
+        "daily_fetches": 20000, "daily_renders": 2000, "daily_bytes": 5 * 1024 * MB,
+    },
+}
+QUOTA_FLUSH_INTERVAL = 5.0
+QUOTA_REFRESH_INTERVAL = 30.0  # How stale this worker's view of other workers' usage may get
+QUOTA_USERS_SIZE = 10000
+QUOTA_MAX_WAIT = 30.0  # Batches and jobs sleep this long at most for a rate token before failing an item
+
+USAGE_FIELDS = ("fetches", "renders", "bytes")
+KIND_FIELDS = {"fetch": "fetches", "render": "renders"}
+
+# Adds this worker's counts to whatever other workers have already written for the day
+UPSERT_SQL = """
+    INSERT INTO crawler_quotausage (user_id, day, fetches, renders, bytes, updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        fetches = crawler_quotausage.fetches + excluded.fetches,
+        renders = crawler_quotausage.renders + excluded.renders,
+        bytes = crawler_quotausage.bytes + excluded.bytes,
+        updated_at = excluded.updated_at
+"""
+
+
+class QuotaExceeded(Exception):
+    """Raised when a user's plan does not allow another fetch or render right now."""
+
+    def __init__(self, kind, retry_after, message):
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+def seconds_until_tomorrow(now=None):
+    now = now or timezone.now()
+    midnight = (now + timezone.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+class _UserUsage:
+    def __init__(self, plan, limits, day):
+        self.plan = plan
+        self.day = day
+        self.buckets = {
+            "fetch": TokenBucket(limits["fetch_rate"], limits["fetch_burst"]),
+            "render": TokenBucket(limits["render_rate"], limits["render_burst"]),
+        }
+        self.base = dict.fromkeys(USAGE_FIELDS, 0)  # Day totals in the database when last loaded
+        self.local = dict.fromkeys(USAGE_FIELDS, 0)  # Added by this process since then
+        self.loaded_at = None
+
+    def configure(self, plan, limits):
+        self.plan = plan
+        self.buckets["fetch"].configure(limits["fetch_rate"], limits["fetch_burst"])
+        self.buckets["render"].configure(limits["render_rate"], limits["render_burst"])
+
+    def total(self, field):
+        return self.base[field] + self.local[field]
+
+
+class UsageMeter:
+    """Per-user token buckets and daily counters, synced to QuotaUsage in batches.
+
+    Each worker keeps an LRU of at most max_users users and re-reads their day totals every
+    refresh_interval, so caps hold across workers to within that window.
+    """
+
+    def __init__(self, plans=PLAN_LIMITS, flush_interval=QUOTA_FLUSH_INTERVAL,
+                 refresh_interval=QUOTA_REFRESH_INTERVAL, max_users=QUOTA_USERS_SIZE):
+        self.plans = plans
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _usage(self, user_id, plan, day):
+        usage = self._users.get(user_id)
+        if usage is None or usage.day != day:
+            usage = self._users[user_id] = _UserUsage(plan, self.plans[plan], day)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)  # Unsynced counts stay in _pending
+        elif usage.plan != plan:
+            usage.configure(plan, self.plans[plan])
+        self._users.move_to_end(user_id)
+        return usage
+
+    def _add(self, user_id, day, field, amount):
+        pending = self._pending.setdefault((user_id, day), dict.fromkeys(USAGE_FIELDS, 0))
+        pending[field] += amount
+
+    def _load(self, user_id, plan):
+        today = timezone.now().date()
+        with self._lock:
+            usage = self._usage(user_id, plan, today)
+            fresh = usage.loaded_at is not None and time.monotonic() - usage.loaded_at < self.refresh_interval
+        if fresh:
+            return
+        row = QuotaUsage.objects.filter(user_id=user_id, day=today).values(*USAGE_FIELDS).first()
+        with self._lock:
+            pending = self._pending.get((user_id, today), {})
+            usage.base = row or dict.fromkeys(USAGE_FIELDS, 0)
+            usage.local = {field: pending.get(field, 0) for field in USAGE_FIELDS}
+            usage.loaded_at = time.monotonic()
+
+    def _reject(self, plan, kind, retry_after, message):
+        QUOTA_REJECTIONS.inc(plan=plan, kind=kind)
+        raise QuotaExceeded(kind, retry_after, message)
+
+    def _check_daily(self, usage, limits, kind):
+        if usage.total(KIND_FIELDS[kind]) >= limits[f"daily_{KIND_FIELDS[kind]}"]:
+            self._reject(usage.plan, kind, seconds_until_tomorrow(), f"Daily {kind} limit reached")
+        if usage.total("bytes") >= limits["daily_bytes"]:
+            self._reject(usage.plan, "bytes", seconds_until_tomorrow(), "Daily download limit reached")
+
+    def check(self, user_id, plan):
+        """Raises QuotaExceeded if user_id has no fetches left today, without using any."""
+        if plan not in self.plans:
+            self._reject(plan, "fetch", None, f"No crawl quota for plan {plan}")
+        self._load(user_id, plan)
+        with self._lock:
+            self._check_daily(self._usage(user_id, plan, timezone.now().date()), self.plans[plan], "fetch")
+
+    def admit(self, user_id, plan, kind="fetch", wait=0.0):
+        """Charges one fetch or render to user_id, or raises QuotaExceeded with a retry-after.
+
+        Callers that can be paced (batches, jobs) pass wait to sleep for a rate token instead of failing.
+        Only fetches refresh totals from the database, so renders can be admitted from any thread.
+        """
+        if plan not in self.plans:
+            self._reject(plan, kind, None, f"No crawl quota for plan {plan}")
+        if kind == "fetch":
+            self._load(user_id, plan)
+        limits = self.plans[plan]
+        with self._lock:
+            usage = self._usage(user_id, plan, timezone.now().date())
+            self._check_daily(usage, limits, kind)
+            bucket = usage.buckets[kind]
+            delay = bucket.take()
+            if delay > wait:
+                self._reject(plan, kind, delay, f"Too many {kind} requests")
+            if delay:
+                delay = bucket.reserve()
+            usage.local[KIND_FIELDS[kind]] += 1
+            self._add(user_id, usage.day, KIND_FIELDS[kind], 1)
+        if delay:
+            time.sleep(delay)
+
+    def charge_bytes(self, user_id, plan, amount):
+        """Counts downloaded bytes; the daily byte cap is enforced on the next admit()."""
+        if not amount:
+            return
+        today = timezone.now().date()
+        with self._lock:
+            usage = self._users.get(user_id)
+            if usage is not None and usage.day == today:
+                usage.local["bytes"] += amount
+            self._add(user_id, today, "bytes", amount)
+
+    def due(self):
+        with self._lock:
+            return bool(self._pending) and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush_if_due(self):
+        return self.flush() if self.due() else 0
+
+    def flush(self):
+        """Adds all pending counts to QuotaUsage in one statement; returns how many rows were touched."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        now = timezone.now()
+        rows = [
+            (user_id, day, counts["fetches"], counts["renders"], counts["bytes"], now)
+            for (user_id, day), counts in pending.items()
+        ]
+        try:
+            with connection.cursor() as cursor:
+                cursor.executemany(UPSERT_SQL, rows)
+        except DatabaseError as e:
+            logger.error(f"❌ Could not store quota usage for {len(rows)} users: {e}")
+            with self._lock:
+                for (user_id, day), counts in pending.items():
+                    for field, amount in counts.items():
+                        self._add(user_id, day, field, amount)
+            return 0
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._pending.clear()
+
+    def __len__(self):
+        return len(self._users)
+
+
+METER = UsageMeter()
+
+_current_quota = contextvars.ContextVar("crawl_quota", default=None)
+
+
+class UserQuota:
+    """One user's plan on a meter; inside activate(), renders and bytes deep in the scraper are charged to it."""
+
+    def __init__(self, user_id, plan, meter=None):
+        self.user_id = int(user_id)
+        self.plan = plan
+        self.meter = METER if meter is None else meter
+
+    def check(self):
+        self.meter.check(self.user_id, self.plan)
+
+    def admit(self, kind="fetch", wait=0.0):
+        self.meter.admit(self.user_id, self.plan, kind, wait)
+
+    def charge_bytes(self, amount):
+        self.meter.charge_bytes(self.user_id, self.plan, amount)
+
+    @contextmanager
+    def activate(self):
+        token = _current_quota.set(self)
+        try:
+            yield self
+        finally:
+            _current_quota.reset(token)
+
+
+def current_quota():
+    return _current_quota.get()
+
@@ -0,0 +1,200 @@
+import json
+import logging
+import re
+import time
+from urllib.parse import urljoin
+
+from lxml import etree, html as lxml_html
+
+from .extract import build_result
+
+logger = logging.getLogger(__name__)
+
+# Mount points used by the common SPA frameworks
+ROOT_MOUNT_IDS = {"root", "app", "__next", "__nuxt", "___gatsby", "svelte", "main-app"}
+ROOT_MOUNT_TAGS = {"app-root"}
+NOSCRIPT_HINTS = ("enable javascript", "javascript is required", "javascript is disabled", "requires javascript")
+INLINE_STATE_RE = re.compile(
+    r"window\.(__INITIAL_STATE__|__PRELOADED_STATE__|__APOLLO_STATE__|__NUXT__|__STATE__)\s*=\s*"
+)
+
+MIN_VISIBLE_TEXT = 200
+MAX_SCRIPT_TEXT_RATIO = 5.0
+MIN_EMBEDDED_TEXT = 200
+
+# Resource patterns the lightweight render profile never downloads
+BLOCKED_RESOURCE_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.avif",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3", "*.ogg", "*.wav", "*.m3u8",
+]
+RENDER_TIME_BUDGET = 15
+NETWORK_IDLE_TIME = 0.5
+
+
+def parse_html(html):
+    """Parses html into an lxml tree, or returns None; parse once and share it between the helpers below."""
+    try:
+        return lxml_html.fromstring(html)
+    except (ValueError, etree.ParserError):
+        return None
+
+
+def _visible_text(doc):
+    parts = []
+    for node in doc.iter():
+        if not isinstance(node.tag, str) or node.tag in ("script", "style", "noscript", "template"):
+            continue
+        if node.text and node.text.strip():
+            parts.append(node.text.strip())
+        parent = node.getparent()
+        if node.tail and node.tail.strip() and (parent is None or parent.tag not in ("script", "style", "noscript", "template")):
+            parts.append(node.tail.strip())
+    return " ".join(parts)
+
+
+def _has_empty_mount(doc):
+    for node in doc.iter(*ROOT_MOUNT_TAGS, "div", "main"):
+        if node.tag in ROOT_MOUNT_TAGS or node.get("id") in ROOT_MOUNT_IDS:
+            if len(node) == 0 and not (node.text or "").strip():
+                return True
+    return False
+
+
+def detect_render(html):
+    """Decides from page structure whether html needs a browser; returns (needs_render, reason)."""
+    return detect_render_tree(parse_html(html))
+
+
+def detect_render_tree(doc):
+    """detect_render() for a tree from parse_html()."""
+    if doc is None:
+        return True, "unparseable document"
+
+    visible = _visible_text(doc)
+    if _has_empty_mount(doc) and len(visible) < MIN_VISIBLE_TEXT * 5:
+        return True, "empty root mount node"
+
+    script_text = sum(len(script.text or "") for script in doc.iter("script"))
+    if len(visible) < MIN_VISIBLE_TEXT:
+        if script_text and script_text > MAX_SCRIPT_TEXT_RATIO * max(len(visible), 1):
+            return True, "script-heavy page with little text"
+        for noscript in doc.iter("noscript"):
+            if any(hint in noscript.text_content().lower() for hint in NOSCRIPT_HINTS):
+                return True, "noscript asks for JavaScript"
+
+    return False, None
+
+
+def _walk_strings(value, out, limit):
+    if len(out) >= limit:
+        return
+    if isinstance(value, str):
+        text = value.strip()
+        if len(text) > 40 and not text.startswith(("http://", "https://", "/", "{", "[")):
+            out.append(text)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _walk_strings(item, out, limit)
+    elif isinstance(value, list):
+        for item in value:
+            _walk_strings(item, out, limit)
+
+
+def _json_ld_items(doc):
+    for script in doc.iter("script"):
+        if (script.get("type") or "").lower() != "application/ld+json" or not script.text:
+            continue
+        try:
+            data = json.loads(script.text)
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else [data]
+        for item in items:
+            if isinstance(item, dict) and "@graph" in item:
+                items.extend(entry for entry in item["@graph"] if isinstance(entry, dict))
+            elif isinstance(item, dict):
+                yield item
+
+
+def _inline_states(doc):
+    decoder = json.JSONDecoder()
+    for script in doc.iter("script"):
+        if script.get("id") == "__NEXT_DATA__" and script.text:
+            try:
+                yield json.loads(script.text)
+            except ValueError:
+                pass
+            continue
+        text = script.text or ""
+        for match in INLINE_STATE_RE.finditer(text):
+            try:
+                state, _ = decoder.raw_decode(text, match.end())
+                yield state
+            except ValueError:
+                continue
+
+
+def _image_urls(value, url):
+    if isinstance(value, str):
+        return [urljoin(url, value)]
+    if isinstance(value, dict):
+        return _image_urls(value.get("url") or value.get("contentUrl"), url)
+    if isinstance(value, list):
+        return [image for item in value for image in _image_urls(item, url)]
+    return []
+
+
+def extract_embedded_data(html, url="Unknown"):
+    """Builds an extract_data-shaped result from JSON-LD, __NEXT_DATA__ or inline state, or returns None."""
+    return extract_embedded_tree(parse_html(html), url)
+
+
+def extract_embedded_tree(doc, url="Unknown"):
+    """extract_embedded_data() for a tree from parse_html()."""
+    if doc is None:
+        return None
+
+    headline = None
+    texts = []
+    images = []
+    for item in _json_ld_items(doc):
+        headline = headline or item.get("headline") or item.get("name")
+        for key in ("articleBody", "description", "text"):
+            if isinstance(item.get(key), str) and item[key].strip():
+                texts.append(item[key].strip())
+        images.extend(_image_urls(item.get("image"), url))
+
+    if sum(len(text) for text in texts) < MIN_EMBEDDED_TEXT:
+        for state in _inline_states(doc):
+            _walk_strings(state, texts, limit=200)
+
+    text_content = "\n".join(texts)
+    if len(text_content) < MIN_EMBEDDED_TEXT:
+        return None
+
+    title = doc.find(".//title")
+    if not headline:
+        headline = title.text_content().strip() if title is not None else "No Title Available"
+
+    return build_result(url, headline, text_content, list(dict.fromkeys(images)))
+
+
+def wait_for_network_idle(driver, budget=RENDER_TIME_BUDGET, idle_time=NETWORK_IDLE_TIME):
+    """Polls the page until it has loaded and no new resources arrived for idle_time, within budget."""
+    deadline = time.monotonic() + budget
+    last_count = -1
+    stable_since = time.monotonic()
+    while time.monotonic() < deadline:
+        state, count = driver.execute_script(
+            "return [document.readyState, performance.getEntriesByType('resource').length];"
+        )
+        now = time.monotonic()
+        if count != last_count:
+            last_count = count
+            stable_since = now
+        elif state == "complete" and now - stable_since >= idle_time:
+            return True
+        time.sleep(0.1)
+    logger.warning("⚠️ Render budget exhausted before network went idle")
+    return False
@@ -0,0 +1,138 @@
+import atexit
+import hashlib
+import logging
+import threading
+import time
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .canonical import canonicalize
+from .models import CrawlResult
+
+logger = logging.getLogger(__name__)
+
+RESULT_BATCH_SIZE = 200
+RESULT_FLUSH_INTERVAL = 2.0  # Seconds a buffered result may wait for its batch
+RESULT_BUFFER_LIMIT = 10 * RESULT_BATCH_SIZE  # Oldest results are dropped if nobody flushes
+UPSERT_FIELDS = ("url", "content_hash", "status", "error", "headline", "text_content", "images", "fetched_at")
+ERROR_UPSERT_FIELDS = ("url", "status", "error", "fetched_at")  # A failed refetch keeps the last good content
+
+
+def url_hash(url):
+    return hashlib.blake2b((canonicalize(url) or url).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def content_hash(text):
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_record(url, data, fetched_at=None):
+    """Turns a scrape_page_content() result into an unsaved CrawlResult."""
+    url = canonicalize(url) or url
+    if "error" in data:
+        return CrawlResult(
+            url_hash=url_hash(url), url=url, status=CrawlResult.ERROR, error=str(data["error"]),
+            fetched_at=fetched_at or timezone.now(),
+        )
+    text = data.get("text_content") or ""
+    return CrawlResult(
+        url_hash=url_hash(url),
+        url=url,
+        content_hash=content_hash(text),
+        status=CrawlResult.SUCCESS,
+        headline=data.get("headline") or "",
+        text_content=text,
+        images=list(data.get("images") or []),
+        fetched_at=fetched_at or timezone.now(),
+    )
+
+
+def save_records(records):
+    """Upserts records with bulk INSERT ... ON CONFLICT(url_hash) DO UPDATE; returns how many were written.
+
+    Error records only update status, error and fetched_at, so stored content survives a failed refetch.
+    """
+    latest = {}
+    for record in records:
+        latest[record.url_hash] = record  # A statement may touch each row once: keep the newest
+    if not latest:
+        return 0
+    for status, update_fields in ((CrawlResult.SUCCESS, UPSERT_FIELDS), (CrawlResult.ERROR, ERROR_UPSERT_FIELDS)):
+        batch = [record for record in latest.values() if record.status == status]
+        if batch:
+            CrawlResult.objects.bulk_create(
+                batch,
+                batch_size=RESULT_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=["url_hash"],
+                update_fields=update_fields,
+            )
+    return len(latest)
+
+
+class ResultWriter:
+    """Buffers crawl results from any thread; request and job threads write them out in batches.
+
+    Fetching threads only call add(). Views, batches and jobs call flush_if_due()/flush(),
+    so database writes stay on threads whose connections Django manages.
+    """
+
+    def __init__(self, batch_size=RESULT_BATCH_SIZE, flush_interval=RESULT_FLUSH_INTERVAL,
+                 buffer_limit=RESULT_BUFFER_LIMIT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer_limit = buffer_limit
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def add(self, url, data):
+        record = build_record(url, data)
+        with self._lock:
+            self._buffer.append(record)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._buffer) > self.buffer_limit:
+                dropped = len(self._buffer) - self.buffer_limit
+                del self._buffer[:dropped]
+                logger.warning(f"⚠️ Result buffer full, dropped {dropped} unsaved crawl results")
+
+    def due(self):
+        with self._lock:
+            if not self._buffer:
+                return False
+            return len(self._buffer) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_interval
+
+    def flush_if_due(self):
+        return self.flush() if self.due() else 0
+
+    def flush(self):
+        with self._lock:
+            records, self._buffer, self._oldest = self._buffer, [], None
+        if not records:
+            return 0
+        try:
+            return save_records(records)
+        except DatabaseError as e:
+            logger.error(f"❌ Could not store {len(records)} crawl results: {e}")
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._buffer, self._oldest = [], None
+
+    def __len__(self):
+        return len(self._buffer)
+
+
+RESULT_WRITER = ResultWriter()
+
+
+@atexit.register
+def flush_on_exit():
+    """Writes results still buffered when the process exits between batch flushes."""
+    try:
+        RESULT_WRITER.flush()
+    except Exception as e:
+        logger.error(f"❌ Could not store buffered crawl results on exit: {e}")
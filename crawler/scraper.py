@@ -1,129 +1,283 @@
 import os
-import json
 import logging
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from duckduckgo_search import DDGS
-from django.http import JsonResponse, FileResponse
+import time
+import httpx
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
+
+from .canonical import unique_urls
+from .engine import crawl_site
+from .exports import export_path, export_response, write_export
+from .extract import SoupExtractor, extract_html, get_extractor
+from .http_client import ContentRejected, aiter_text, aopen_stream, get_async_client, iter_text, open_stream
+from .metrics import FETCH_ERRORS, FETCHED_BYTES, RENDER_PATHS, STAGE_SECONDS, host_label
+from .page_cache import PAGE_CACHE
+from .politeness import MAX_TURN_WAIT, SCHEDULER, RateLimited, RobotsDisallowed
+from .quotas import QuotaExceeded, current_quota
+from .render import detect_render_tree, extract_embedded_tree, parse_html, wait_for_network_idle
+from .result_store import RESULT_WRITER
+from .ttl_cache import SingleFlight, TTLCache
 
 # Configure logging
 logging.basicConfig(filename="crawler.log", level=logging.INFO, format="%(asctime)s - %(message)s")
 
-# Headers for web requests
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
-}
+# Keyword results are shared between users for a short while
+SEARCH_CACHE_TTL = 15 * 60
+SEARCH_CACHE = TTLCache(maxsize=2048, ttl=SEARCH_CACHE_TTL)
+SEARCH_FLIGHTS = SingleFlight()
 
-# Get user's Documents folder for saving CSV
-DOCUMENTS_FOLDER = os.path.join(os.path.expanduser("~"), "Documents")
-CSV_FILE_PATH = os.path.join(DOCUMENTS_FOLDER, "Extracted_Links.csv")
+RENDER_QUOTA_WARNING = "Render quota exceeded; content was extracted without running JavaScript"
 
-# Ensure the directory exists
-os.makedirs(DOCUMENTS_FOLDER, exist_ok=True)
+def crawl_website(url, max_depth=0, max_pages=1, **options):
+    """Extracts all links from a website, following same-domain links up to max_depth."""
+    result = crawl_site(url, max_depth=max_depth, max_pages=max_pages, **options)
+    errors = [page["error"] for page in result["pages"] if page["error"]]
+    if not result["links"] and errors:
+        return [f"Request failed: {errors[0]}"]
+    return result["links"] if result["links"] else ["No links found"]
 
-def crawl_website(url):
-    """Extracts all links from a given website."""
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, "html.parser")
-        links = [a["href"] for a in soup.find_all("a", href=True)]
-        
-        return links if links else ["No links found"]
-    except requests.RequestException as e:
-        logging.error(f"Request failed: {e}")
-        return [f"Request failed: {e}"]
+class StreamedPage:
+    """Feeds a streamed body to the extractor, timing parse separately from the download it interleaves with."""
+
+    def __init__(self, url):
+        self.extractor = get_extractor(url)
+        self.chunks = []
+        self.finished_early = False
+        self.parse_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def feed(self, text):
+        self.chunks.append(text)
+        parse_started = time.perf_counter()
+        self.finished_early = self.extractor.feed(text)
+        self.parse_seconds += time.perf_counter() - parse_started
+        return self.finished_early
+
+    def downloaded(self, response):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started - self.parse_seconds, stage="download")
+        FETCHED_BYTES.inc(response.num_bytes_downloaded)
+        quota = current_quota()
+        if quota is not None:
+            quota.charge_bytes(response.num_bytes_downloaded)
+
+    def result(self, response):
+        parse_started = time.perf_counter()
+        data = self.extractor.close()
+        STAGE_SECONDS.observe(self.parse_seconds + time.perf_counter() - parse_started, stage="parse")
+        html = None if self.finished_early else "".join(self.chunks)
+        return data, html, self.finished_early, response
+
+def stream_page(url, headers=None):
+    """Streams a page into the extractor; returns (data, html, finished_early, response)."""
+    with open_stream(url, headers=headers) as response:
+        if response.status_code == 304:
+            return None, None, False, response
+        page = StreamedPage(url)
+        try:
+            for text in iter_text(response):
+                if page.feed(text):
+                    break
+        finally:
+            page.downloaded(response)
+    return page.result(response)
+
+async def astream_page(url, headers=None):
+    """Async counterpart of stream_page, on the running event loop's client."""
+    async with aopen_stream(url, headers=headers) as response:
+        if response.status_code == 304:
+            return None, None, False, response
+        page = StreamedPage(url)
+        try:
+            async for text in aiter_text(response):
+                if page.feed(text):
+                    break
+        finally:
+            page.downloaded(response)
+    return page.result(response)
 
 def scrape_page_content(url):
-    """Scrapes the full content of a webpage."""
+    """Scrapes the full content of a webpage, answering from the page cache when it can."""
+    cached = PAGE_CACHE.lookup(url)
+    if PAGE_CACHE.is_fresh(cached):
+        PAGE_CACHE.record("hits")
+        return cached["data"]
+
+    data = fetch_page_content(url, cached)
+    RESULT_WRITER.add(url, data)  # Written in batches by the calling view or job
+    return data
+
+async def ascrape_page_content(url):
+    """Async counterpart of scrape_page_content for ASGI views."""
+    cached = PAGE_CACHE.lookup(url)
+    if PAGE_CACHE.is_fresh(cached):
+        PAGE_CACHE.record("hits")
+        return cached["data"]
+
+    data = await afetch_page_content(url, cached)
+    RESULT_WRITER.add(url, data)
+    return data
+
+def render_fallback(html, url):
+    """Returns (data, needs_selenium) for a page whose HTML may be a JavaScript shell."""
+    doc = parse_html(html)  # One tree for both checks; the streaming extractor's tree is already pruned
+    needs_render, reason = detect_render_tree(doc)
+    if not needs_render:
+        return None, False
+    embedded = extract_embedded_tree(doc, url)
+    if embedded:
+        logging.info(f"📦 Using embedded page data for {url}")
+        RENDER_PATHS.inc(path="embedded")
+        return embedded, False
+    logging.warning(f"⚠️ Page might be JavaScript-rendered ({reason}): {url}")
+    RENDER_PATHS.inc(path="selenium")
+    return None, True
+
+def render_allowed(url):
+    """Charges a Selenium render to the active user quota; False means serve the unrendered page."""
+    quota = current_quota()
+    if quota is None:
+        return True
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-        
-        if len(response.text) < 1000:
-            logging.warning(f"⚠️ Page might be JavaScript-rendered: {url}")
-            return scrape_with_selenium(url)
-        
-        soup = BeautifulSoup(response.text, "html.parser")
-        return extract_data(soup, url)
-    except requests.RequestException as e:
-        logging.error(f"❌ Error fetching {url}: {e}")
-        return {"error": str(e)}
+        quota.admit("render")
+        return True
+    except QuotaExceeded as e:
+        logging.warning(f"⚠️ Not rendering {url}: {e}")
+        return False
+
+def fetch_failed(url, error):
+    if isinstance(error, (ContentRejected, RobotsDisallowed, RateLimited)):
+        logging.warning(f"⚠️ Skipping {url}: {error}")
+    else:
+        logging.error(f"❌ Error fetching {url}: {error}")
+    FETCH_ERRORS.inc(host=host_label(urlparse(url).hostname), reason=type(error).__name__)
+    return {"error": str(error)}
+
+def fetch_page_content(url, cached=None):
+    """Fetches and extracts a page, revalidating the cached entry if there is one."""
+    try:
+        SCHEDULER.wait_turn(url)
+        data, html, finished_early, response = stream_page(url, headers=PAGE_CACHE.validators(cached))
+        if response.status_code == 304 and cached:
+            logging.info(f"♻️ Revalidated cached page for {url}")
+            return PAGE_CACHE.revalidated(url, cached, response.headers)["data"]
+        PAGE_CACHE.record("stale" if cached else "misses")
+
+        if not finished_early:
+            embedded, needs_selenium = render_fallback(html, url)
+            if needs_selenium:
+                if not render_allowed(url):
+                    return dict(data, warning=RENDER_QUOTA_WARNING)  # Not cached: others may render it
+                with STAGE_SECONDS.time(stage="render"):
+                    data = scrape_with_selenium(url)
+            elif embedded:
+                data = embedded
+
+        if "error" not in data:
+            PAGE_CACHE.store(url, data, response.headers)
+        return data
+    except (ContentRejected, RobotsDisallowed, RateLimited, httpx.HTTPError) as e:
+        return fetch_failed(url, e)
+
+async def afetch_page_content(url, cached=None):
+    """Async counterpart of fetch_page_content; only a Selenium render leaves the event loop."""
+    try:
+        await SCHEDULER.await_turn(url, get_async_client(), max_wait=MAX_TURN_WAIT)
+        data, html, finished_early, response = await astream_page(url, headers=PAGE_CACHE.validators(cached))
+        if response.status_code == 304 and cached:
+            logging.info(f"♻️ Revalidated cached page for {url}")
+            return PAGE_CACHE.revalidated(url, cached, response.headers)["data"]
+        PAGE_CACHE.record("stale" if cached else "misses")
+
+        if not finished_early:
+            embedded, needs_selenium = render_fallback(html, url)
+            if needs_selenium:
+                if not render_allowed(url):
+                    return dict(data, warning=RENDER_QUOTA_WARNING)
+                with STAGE_SECONDS.time(stage="render"):
+                    data = await sync_to_async(scrape_with_selenium, thread_sensitive=False)(url)
+            elif embedded:
+                data = embedded
+
+        if "error" not in data:
+            PAGE_CACHE.store(url, data, response.headers)
+        return data
+    except (ContentRejected, RobotsDisallowed, RateLimited, httpx.HTTPError) as e:
+        return fetch_failed(url, e)
 
 def scrape_with_selenium(url):
-    """Scrapes JavaScript-rendered pages using Selenium."""
+    """Scrapes JavaScript-rendered pages using a pooled Selenium session."""
+    from selenium.common.exceptions import TimeoutException
+
+    from .browser_pool import get_browser_pool
+
     logging.info(f"🌐 Using Selenium for {url}")
-    
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.get(url)
-    
-    soup = BeautifulSoup(driver.page_source, "html.parser")
-    driver.quit()
-    
-    return extract_data(soup, url)
+
+    with get_browser_pool().session() as driver:
+        try:
+            driver.get(url)
+        except TimeoutException:
+            logging.warning(f"⚠️ Render budget hit while loading {url}, using partial DOM")
+            driver.execute_script("window.stop();")
+        wait_for_network_idle(driver)
+        page_source = driver.page_source
+
+    return extract_html(page_source, url)
 
 def extract_data(soup, url="Unknown"):
-    """Extracts structured data from a webpage."""
-    headline = soup.find("title").text if soup.find("title") else "No Title Available"
-    paragraphs = soup.find_all(["p", "h1", "h2", "h3", "h4", "h5", "h6"])
-    text_content = "\n".join([p.text.strip() for p in paragraphs if p.text.strip()])
-    
-    if not text_content:
-        text_content = soup.get_text().strip()[:5000]  # Fallback if structured content isn't found
-    
-    # Convert relative image URLs to absolute URLs
-    images = []
-    for img in soup.find_all("img"):
-        src = img.get("src")
-        if src:
-            full_url = urljoin(url, src)  # Convert to absolute URL
-            images.append(full_url)
-
-    return {
-        "url": url,
-        "headline": headline,
-        "text_content": text_content[:5000] if text_content else "No Content Extracted",
-        "images": images[:5]  # Limit to 5 images
-    }
-
-def save_to_csv(data, filename=CSV_FILE_PATH):
-    """Saves extracted links to a CSV file."""
-    try:
-        df = pd.DataFrame(data, columns=["URL"])
-        df.to_csv(filename, index=False, encoding="utf-8")
-        logging.info(f"✅ Data saved to {filename}")
-    except Exception as e:
-        logging.error(f"⚠️ Failed to save CSV: {e}")
+    """Extracts structured data from an already-parsed BeautifulSoup tree."""
+    return SoupExtractor.extract_soup(soup, url)
+
+def save_to_csv(links):
+    """Writes extracted links to a new per-request CSV export and returns its file name."""
+    return write_export(({"URL": link} for link in links), "csv", columns=("URL",))
+
+def normalize_keyword(keyword):
+    return " ".join(keyword.lower().split())
+
+def _search_duckduckgo(keyword, num_results):
+    from duckduckgo_search import DDGS
+
+    with DDGS() as ddgs:
+        results = ddgs.text(keyword, max_results=num_results)
+        return unique_urls(result.get("href", "") for result in results)
+
+def _covers(entry, num_results):
+    fetched_for, links = entry
+    # A cached list serves any smaller request, or any request if upstream had no more results
+    return num_results <= fetched_for or len(links) < fetched_for
+
+def _cached_search(keyword, num_results):
+    cached = SEARCH_CACHE.get(keyword)
+    if cached is not None and _covers(cached, num_results):
+        return cached
+    wanted = max(num_results, cached[0]) if cached is not None else num_results
+    entry = (wanted, _search_duckduckgo(keyword, wanted))
+    current = SEARCH_CACHE.get(keyword)
+    if current is None or current[0] <= wanted:
+        SEARCH_CACHE.set(keyword, entry)
+    return entry
 
 def search_web(keyword, num_results=100):
     """Search DuckDuckGo for relevant links based on the keyword."""
-    search_results = set()
+    keyword = normalize_keyword(keyword)
     try:
-        with DDGS() as ddgs:
-            results = ddgs.text(keyword, max_results=num_results)
-            for result in results:
-                link = result.get("href", "")
-                if link.startswith("http") and link not in search_results:
-                    search_results.add(link)
+        # Flights are shared per keyword; a caller that joined a smaller in-flight search asks again for the rest
+        for _ in range(2):
+            entry = SEARCH_FLIGHTS.do(keyword, _cached_search, keyword, num_results)
+            if _covers(entry, num_results):
+                break
+        return list(entry[1][:num_results])
     except Exception as e:
         logging.error(f"Error in DuckDuckGo search: {e}")
-    return list(search_results)
+        return []
+
+async def asearch_web(keyword, num_results=100):
+    """Runs search_web() on a worker thread; the DuckDuckGo client is synchronous."""
+    return await sync_to_async(search_web, thread_sensitive=False)(keyword, num_results)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class SearchView(View):
@@ -138,13 +292,25 @@ class SearchView(View):
         if not links:
             return JsonResponse({"message": "No links found."})
         
-        save_to_csv([[link] for link in links])
-        return JsonResponse({"message": "✅ Links extracted successfully!", "links": links, "download_csv": "/download"})
+        try:
+            export = save_to_csv(links)
+        except OSError as e:
+            logging.error(f"⚠️ Failed to save CSV: {e}")
+            export = None
+        return JsonResponse({
+            "message": "✅ Links extracted successfully!",
+            "links": links,
+            "download_csv": f"/download?file={export}" if export else None,
+        })
 
 class DownloadCSVView(View):
     def get(self, request):
-        """Allow users to download the extracted links CSV file."""
-        return FileResponse(open(CSV_FILE_PATH, "rb"), as_attachment=True)
+        """Allow users to download an extracted links export, with byte-range support."""
+        name = request.GET.get('file', '')
+        path = export_path(name)
+        if path is None or not os.path.exists(path):
+            return JsonResponse({"error": "Export not found or expired"}, status=404)
+        return export_response(request, path, name)
 
 class ScrapeView(View):
     def get(self, request):
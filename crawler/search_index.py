@@ -0,0 +1,77 @@
+import logging
+import re
+
+from django.db import DatabaseError, connection
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "crawler_crawlresult_fts"
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SNIPPET_TOKENS = 24
+HEADLINE_WEIGHT = 5.0  # bm25() column weights: a match in the headline counts five times a body match
+TEXT_WEIGHT = 1.0
+
+_TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+SEARCH_SQL = f"""
+    SELECT r.url, r.headline,
+           snippet({FTS_TABLE}, 1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}),
+           bm25({FTS_TABLE}, {HEADLINE_WEIGHT}, {TEXT_WEIGHT}) AS rank,
+           r.fetched_at
+    FROM {FTS_TABLE}
+    JOIN crawler_crawlresult r ON r.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH %s
+    ORDER BY rank
+    LIMIT %s OFFSET %s
+"""
+
+
+def _isoformat(value):
+    if isinstance(value, str):
+        value = parse_datetime(value) or value
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def match_expression(query):
+    """Turns free text into an FTS5 query: every word must match, "word*" matches a prefix."""
+    terms = []
+    for term in _TERM_RE.findall(query):
+        prefix = term.endswith("*")
+        word = term.rstrip("*")
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+def search_pages(query, limit=SEARCH_DEFAULT_LIMIT, offset=0):
+    """Returns stored pages matching query, best BM25 score first, with highlighted snippets."""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [expression, limit, max(0, int(offset))])
+        rows = cursor.fetchall()
+    return [
+        {
+            "url": url,
+            "headline": headline,
+            "snippet": snippet,
+            "score": round(-rank, 4),  # bm25() is lower-is-better; flip it for clients
+            "fetched_at": _isoformat(fetched_at),
+        }
+        for url, headline, snippet, rank, fetched_at in rows
+    ]
+
+
+def rebuild_index():
+    """Rebuilds the full-text index from crawler_crawlresult (after bulk imports or corruption)."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except DatabaseError as e:
+        logger.error(f"❌ Full-text index rebuild failed: {e}")
+        raise
+    logger.info("✅ Rebuilt crawl result full-text index")
@@ -1,3 +1,1390 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import httpx
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from lxml import html as lxml_html
+from selenium.common.exceptions import WebDriverException
+
+from .browser_pool import BrowserPool, warm_in_background
+from .canonical import SeenSet, canonicalize, unique_urls
+from .dedup import NearDuplicateIndex, minhash, similarity
+from .batch import run_batch
+from .benchmark import BENCHMARK_TARGETS, SyntheticSite, isolated_crawler_state, run_benchmarks
+from .engine import CrawlEngine, crawl_loop, crawl_site, extract_links
+from .extract import IMAGE_BUDGET, TEXT_BUDGET, LxmlExtractor, extract_html
+from .entitlements import clear_entitlements, expire_trials
+from .exports import cleanup_exports, export_path, parse_range, write_export
+from .jobs import JobWorkerPool, claim_next_job, requeue_stale_jobs, run_job
+from .metrics import STAGE_SECONDS, Counter, Histogram, Registry, render_metrics
+from .models import CrawlJob, CrawlResult, QuotaUsage, UserSubscription
+from .paypal_webhook import PayPalTokenCache, paypal_webhook, token_cache
+from .page_cache import PageCache, freshness_lifetime
+from .politeness import (
+    ROBOTS_MAX_BYTES, SCHEDULER, FairFrontier, PolitenessScheduler, RateLimited, TokenBucket, parse_robots,
+)
+from .quotas import METER, QuotaExceeded, UsageMeter, UserQuota
+from .http_client import ContentRejected, DNSCache, close_async_client, get_async_client, get_client, iter_text, open_stream
+from .render import detect_render, extract_embedded_data
+from .result_store import RESULT_WRITER, ResultWriter, flush_on_exit, url_hash
+from .search_index import match_expression, search_pages
+from .scraper import (
+    SEARCH_CACHE, ascrape_page_content, render_allowed, render_fallback, scrape_page_content, search_web, stream_page,
+)
+from .ttl_cache import SingleFlight, TTLCache
+from .views import (
+    AsyncCheckAccessView, AsyncCrawlView, AsyncSubscriptionManagementView, AsyncSubscriptionStatusView,
+    SubscriptionManagementView, SubscriptionStatusView,
+)
+
+SITE = {
+    "/": '<html><body><a href="/a">A</a><a href="/b#top">B</a><a href="https://other.example/">X</a></body></html>',
+    "/a": '<html><body><a href="/">Home</a><a href="/c">C</a></body></html>',
+    "/b": '<html><body><a href="/c">C</a><a href="mailto:x@example.com">Mail</a></body></html>',
+    "/c": "<html><body><p>Leaf</p></body></html>",
+    "/big": "<html><head><title>Big</title></head><body>"
+            + ("<p>" + "word " * 200 + "</p><img src='/i.png'>") * 2000 + "</body></html>",
+    "/doc.pdf": ("%PDF-1.4 binary", "application/pdf"),
+    "/files": '<html><body><a href="/doc.pdf">PDF</a><a href="/big">Big</a><a href="/c">C</a></body></html>',
+    "/robots.txt": ("User-agent: *\nDisallow: /private\n", "text/plain"),
+    "/private": "<html><body><p>Keep out</p></body></html>",
+    "/syndicated": '<html><body><a href="/article">1</a><a href="/mirror">2</a></body></html>',
+    "/article": '<html><body><p>' + "the quick brown fox jumps over the lazy dog " * 30 + '</p><a href="/a">A</a></body></html>',
+    "/mirror": '<html><body><p>' + "the quick brown fox jumps over the lazy dog " * 30 + '</p><a href="/b">B</a></body></html>',
+}
+
+SLOW_PAGE_SECONDS = 0.3
+
+ARTICLE = " ".join(f"word{i}" for i in range(300))
+
+
+# Importing a web entry point (what a cold serverless start pays before the first response) must stay
+# under this budget and must not pull in the crawl or payment backends.
+COLD_START_IMPORT_BUDGET = 0.5
+COLD_START_EXCLUDED_MODULES = (
+    "bs4", "duckduckgo_search", "httpx", "lxml", "numpy", "pandas", "razorpay", "selenium", "webdriver_manager",
+)
+COLD_START_MODULES = ("odin_backend.urls", "odin_backend.wsgi", "odin_backend.asgi")
+# The URLconf is timed after django.setup(); the wsgi/asgi modules run setup themselves and are timed whole
+COLD_START_IMPORT_SCRIPT = """
+import importlib, json, sys, time
+import django
+module = sys.argv[1]
+if module == "odin_backend.urls":
+    django.setup()
+started = time.perf_counter()
+importlib.import_module(module)
+print(json.dumps({"seconds": time.perf_counter() - started, "modules": sorted(sys.modules)}))
+"""
+
+
+CACHED_PAGE = "<html><head><title>Cached</title></head><body><p>" + "cache me " * 50 + "</p></body></html>"
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    hits = {}
+
+    def do_GET(self):
+        SiteHandler.hits[self.path] = SiteHandler.hits.get(self.path, 0) + 1
+        if self.path == "/etag":
+            self.send_etag_page()
+            return
+        if self.path.startswith("/slow"):
+            time.sleep(SLOW_PAGE_SECONDS)
+            body = SITE["/c"]
+        else:
+            body = SITE.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        content_type = "text/html; charset=utf-8"
+        if isinstance(body, tuple):
+            body, content_type = body
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_etag_page(self):
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Cache-Control", "max-age=0")
+            self.end_headers()
+            return
+        data = CACHED_PAGE.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", '"v1"')
+        self.send_header("Cache-Control", "max-age=0")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalSiteMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    def setUp(self):
+        super().setUp()
+        SCHEDULER.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+class ExtractLinksTests(SimpleTestCase):
+    def test_links_are_absolute_and_deduplicated(self):
+        body = '<a href="/x#a">1</a><a href="/x#b">2</a><a href="javascript:void(0)">3</a>'
+        self.assertEqual(extract_links(body, "http://example.com/page"), ["http://example.com/x"])
+
+    def test_empty_document(self):
+        self.assertEqual(extract_links("", "http://example.com/"), [])
+
+
+class CanonicalizeTests(SimpleTestCase):
+    def test_canonical_form(self):
+        self.assertEqual(
+            canonicalize("HTTPS://Example.COM:443/a/../b?utm_source=x&z=1&a=2#frag"),
+            "https://example.com/b?a=2&z=1",
+        )
+        self.assertEqual(canonicalize("page?fbclid=1", base="http://example.com:8080/dir/"),
+                         "http://example.com:8080/dir/page")
+        self.assertIsNone(canonicalize("mailto:x@example.com"))
+
+    def test_query_segments_are_kept_verbatim(self):
+        self.assertEqual(
+            canonicalize("http://example.com/s?q=odin%20crawler&amp&utm_medium=x&b=a+b&b=%2F"),
+            "http://example.com/s?amp&b=a+b&b=%2F&q=odin%20crawler",
+        )
+
+    def test_unique_urls_collapses_variants(self):
+        urls = ["http://example.com/x?b=1&a=2", "http://EXAMPLE.com/x?a=2&b=1#top", "http://example.com/y"]
+        self.assertEqual(unique_urls(urls), ["http://example.com/x?a=2&b=1", "http://example.com/y"])
+
+    def test_seen_set_modes(self):
+        for seen in (SeenSet(), SeenSet(bloom_capacity=1000)):
+            self.assertTrue(seen.add("http://example.com/"))
+            self.assertFalse(seen.add("http://example.com/"))
+            self.assertIn("http://example.com/", seen)
+            self.assertNotIn("http://example.com/other", seen)
+            self.assertEqual(len(seen), 1)
+
+
+class NearDuplicateTests(SimpleTestCase):
+    def test_signature_similarity_tracks_overlap(self):
+        edited = ARTICLE.replace("word10 ", "changed ")
+        self.assertGreater(similarity(minhash(ARTICLE), minhash(edited)), 0.8)
+        self.assertLess(similarity(minhash(ARTICLE), minhash("unrelated text " * 50)), 0.2)
+        self.assertIsNone(minhash("too short"))
+
+    def test_index_returns_first_label(self):
+        index = NearDuplicateIndex()
+        self.assertIsNone(index.check(ARTICLE, "first"))
+        self.assertEqual(index.check(ARTICLE + " tail", "second"), "first")
+        self.assertIsNone(index.check("different words entirely " * 30, "third"))
+        self.assertEqual(len(index), 2)
+
+
+class CrawlEngineTests(LocalSiteMixin, SimpleTestCase):
+    def test_crawls_same_domain_up_to_depth(self):
+        result = crawl_site(self.base_url + "/", max_depth=2, max_pages=10)
+        crawled = {page["url"] for page in result["pages"]}
+        self.assertEqual(crawled, {self.base_url + path for path in ("/", "/a", "/b", "/c")})
+        self.assertIn("https://other.example/", result["links"])
+        self.assertEqual(len(result["links"]), len(set(result["links"])))
+
+    def test_max_pages_limits_frontier(self):
+        result = crawl_site(self.base_url + "/", max_depth=5, max_pages=2)
+        self.assertEqual(len(result["pages"]), 2)
+
+    def test_single_page_when_depth_is_zero(self):
+        engine = CrawlEngine(max_depth=0, per_host_concurrency=1)
+        result = asyncio.run(engine.crawl(self.base_url + "/"))
+        self.assertEqual([page["url"] for page in result["pages"]], [self.base_url + "/"])
+
+    def test_binary_and_oversized_links_are_not_downloaded(self):
+        result = crawl_site(self.base_url + "/files", max_depth=1, max_pages=10, max_bytes=10000)
+        errors = {page["url"]: page["error"] for page in result["pages"]}
+        self.assertIn("content type", errors[self.base_url + "/doc.pdf"])
+        self.assertIn("too large", errors[self.base_url + "/big"])
+        self.assertIsNone(errors[self.base_url + "/c"])
+
+    def test_crawls_reuse_the_pooled_client(self):
+        async def pooled_client():
+            return get_async_client()
+
+        crawl_site(self.base_url + "/", max_depth=0)
+        client = asyncio.run_coroutine_threadsafe(pooled_client(), crawl_loop()).result()
+        crawl_site(self.base_url + "/a", max_depth=0)
+        self.assertIs(asyncio.run_coroutine_threadsafe(pooled_client(), crawl_loop()).result(), client)
+        self.assertFalse(client.is_closed)
+
+    def test_dedupe_stops_following_mirror_pages(self):
+        result = crawl_site(self.base_url + "/syndicated", max_depth=1, max_pages=10, dedupe="collapse")
+        duplicates = [page for page in result["pages"] if page.get("duplicate_of")]
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(len(result["pages"]), 3)
+        dropped = crawl_site(self.base_url + "/syndicated", max_depth=1, max_pages=10, dedupe="drop")
+        self.assertEqual(len(dropped["pages"]), 2)
+
+
+class ExportTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def test_rows_are_written_lazily_to_unique_files(self):
+        rows = ({"URL": f"http://example.com/{i}"} for i in range(3))
+        first = write_export(rows, columns=("URL",), directory=self.directory)
+        second = write_export([], columns=("URL",), directory=self.directory)
+        self.assertNotEqual(first, second)
+        with open(export_path(first, self.directory)) as handle:
+            self.assertEqual(handle.read().splitlines(), ["URL"] + [f"http://example.com/{i}" for i in range(3)])
+
+    def test_cleanup_removes_expired_files(self):
+        name = write_export([{"url": "x"}], "ndjson", directory=self.directory)
+        self.assertEqual(cleanup_exports(ttl=60, directory=self.directory), 0)
+        self.assertEqual(cleanup_exports(ttl=60, directory=self.directory, now=time.time() + 120), 1)
+        self.assertFalse(os.path.exists(export_path(name, self.directory)))
+
+    def test_range_parsing_and_name_validation(self):
+        self.assertEqual(parse_range("bytes=10-", 100), (10, 99))
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertIsNone(parse_range("bytes=200-", 100))
+        self.assertIsNone(export_path("../../etc/passwd"))
+
+
+class PolitenessTests(LocalSiteMixin, SimpleTestCase):
+    def test_robots_disallow_blocks_scrape_and_is_cached(self):
+        SiteHandler.hits.pop("/robots.txt", None)
+        self.assertIn("robots.txt", scrape_page_content(self.base_url + "/private")["error"])
+        self.assertIn("robots.txt", scrape_page_content(self.base_url + "/private?again=1")["error"])
+        self.assertEqual(SiteHandler.hits["/robots.txt"], 1)
+        self.assertNotIn("/private", SiteHandler.hits)
+
+    def test_engine_skips_disallowed_urls(self):
+        result = crawl_site(self.base_url + "/private", max_depth=0)
+        self.assertIn("robots.txt", result["pages"][0]["error"])
+
+    def test_crawl_delay_sets_host_rate(self):
+        scheduler = PolitenessScheduler()
+        rate, burst = scheduler._limits(parse_robots("User-agent: *\nCrawl-delay: 5\n"))
+        self.assertEqual((rate, burst), (0.2, 1))
+
+    def test_token_bucket_spaces_reservations(self):
+        bucket = TokenBucket(rate=10, capacity=1)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+
+    def test_long_waits_fail_fast_without_taking_a_turn(self):
+        scheduler = PolitenessScheduler(default_rate=0.1, burst=1)
+        scheduler.robots._store("http://a.test", parse_robots(""), 200)
+        scheduler.wait_turn("http://a.test/1")
+        ready_at = scheduler.next_available("a.test")
+        with self.assertRaises(RateLimited):
+            scheduler.wait_turn("http://a.test/2", max_wait=1)
+        self.assertAlmostEqual(scheduler.next_available("a.test"), ready_at, places=2)
+
+    def mock_robots(self, *responses):
+        """Serves robots.txt from responses in turn (an exception is raised instead of answering)."""
+        calls = []
+
+        def handler(request):
+            calls.append(request.url)
+            response = responses[min(len(calls), len(responses)) - 1]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        patcher = mock.patch("crawler.http_client.get_client", return_value=httpx.Client(transport=httpx.MockTransport(handler)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return calls
+
+    def test_unreachable_robots_is_retried_soon(self):
+        robots = PolitenessScheduler().robots
+        calls = self.mock_robots(httpx.ConnectTimeout("timed out"), httpx.Response(200, text="User-agent: *\nAllow: /\n"))
+        with mock.patch("crawler.politeness.ROBOTS_UNREACHABLE_TTL", 0):
+            self.assertFalse(robots.rules("http://a.test/").can_fetch("OdinCrawler", "http://a.test/page"))
+            self.assertTrue(robots.rules("http://a.test/").can_fetch("OdinCrawler", "http://a.test/page"))
+        self.assertEqual(len(calls), 2)
+
+    def test_server_errors_are_not_retried_soon(self):
+        robots = PolitenessScheduler().robots
+        calls = self.mock_robots(httpx.Response(503))
+        with mock.patch("crawler.politeness.ROBOTS_UNREACHABLE_TTL", 0):
+            robots.rules("http://a.test/")
+            self.assertFalse(robots.rules("http://a.test/").can_fetch("OdinCrawler", "http://a.test/page"))
+        self.assertEqual(len(calls), 1)
+
+    def test_robots_is_read_up_to_the_cap(self):
+        body = "User-agent: *\nDisallow: /early\n" + "#" * ROBOTS_MAX_BYTES + "\nDisallow: /late\n"
+        self.mock_robots(httpx.Response(200, text=body, headers={"Content-Type": "text/plain"}))
+        rules = PolitenessScheduler().robots.rules("http://a.test/")
+        self.assertFalse(rules.can_fetch("OdinCrawler", "http://a.test/early"))
+        self.assertTrue(rules.can_fetch("OdinCrawler", "http://a.test/late"))
+
+    def test_robots_fetch_is_shared_per_event_loop(self):
+        robots = PolitenessScheduler().robots
+        release = threading.Event()
+
+        async def slow_robots(request):
+            await asyncio.get_running_loop().run_in_executor(None, release.wait, 5)
+            return httpx.Response(200, text="")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(slow_robots))
+
+        async def rules():
+            return await robots.arules("http://a.test/", client)
+
+        other_loop = threading.Thread(target=lambda: results.append(asyncio.run(rules())))
+        results = []
+        other_loop.start()
+        while not robots._inflight:
+            time.sleep(0.01)
+        threading.Timer(0.1, release.set).start()
+        results.append(asyncio.run(rules()))  # Used to await the other loop's task and fail
+        other_loop.join(5)
+        self.assertEqual(len(results), 2)
+
+    def test_frontier_interleaves_hosts(self):
+        async def drain():
+            frontier = FairFrontier(PolitenessScheduler(default_rate=20, burst=1))
+            for url in ("http://a.test/1", "http://a.test/2", "http://a.test/3", "http://b.test/1"):
+                frontier.put_nowait((url, 0))
+            return [(await frontier.get())[0] for _ in range(4)]
+
+        order = asyncio.run(drain())
+        self.assertEqual(order[:2], ["http://a.test/1", "http://b.test/1"])
+        self.assertEqual(sorted(order), sorted(set(order)))
+
+
+class DNSCacheTests(SimpleTestCase):
+    def test_entries_expire_after_ttl(self):
+        cache = DNSCache(ttl=0)
+        cache.put("example.com", 80, ["93.184.216.34"])
+        self.assertIsNone(cache.get("example.com", 80))
+
+    def test_lru_bound(self):
+        cache = DNSCache(maxsize=2)
+        for host in ("a", "b", "c"):
+            cache.put(host, 80, ["127.0.0.1"])
+        self.assertIsNone(cache.get("a", 80))
+        self.assertEqual(cache.get("c", 80), ["127.0.0.1"])
+
+
+class SharedClientTests(LocalSiteMixin, SimpleTestCase):
+    def test_streams_reuse_process_client(self):
+        self.assertIs(get_client(), get_client())
+        with open_stream(self.base_url + "/c") as response:
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Leaf", "".join(iter_text(response)))
+
+
+class FakeDriver:
+    def __init__(self):
+        self.window_handles = ["main"]
+        self.switch_to = self
+        self.quit_called = False
+        self.scripts = []
+        self.cdp_commands = []
+
+    def window(self, handle):
+        pass
+
+    def execute_script(self, script):
+        self.scripts.append(script)
+        return ["https://odin.example", "https://cdn.example"]
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append((command, params))
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+class BrowserPoolTests(SimpleTestCase):
+    def test_sessions_are_reused_then_recycled(self):
+        pool = BrowserPool(size=1, max_uses=2, driver_factory=FakeDriver)
+        with pool.session() as first:
+            pass
+        with pool.session() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertIn("localStorage.clear()", first.scripts[0])
+        self.assertIn("sessionStorage.clear()", first.scripts[0])
+        self.assertEqual(first.cdp_commands, [
+            ("Network.clearBrowserCookies", {}),
+            ("Network.clearBrowserCache", {}),
+            ("Storage.clearDataForOrigin", {"origin": "https://cdn.example", "storageTypes": "all"}),
+            ("Storage.clearDataForOrigin", {"origin": "https://odin.example", "storageTypes": "all"}),
+        ])
+        self.assertTrue(second.quit_called)
+        with pool.session() as third:
+            pass
+        self.assertIsNot(third, first)
+
+    def test_crashed_session_is_discarded(self):
+        pool = BrowserPool(size=1, driver_factory=FakeDriver)
+        with self.assertRaises(WebDriverException):
+            with pool.session() as driver:
+                raise WebDriverException("crash")
+        self.assertTrue(driver.quit_called)
+        with pool.session() as replacement:
+            self.assertIsNot(replacement, driver)
+
+    def test_warm_in_background_launches_sessions(self):
+        pool = BrowserPool(size=2, driver_factory=FakeDriver)
+        with mock.patch("crawler.browser_pool.get_browser_pool", return_value=pool), \
+                mock.patch("crawler.browser_pool.resolve_driver_path"):
+            warm_in_background(2).join(5)
+        self.assertEqual(pool._idle.qsize(), 2)
+
+    def test_checkout_times_out_when_exhausted(self):
+        pool = BrowserPool(size=1, driver_factory=FakeDriver)
+        with pool.session():
+            with self.assertRaises(TimeoutError):
+                with pool.session(timeout=0.01):
+                    pass
+
+
+ARTICLE_BODY = "Odin crawls the web for you. " * 20
+
+
+class RenderDetectionTests(SimpleTestCase):
+    def test_small_static_page_is_not_rendered(self):
+        html = "<html><head><title>Hi</title></head><body><h1>Hello</h1><p>Short page.</p></body></html>"
+        self.assertEqual(detect_render(html), (False, None))
+
+    def test_large_spa_shell_is_rendered(self):
+        bundle = "var x = 1;" * 5000
+        html = f'<html><body><div id="root"></div><script>{bundle}</script></body></html>'
+        needs_render, reason = detect_render(html)
+        self.assertTrue(needs_render)
+        self.assertEqual(reason, "empty root mount node")
+
+    def test_noscript_hint(self):
+        html = "<html><body><noscript>Please enable JavaScript to continue.</noscript></body></html>"
+        self.assertEqual(detect_render(html), (True, "noscript asks for JavaScript"))
+
+    def test_json_ld_is_used_without_browser(self):
+        html = (
+            '<html><head><title>T</title><script type="application/ld+json">'
+            f'{{"@type": "Article", "headline": "Odin", "articleBody": "{ARTICLE_BODY}", "image": "/a.png"}}'
+            '</script></head><body><div id="root"></div></body></html>'
+        )
+        data = extract_embedded_data(html, "http://example.com/post")
+        self.assertEqual(data["headline"], "Odin")
+        self.assertEqual(data["images"], ["http://example.com/a.png"])
+        self.assertIn("Odin crawls", data["text_content"])
+
+    def test_next_data_is_used_without_browser(self):
+        html = (
+            '<html><head><title>Next</title></head><body><div id="__next"></div>'
+            f'<script id="__NEXT_DATA__" type="application/json">{{"props": {{"body": "{ARTICLE_BODY}"}}}}</script>'
+            '</body></html>'
+        )
+        data = extract_embedded_data(html)
+        self.assertEqual(data["headline"], "Next")
+
+    def test_shell_without_embedded_data(self):
+        self.assertIsNone(extract_embedded_data('<html><body><div id="app"></div></body></html>'))
+
+    def test_fallback_parses_once_and_shares_extraction_budgets(self):
+        body = "Odin crawls the web for you. " * 400
+        html = (
+            '<html><head><script type="application/ld+json">'
+            f'{{"@type": "Article", "headline": "Odin", "articleBody": "{body}", '
+            f'"image": {json.dumps([f"/{n}.png" for n in range(IMAGE_BUDGET + 3)])}}}'
+            '</script></head><body><div id="root"></div></body></html>'
+        )
+        with mock.patch("crawler.render.lxml_html.fromstring", wraps=lxml_html.fromstring) as parse:
+            data, needs_selenium = render_fallback(html, "http://example.com/post")
+        self.assertEqual(parse.call_count, 1)
+        self.assertFalse(needs_selenium)
+        self.assertEqual(len(data["text_content"]), TEXT_BUDGET)
+        self.assertEqual(len(data["images"]), IMAGE_BUDGET)
+
+
+class ExtractionBackendTests(SimpleTestCase):
+    PAGES = [
+        "<html><head><title>T</title></head><body><h1>Head</h1><p>one <b>bold</b> two</p>"
+        "<img src='/x.png'><img><p>  </p><div>loose</div></body></html>",
+        "<html><body>just text <script>var a = 1</script> more</body></html>",
+        "",
+    ]
+
+    def test_backends_return_the_same_shape(self):
+        for html in self.PAGES:
+            with self.subTest(html=html):
+                self.assertEqual(
+                    extract_html(html, "http://example.com/", backend="lxml"),
+                    extract_html(html, "http://example.com/", backend="soup"),
+                )
+
+    def test_lxml_stops_once_budgets_are_full(self):
+        block = "<p>" + "x" * 500 + "</p><img src='/i.png'>"
+        extractor = LxmlExtractor("http://example.com/")
+        self.assertFalse(extractor.feed("<html><head><title>Big</title></head><body>"))
+        self.assertTrue(extractor.feed(block * 20))
+        result = extractor.close()
+        self.assertEqual(len(result["text_content"]), 5000)
+        self.assertEqual(len(result["images"]), 5)
+
+
+class StreamingFetchTests(LocalSiteMixin, SimpleTestCase):
+    def test_non_html_is_rejected_before_download(self):
+        with self.assertRaises(ContentRejected):
+            with open_stream(self.base_url + "/doc.pdf"):
+                pass
+        self.assertIn("error", scrape_page_content(self.base_url + "/doc.pdf"))
+
+    def test_byte_budget_truncates_body(self):
+        with open_stream(self.base_url + "/big", max_bytes=None) as response:
+            text = "".join(iter_text(response, max_bytes=1000))
+        self.assertEqual(len(text), 1000)
+
+    def test_extraction_stops_early_on_large_pages(self):
+        data, html, finished_early, _ = stream_page(self.base_url + "/big")
+        self.assertTrue(finished_early)
+        self.assertIsNone(html)
+        self.assertEqual(data["headline"], "Big")
+        self.assertEqual(len(data["text_content"]), 5000)
+
+
+class MetricsTests(LocalSiteMixin, SimpleTestCase):
+    def stage_count(self, stage):
+        sample = STAGE_SECONDS.samples.get(json.dumps([stage]))
+        return sum(sample[:-1]) if sample else 0
+
+    def test_worker_snapshots_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            workers = [Registry(directory=directory) for _ in range(2)]
+            for n, registry in enumerate(workers, start=1):
+                counter = Counter("jobs_total", "Jobs.", ["kind"], registry=registry)
+                histogram = Histogram("job_seconds", "Job time.", buckets=(0.5, 1.0), registry=registry)
+                counter.inc(n, kind="crawl")
+                histogram.observe(0.5 * n)
+                histogram.observe(5)
+                registry.flush()
+            text = render_metrics(workers[0])
+        self.assertIn("# TYPE jobs_total counter", text)
+        self.assertIn('jobs_total{kind="crawl"} 3', text)
+        self.assertIn('job_seconds_bucket{le="0.5"} 1', text)
+        self.assertIn('job_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('job_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("job_seconds_count 4", text)
+        self.assertIn("job_seconds_sum 11.5", text)
+
+    def test_concurrent_flushes_and_bad_snapshots_are_tolerated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = Registry(directory=directory)
+            counter = Counter("jobs_total", "Jobs.", registry=registry)
+            counter.inc(2)
+            threads = [threading.Thread(target=registry.flush) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with open(os.path.join(directory, "metrics_0_partial.json"), "w") as handle:
+                handle.write('{"jobs_total": {"type": "coun')
+            text = render_metrics(registry)
+            leftovers = [name for name in os.listdir(directory) if name.startswith("tmp_")]
+        self.assertIn("jobs_total 2", text)
+        self.assertEqual(leftovers, [])
+
+    def test_fetch_stages_are_timed(self):
+        before = {stage: self.stage_count(stage) for stage in ("connect", "ttfb", "download", "parse")}
+        stream_page(self.base_url + "/c")
+        for stage, count in before.items():
+            self.assertGreater(self.stage_count(stage), count, stage)
+
+    def test_metrics_endpoint_reports_requests(self):
+        self.client.get("/metrics")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn('odin_http_requests_total{view="metrics",status="200"}', response.content.decode())
+
+
+class PageCacheTests(LocalSiteMixin, SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = PageCache(directory=self.tmp.name)
+
+    def test_freshness_rules(self):
+        self.assertIsNone(freshness_lifetime({"cache-control": "private, no-store"}))
+        self.assertEqual(freshness_lifetime({"cache-control": "no-cache"}), 0)
+        self.assertEqual(freshness_lifetime({"cache-control": "public, max-age=60"}), 60)
+
+    def test_private_responses_are_not_shared(self):
+        self.assertIsNone(freshness_lifetime({"cache-control": "private, max-age=600"}))
+        self.assertIsNone(freshness_lifetime({"cache-control": 'private="Set-Cookie"'}))
+        self.cache.store("http://example.com/me", {"headline": "Hi Ada"}, {"cache-control": "private, max-age=600"})
+        self.assertIsNone(self.cache.lookup("http://example.com/me"))
+
+    def test_fresh_entry_is_served_from_memory_then_disk(self):
+        self.cache.store("http://Example.com:80/a#frag", {"headline": "A"}, {"cache-control": "max-age=60"})
+        entry = self.cache.lookup("http://example.com/a")
+        self.assertTrue(PageCache.is_fresh(entry))
+        reopened = PageCache(directory=self.tmp.name)
+        self.assertEqual(reopened.lookup("http://example.com/a")["data"], {"headline": "A"})
+
+    def test_memory_tier_is_size_bounded(self):
+        cache = PageCache(directory=self.tmp.name, memory_bytes=600)
+        for i in range(5):
+            cache.store(f"http://example.com/{i}", {"text_content": "x" * 200}, {})
+        self.assertLessEqual(cache.stats()["memory_bytes"], 600)
+        self.assertGreater(cache.stats()["evictions"], 0)
+
+    def test_304_skips_download_and_parse(self):
+        url = self.base_url + "/etag"
+        with mock.patch("crawler.scraper.PAGE_CACHE", self.cache):
+            first = scrape_page_content(url)
+            with mock.patch("crawler.scraper.get_extractor") as get_extractor:
+                second = scrape_page_content(url)
+                get_extractor.return_value.feed.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.stats()["revalidated"], 1)
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_expiry_and_lru_bound(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=0)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_single_flight_shares_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do("k", slow))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class SearchCacheTests(SimpleTestCase):
+    def setUp(self):
+        SEARCH_CACHE.clear()
+        self.addCleanup(SEARCH_CACHE.clear)
+
+    def test_smaller_requests_are_served_from_cache(self):
+        links = [f"https://example.com/{i}" for i in range(100)]
+        with mock.patch("crawler.scraper._search_duckduckgo", return_value=links) as upstream:
+            self.assertEqual(len(search_web("Odin  Crawler", 100)), 100)
+            self.assertEqual(search_web("odin crawler", 20), links[:20])
+        upstream.assert_called_once_with("odin crawler", 100)
+
+    def test_larger_request_goes_upstream_and_errors_are_not_cached(self):
+        with mock.patch("crawler.scraper._search_duckduckgo", side_effect=RuntimeError("rate limited")):
+            self.assertEqual(search_web("odin", 20), [])
+        links = [f"https://example.com/{i}" for i in range(20)]
+        with mock.patch("crawler.scraper._search_duckduckgo", return_value=links) as upstream:
+            search_web("odin", 20)
+            search_web("odin", 20)
+        upstream.assert_called_once_with("odin", 20)
+
+    def test_larger_results_are_never_replaced_by_smaller_ones(self):
+        links = [f"https://example.com/{i}" for i in range(100)]
+        with mock.patch("crawler.scraper._search_duckduckgo", side_effect=lambda keyword, n: links[:n]) as upstream:
+            search_web("odin", 20)
+            self.assertEqual(search_web("odin", 50), links[:50])
+            self.assertEqual(search_web("odin", 20), links[:20])
+        self.assertEqual(upstream.call_args_list, [mock.call("odin", 20), mock.call("odin", 50)])
+        self.assertEqual(SEARCH_CACHE.get("odin"), (50, links[:50]))
+
+    def test_concurrent_sizes_share_one_flight_per_keyword(self):
+        links = [f"https://example.com/{i}" for i in range(100)]
+        started, release = threading.Event(), threading.Event()
+
+        def upstream(keyword, n):
+            started.set()
+            release.wait(5)
+            return links[:n]
+
+        results = {}
+        with mock.patch("crawler.scraper._search_duckduckgo", side_effect=upstream) as search:
+            small = threading.Thread(target=lambda: results.__setitem__(20, search_web("odin", 20)))
+            small.start()
+            started.wait(5)
+            large = threading.Thread(target=lambda: results.__setitem__(100, search_web("odin", 100)))
+            large.start()
+            time.sleep(0.05)
+            release.set()
+            small.join()
+            large.join()
+        self.assertEqual(results, {20: links[:20], 100: links})
+        self.assertEqual(search.call_args_list, [mock.call("odin", 20), mock.call("odin", 100)])
+        self.assertEqual(SEARCH_CACHE.get("odin"), (100, links))
+
+
+class BatchCrawlTests(TestCase):
+    def setUp(self):
+        clear_entitlements()
+        METER.clear()
+        UserSubscription.objects.create(
+            user_id=1, status="active", trial_end=timezone.now() + timezone.timedelta(days=3)
+        )
+
+    def fake_scrape(self, url):
+        if url.endswith("slow"):
+            time.sleep(0.2)
+        if url.endswith("bad"):
+            return {"error": "boom"}
+        return {"url": url, "headline": "H", "text_content": "T", "images": []}
+
+    def test_results_stream_in_completion_order(self):
+        items = [("url", "http://example.com/slow"), ("url", "http://example.com/fast")]
+        with mock.patch("crawler.batch.scrape_page_content", side_effect=self.fake_scrape):
+            results = list(run_batch(items, concurrency=2))
+        self.assertEqual([result["index"] for result in results], [1, 0])
+
+    def test_endpoint_streams_ndjson(self):
+        body = {"user_id": 1, "urls": ["http://example.com/a", "http://example.com/bad"], "keywords": ["odin"]}
+        with mock.patch("crawler.batch.scrape_page_content", side_effect=self.fake_scrape), \
+                mock.patch("crawler.batch.search_web", return_value=["https://odin.example/"]):
+            response = self.client.post("/api/crawl/batch/", json.dumps(body), content_type="application/json")
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        by_input = {line["input"]: line for line in lines}
+        self.assertEqual(by_input["http://example.com/a"]["status"], "success")
+        self.assertEqual(by_input["http://example.com/bad"]["status"], "error")
+        self.assertEqual(by_input["odin"]["links"], ["https://odin.example/"])
+
+    def test_near_duplicates_are_collapsed_or_dropped(self):
+        texts = {
+            "http://example.com/1": ARTICLE,
+            "http://mirror.example/1": ARTICLE + " syndicated",
+            "http://example.com/2": "something else entirely " * 20,
+        }
+
+        def scrape(url):
+            return {"url": url, "headline": "H", "text_content": texts[url], "images": []}
+
+        items = [("url", url) for url in texts]
+        with mock.patch("crawler.batch.scrape_page_content", side_effect=scrape):
+            collapsed = list(run_batch(items, concurrency=1, dedupe="collapse"))
+            dropped = list(run_batch(items, concurrency=1, dedupe="drop"))
+        self.assertEqual(collapsed[1]["status"], "duplicate")
+        self.assertEqual(collapsed[1]["duplicate_of"], "http://example.com/1")
+        self.assertNotIn("text_content", collapsed[1])
+        self.assertEqual([result["index"] for result in dropped], [0, 2])
+
+    def test_rejects_unknown_dedupe_mode(self):
+        body = {"user_id": 1, "urls": ["http://example.com/a"], "dedupe": "merge"}
+        response = self.client.post("/api/crawl/batch/", json.dumps(body), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_empty_batch(self):
+        response = self.client.post("/api/crawl/batch/", json.dumps({"user_id": 1}), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_bad_user_id_and_non_object_body(self):
+        for body in ({"user_id": "abc", "urls": ["http://example.com/a"]}, ["http://example.com/a"]):
+            response = self.client.post("/api/crawl/batch/", json.dumps(body), content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["status"], "error")
+
+
+class CrawlJobTests(TestCase):
+    def setUp(self):
+        clear_entitlements()
+        METER.clear()
+        UserSubscription.objects.create(
+            user_id=7, status="trial", trial_end=timezone.now() + timezone.timedelta(days=3)
+        )
+
+    def submit(self, **body):
+        response = self.client.post(
+            "/api/crawl/jobs/", json.dumps({"user_id": 7, **body}), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 202)
+        return response.json()["job_id"]
+
+    def test_submit_run_and_poll(self):
+        job_id = self.submit(url="http://example.com/a", keywords=["odin"])
+        job = claim_next_job("test-worker")
+        self.assertEqual(str(job.id), job_id)
+        self.assertIsNone(claim_next_job("other-worker"))
+
+        with mock.patch("crawler.batch.scrape_page_content", return_value={"headline": "A"}), \
+                mock.patch("crawler.batch.search_web", return_value=["https://odin.example/"]) as search:
+            run_job(job)
+        search.assert_called_once_with("odin", 20)
+
+        response = self.client.get(f"/api/crawl/jobs/{job_id}/", {"user_id": 7})
+        body = response.json()
+        self.assertEqual(body["status"], CrawlJob.SUCCEEDED)
+        self.assertEqual([item["input"] for item in body["result"]["results"]], ["http://example.com/a", "odin"])
+
+    def test_jobs_are_private_to_their_user(self):
+        job_id = self.submit(url="http://example.com/a")
+        response = self.client.get(f"/api/crawl/jobs/{job_id}/", {"user_id": 8})
+        self.assertEqual(response.status_code, 404)
+
+    def test_submit_rejects_bad_user_id_and_non_object_body(self):
+        for body in ({"user_id": "abc", "url": "http://example.com/a"}, ["http://example.com/a"]):
+            response = self.client.post("/api/crawl/jobs/", json.dumps(body), content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+    def test_worker_survives_job_errors(self):
+        self.submit(url="http://example.com/a")
+        pool = JobWorkerPool(poll_interval=0)
+        claims = [claim_next_job("test-worker"), None]
+
+        def claim(worker_id):
+            if not claims[1:]:
+                pool._stop.set()
+            return claims.pop(0)
+
+        with mock.patch("crawler.jobs.claim_next_job", side_effect=claim), \
+                mock.patch("crawler.jobs.run_job", side_effect=DatabaseError("database is locked")):
+            pool._loop("test-worker")
+        job = CrawlJob.objects.get()
+        self.assertEqual(job.status, CrawlJob.FAILED)
+        self.assertEqual(job.error, "database is locked")
+
+    def age_heartbeat(self, job, minutes=5):
+        CrawlJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timezone.timedelta(minutes=minutes))
+
+    def test_jobs_are_requeued_when_their_lease_expires(self):
+        self.submit(url="http://example.com/a")
+        self.submit(url="http://example.com/b")
+        lost, alive = claim_next_job("dead-worker"), claim_next_job("live-worker")
+        self.assertIsNotNone(lost.heartbeat_at)
+        self.age_heartbeat(lost)
+        self.assertEqual(requeue_stale_jobs(), 1)
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.worker, lost.heartbeat_at), (CrawlJob.QUEUED, "", None))
+        self.assertEqual(CrawlJob.objects.get(pk=alive.pk).status, CrawlJob.RUNNING)
+
+    def test_run_job_renews_its_lease_and_stops_once_lost(self):
+        self.submit(urls=["http://example.com/a", "http://example.com/b"], concurrency=1)
+        job = claim_next_job("test-worker")
+        self.age_heartbeat(job)
+        with mock.patch("crawler.jobs.JOB_HEARTBEAT_INTERVAL", 0), \
+                mock.patch("crawler.batch.scrape_page_content", return_value={"headline": "A"}):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CrawlJob.SUCCEEDED)
+        self.assertGreater(job.heartbeat_at, timezone.now() - timezone.timedelta(minutes=1))
+
+        self.submit(urls=["http://example.com/a", "http://example.com/b"], concurrency=1)
+        job = claim_next_job("test-worker")
+        CrawlJob.objects.filter(pk=job.pk).update(worker="other-worker")  # Requeued and claimed elsewhere
+        with mock.patch("crawler.jobs.JOB_HEARTBEAT_INTERVAL", 0), \
+                mock.patch("crawler.batch.scrape_page_content", return_value={"headline": "A"}) as scrape:
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (CrawlJob.RUNNING, "other-worker"))
+        self.assertEqual(scrape.call_count, 1)
+
+    def test_worker_loop_requeues_expired_leases(self):
+        self.submit(url="http://example.com/a")
+        job = claim_next_job("dead-worker")
+        self.age_heartbeat(job)
+        pool = JobWorkerPool(poll_interval=0)
+
+        def claim(worker_id):
+            pool._stop.set()
+            return None
+
+        with mock.patch("crawler.jobs.claim_next_job", side_effect=claim):
+            pool._loop("test-worker")
+        job.refresh_from_db()
+        self.assertEqual(job.status, CrawlJob.QUEUED)
+
+    def test_cancel_queued_job(self):
+        job_id = self.submit(url="http://example.com/a")
+        response = self.client.post(
+            f"/api/crawl/jobs/{job_id}/cancel/", json.dumps({"user_id": 7}), content_type="application/json"
+        )
+        self.assertEqual(response.json()["status"], CrawlJob.CANCELLED)
+        self.assertIsNone(claim_next_job("test-worker"))
+
+    def test_cancel_running_job_stops_between_results(self):
+        self.submit(urls=["http://example.com/a", "http://example.com/b"], concurrency=1)
+        job = claim_next_job("test-worker")
+        CrawlJob.objects.filter(pk=job.pk).update(cancel_requested=True)
+        with mock.patch("crawler.batch.scrape_page_content", return_value={"headline": "A"}) as scrape:
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CrawlJob.CANCELLED)
+        self.assertEqual(scrape.call_count, 1)
+
+    def test_export_supports_formats_and_ranges(self):
+        job_id = self.submit(urls=["http://example.com/a", "http://example.com/b"])
+        job = claim_next_job("test-worker")
+        with mock.patch("crawler.batch.scrape_page_content", return_value={"url": "u", "headline": "A, B"}):
+            run_job(job)
+
+        with tempfile.TemporaryDirectory() as directory, mock.patch("crawler.exports.EXPORT_DIR", directory):
+            url = f"/api/crawl/jobs/{job_id}/export/"
+            response = self.client.get(url, {"user_id": 7})
+            body = b"".join(response.streaming_content).decode()
+            self.assertEqual(response["Content-Type"], "text/csv")
+            self.assertTrue(body.startswith("type,input,status,url,headline"))
+            self.assertIn('"A, B"', body)
+
+            partial = self.client.get(url, {"user_id": 7}, HTTP_RANGE="bytes=0-3")
+            self.assertEqual(partial.status_code, 206)
+            self.assertEqual(b"".join(partial.streaming_content), b"type")
+            self.assertEqual(partial["Content-Range"], f"bytes 0-3/{len(body.encode())}")
+
+            gzipped = self.client.get(url, {"user_id": 7, "format": "ndjson", "gzip": "1"})
+            lines = gzip.decompress(b"".join(gzipped.streaming_content)).decode().splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(json.loads(lines[0])["headline"], "A, B")
+
+    def test_export_requires_finished_job(self):
+        job_id = self.submit(url="http://example.com/a")
+        response = self.client.get(f"/api/crawl/jobs/{job_id}/export/", {"user_id": 7})
+        self.assertEqual(response.status_code, 409)
+
+
+class ResultStoreTests(TestCase):
+    def test_writer_upserts_in_one_batch(self):
+        writer = ResultWriter(batch_size=3)
+        writer.add("http://Example.com/a?utm_source=x", {"headline": "Old", "text_content": "v1", "images": []})
+        writer.add("http://example.com/b", {"error": "timeout"})
+        self.assertFalse(writer.due())
+        writer.add("http://example.com/a", {"headline": "New", "text_content": "v2", "images": ["/i.png"]})
+        self.assertTrue(writer.due())
+        with self.assertNumQueries(2):  # One upsert for pages, one narrower one for errors
+            self.assertEqual(writer.flush(), 2)
+
+        page = CrawlResult.objects.get(url_hash=url_hash("http://example.com/a"))
+        self.assertEqual((page.url, page.headline, page.images), ("http://example.com/a", "New", ["/i.png"]))
+        self.assertEqual(CrawlResult.objects.get(url="http://example.com/b").status, CrawlResult.ERROR)
+
+        writer.add("http://example.com/a", {"headline": "Newer", "text_content": "v3", "images": []})
+        writer.flush()
+        self.assertEqual(CrawlResult.objects.count(), 2)
+        self.assertEqual(CrawlResult.objects.get(url="http://example.com/a").headline, "Newer")
+
+    @override_settings(BROWSER_WARM_ON_START=False)
+    def test_buffered_results_are_flushed_on_exit_and_worker_shutdown(self):
+        self.addCleanup(RESULT_WRITER.clear)
+        RESULT_WRITER.add("http://example.com/exit", {"headline": "Exit", "text_content": "bye"})
+        flush_on_exit()
+        self.assertTrue(CrawlResult.objects.filter(url="http://example.com/exit").exists())
+
+        def join():
+            RESULT_WRITER.add("http://example.com/late", {"headline": "Late", "text_content": "last"})
+
+        with mock.patch("crawler.management.commands.crawl_worker.JobWorkerPool") as pool, \
+                mock.patch("crawler.management.commands.crawl_worker.signal.signal"):
+            pool.return_value.join.side_effect = join
+            call_command("crawl_worker", stdout=io.StringIO())
+        self.assertEqual(len(RESULT_WRITER), 0)
+        self.assertTrue(CrawlResult.objects.filter(url="http://example.com/late").exists())
+
+    def test_sqlite_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        clear_entitlements()
+        UserSubscription.objects.create(user_id=3, status="active", trial_end=timezone.now())
+        writer = ResultWriter()
+        writer.add("http://example.com/rust", {"headline": "Rust ownership", "text_content": "Borrowing rules in Rust."})
+        writer.add("http://example.com/py", {"headline": "Python", "text_content": "Python has a borrowed Rust idea."})
+        writer.add("http://example.com/down", {"error": "timeout"})
+        writer.flush()
+
+    def test_index_follows_upserts_and_ranks_headlines_first(self):
+        self.assertEqual([hit["url"] for hit in search_pages("rust")], ["http://example.com/rust", "http://example.com/py"])
+        self.assertIn("<mark>", search_pages("borrowing")[0]["snippet"])
+
+        writer = ResultWriter()
+        writer.add("http://example.com/py", {"headline": "Python", "text_content": "Now about snakes only."})
+        writer.flush()
+        self.assertEqual([hit["url"] for hit in search_pages("rust")], ["http://example.com/rust"])
+        self.assertEqual(len(search_pages("snak*")), 1)
+
+    def test_failed_refetch_keeps_stored_content(self):
+        writer = ResultWriter()
+        writer.add("http://example.com/rust", {"error": "timeout"})
+        writer.flush()
+        result = CrawlResult.objects.get(url="http://example.com/rust")
+        self.assertEqual((result.status, result.error, result.headline), (CrawlResult.ERROR, "timeout", "Rust ownership"))
+        self.assertEqual([hit["url"] for hit in search_pages("ownership")], ["http://example.com/rust"])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(match_expression('rust AND "py* NEAR(x'), '"rust" "AND" "py"* "NEAR" "x"')
+        self.assertEqual(search_pages('"; DROP TABLE'), [])
+
+    def test_search_endpoint(self):
+        response = self.client.get("/api/crawl/search/", {"user_id": 3, "q": "ownership"})
+        body = response.json()
+        self.assertEqual(body["count"], 1)
+        self.assertEqual(body["results"][0]["headline"], "Rust ownership")
+        self.assertEqual(self.client.get("/api/crawl/search/", {"user_id": 3}).status_code, 400)
+        self.assertEqual(self.client.get("/api/crawl/search/", {"user_id": "abc", "q": "rust"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/crawl/search/", {"q": "rust"}).status_code, 400)
+
+
+class BenchmarkTests(TestCase):
+    def test_synthetic_site_is_deterministic(self):
+        site = SyntheticSite(pages=10, fanout=3, page_kb=1, js_shell_ratio=0.5, seed=4)
+        self.assertEqual(site.render(3), SyntheticSite(pages=10, fanout=3, page_kb=1, js_shell_ratio=0.5, seed=4).render(3))
+        self.assertEqual(site.links(3), [0, 1, 2])
+        shells = [n for n in range(10) if site.is_js_shell(n)]
+        self.assertTrue(shells)
+        self.assertTrue(detect_render(site.render(shells[0]))[0])
+
+    def test_report_covers_every_target(self):
+        report = run_benchmarks(pages=6, fanout=2, page_kb=1, js_shell_ratio=0.3)
+        json.dumps(report)
+        self.assertEqual(set(report["results"]), set(BENCHMARK_TARGETS))
+        self.assertEqual(report["results"]["crawl_website"]["pages"], 6)
+        for result in report["results"].values():
+            self.assertEqual(set(result["latency_ms"]), {"mean", "p50", "p95", "p99"})
+            self.assertGreater(result["peak_rss_mb"], 0)
+
+
+class ColdStartImportTests(SimpleTestCase):
+    def import_module(self, module):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="odin_backend.settings")
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_IMPORT_SCRIPT, module], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_entry_points_skip_heavy_backends(self):
+        for module in COLD_START_MODULES:
+            with self.subTest(module=module):
+                loaded = set(self.import_module(module)["modules"])
+                self.assertEqual([name for name in COLD_START_EXCLUDED_MODULES if name in loaded], [])
+
+    def test_entry_point_import_budget(self):
+        for module in COLD_START_MODULES:
+            with self.subTest(module=module):
+                # Best of three runs, so one slow run on a busy machine doesn't fail the build
+                seconds = min(self.import_module(module)["seconds"] for _ in range(3))
+                self.assertLess(seconds, COLD_START_IMPORT_BUDGET)
+
+
+class AsyncViewTests(LocalSiteMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_entitlements()
+        METER.clear()
+        self.factory = AsyncRequestFactory()
+        UserSubscription.objects.create(user_id=60, status="active", trial_end=timezone.now())
+
+    async def call(self, view, method, path, body=None, **kwargs):
+        if method == "post":
+            request = self.factory.post(path, json.dumps(body), content_type="application/json")
+        else:
+            request = self.factory.get(path)
+        return await view.as_view()(request, **kwargs)
+
+    async def test_crawl_view_scrapes_on_event_loop(self):
+        response = await self.call(AsyncCrawlView, "post", "/api/crawl/", {"user_id": 60, "url": self.base_url + "/c"})
+        await close_async_client()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Leaf", json.loads(response.content)["text_content"])
+
+    async def test_crawl_view_rejects_unknown_user(self):
+        response = await self.call(AsyncCrawlView, "post", "/api/crawl/", {"user_id": 61, "url": self.base_url})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_check_access_starts_trial(self):
+        response = await self.call(AsyncCheckAccessView, "get", "/api/crawl/check-access/?user_id=62")
+        data = json.loads(response.content)
+        self.assertEqual((data["access"], data["is_trial"]), (True, True))
+        self.assertTrue(await UserSubscription.objects.filter(user_id=62, status="trial").aexists())
+
+    async def test_subscription_views_match_sync_views(self):
+        for sync_view, async_view in ((SubscriptionStatusView, AsyncSubscriptionStatusView),
+                                      (SubscriptionManagementView, AsyncSubscriptionManagementView)):
+            for user_id in (60, 63):
+                expected = await sync_to_async(sync_view.as_view())(RequestFactory().get("/"), user_id=user_id)
+                response = await self.call(async_view, "get", "/", user_id=user_id)
+                self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+
+    async def test_slow_fetches_overlap(self):
+        urls = [f"{self.base_url}/slow?n={n}" for n in range(10)]
+        with isolated_crawler_state():
+            started = time.perf_counter()
+            results = await asyncio.gather(*(ascrape_page_content(url) for url in urls))
+            elapsed = time.perf_counter() - started
+        await close_async_client()
+        self.assertTrue(all("error" not in data for data in results))
+        # Ten 0.3s pages, six at a time per host: two rounds, not ten
+        self.assertLess(elapsed, 5 * SLOW_PAGE_SECONDS)
+
+
+def quota_plans(**overrides):
+    limits = {
+        "fetch_rate": 1.0, "fetch_burst": 2, "render_rate": 1.0, "render_burst": 1,
+        "daily_fetches": 100, "daily_renders": 100, "daily_bytes": 10 ** 9,
+    }
+    return {"trial": dict(limits, **overrides), "active": dict(limits, **overrides)}
+
+
+class QuotaTests(TestCase):
+    def setUp(self):
+        clear_entitlements()
+
+    def test_burst_is_refused_with_retry_after(self):
+        meter = UsageMeter(plans=quota_plans())
+        meter.admit(1, "trial")
+        meter.admit(1, "trial")
+        with self.assertRaises(QuotaExceeded) as caught:
+            meter.admit(1, "trial")
+        self.assertEqual(caught.exception.kind, "fetch")
+        self.assertTrue(0 < caught.exception.retry_after <= 1)
+        meter.admit(2, "trial")  # Other users have their own bucket
+
+    def test_daily_cap_holds_across_workers(self):
+        plans = quota_plans(fetch_burst=10, daily_fetches=3)
+        first, second = UsageMeter(plans=plans, refresh_interval=0), UsageMeter(plans=plans, refresh_interval=0)
+        first.admit(3, "trial")
+        first.admit(3, "trial")
+        first.flush()
+        second.admit(3, "trial")
+        with self.assertRaises(QuotaExceeded) as caught:
+            second.admit(3, "trial")
+        self.assertGreater(caught.exception.retry_after, 0)
+        with self.assertRaises(QuotaExceeded):
+            second.check(3, "trial")
+
+    def test_counts_are_added_in_batches(self):
+        workers = [UsageMeter(plans=quota_plans()) for _ in range(2)]
+        for meter in workers:
+            meter.admit(4, "active")
+            meter.charge_bytes(4, "active", 1000)
+        with self.assertNumQueries(1):
+            workers[0].flush()
+        workers[1].flush()
+        usage = QuotaUsage.objects.get(user_id=4)
+        self.assertEqual((usage.fetches, usage.renders, usage.bytes), (2, 0, 2000))
+
+    def test_user_table_is_bounded_without_losing_counts(self):
+        meter = UsageMeter(plans=quota_plans(), max_users=2)
+        for user_id in (5, 6, 7):
+            meter.admit(user_id, "trial")
+        self.assertEqual(len(meter), 2)
+        self.assertEqual(meter.flush(), 3)
+
+    def test_render_over_quota_is_skipped(self):
+        quota = UserQuota(8, "trial", meter=UsageMeter(plans=quota_plans()))
+        with quota.activate():
+            self.assertTrue(render_allowed("https://odin.example/"))
+            self.assertFalse(render_allowed("https://odin.example/"))
+        self.assertTrue(render_allowed("https://odin.example/"))  # No quota outside a metered request
+
+    def test_crawl_view_answers_429(self):
+        UserSubscription.objects.create(user_id=9, status="trial", trial_end=timezone.now() + timezone.timedelta(days=1))
+        body = json.dumps({"user_id": 9, "url": "https://odin.example/"})
+        with mock.patch("crawler.quotas.METER", UsageMeter(plans=quota_plans(fetch_burst=1))), \
+                mock.patch("crawler.scraper.scrape_page_content", return_value={"headline": "A"}):
+            self.assertEqual(self.client.post("/api/crawl/", body, content_type="application/json").status_code, 200)
+            response = self.client.post("/api/crawl/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response.json()["quota"], "fetch")
+
+    def test_batch_items_over_daily_quota_fail(self):
+        quota = UserQuota(10, "trial", meter=UsageMeter(plans=quota_plans(fetch_burst=10, daily_fetches=1)))
+        items = [("url", f"https://odin.example/{n}") for n in range(3)]
+        with mock.patch("crawler.batch.scrape_page_content", return_value={"headline": "A"}):
+            results = sorted(run_batch(items, concurrency=1, quota=quota), key=lambda result: result["index"])
+        self.assertEqual([result["status"] for result in results], ["success", "error", "error"])
+        self.assertIn("Daily fetch limit", results[1]["error"])
+
+
+class EntitlementCacheTests(TestCase):
+    def setUp(self):
+        clear_entitlements()
+        self.addCleanup(clear_entitlements)
+
+    def check_access(self, user_id):
+        return self.client.get("/api/crawl/check-access/", {"user_id": user_id}).json()
+
+    def test_repeat_access_checks_skip_the_database(self):
+        self.assertTrue(self.check_access(5)["access"])
+        with self.assertNumQueries(0):
+            body = self.check_access(5)
+        self.assertTrue(body["is_trial"])
+
+    def test_expired_trial_check_is_a_pure_read(self):
+        UserSubscription.objects.create(user_id=6, status="trial", trial_end=timezone.now() - timezone.timedelta(days=1))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.check_access(6)["reason"], "trial_expired")
+        self.assertEqual(UserSubscription.objects.get(user_id=6).status, "trial")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check_access(6)["reason"], "trial_expired")
+
+    def test_sweeper_expires_lapsed_trials_in_bulk(self):
+        past = timezone.now() - timezone.timedelta(days=1)
+        for user_id in (20, 21):
+            UserSubscription.objects.create(user_id=user_id, status="trial", trial_end=past)
+        UserSubscription.objects.create(user_id=22, status="trial", trial_end=timezone.now() + timezone.timedelta(days=1))
+        UserSubscription.objects.create(user_id=23, status="active", trial_end=past)
+        with self.assertNumQueries(1):
+            self.assertEqual(expire_trials(), 2)
+        self.assertEqual(
+            sorted(UserSubscription.objects.filter(status="expired").values_list("user_id", flat=True)), [20, 21]
+        )
+
+    def test_razorpay_webhook_invalidates_entitlement(self):
+        UserSubscription.objects.create(user_id=9, status="expired", trial_end=timezone.now())
+        self.assertFalse(self.check_access(9)["access"])
+
+        payload = json.dumps({
+            "event": "subscription.charged",
+            "payload": {"payment": {"entity": {"subscription_id": "sub_1", "notes": {"user_id": 9}}}},
+        }).encode("utf-8")
+        signature = hmac.new(settings.RAZORPAY_WEBHOOK_SECRET.encode("utf-8"), payload, hashlib.sha256).hexdigest()
+        response = self.client.post(
+            "/verification/", payload, content_type="application/json", HTTP_X_RAZORPAY_SIGNATURE=signature
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.check_access(9)["access"])
+
+
+def paypal_response(status=200, **body):
+    response = mock.Mock(status_code=status)
+    response.json.return_value = body
+    return response
+
+
+@override_settings(PAYPAL_CLIENT_ID="id", PAYPAL_CLIENT_SECRET="secret", PAYPAL_WEBHOOK_ID="wh")
+class PayPalWebhookTests(TestCase):
+    def setUp(self):
+        token_cache.invalidate()
+        self.addCleanup(token_cache.invalidate)
+        UserSubscription.objects.create(
+            user_id=30, status="trial", subscription_id="I-SUB", trial_end=timezone.now() + timezone.timedelta(days=3)
+        )
+
+    def deliver(self, event_id="WH-1"):
+        body = {"id": event_id, "event_type": "BILLING.SUBSCRIPTION.ACTIVATED", "resource": {"id": "I-SUB"}}
+        request = RequestFactory().post("/paypal/", json.dumps(body), content_type="application/json")
+        return paypal_webhook(request)
+
+    def fake_post(self, url, **kwargs):
+        self.assertIsNotNone(kwargs.get("timeout"))
+        if url.endswith("/oauth2/token"):
+            return paypal_response(access_token="tok", expires_in=3600)
+        return paypal_response(verification_status="SUCCESS")
+
+    def test_token_is_reused_and_retries_are_acknowledged(self):
+        with mock.patch("crawler.paypal_webhook.session.post", side_effect=self.fake_post) as post:
+            self.assertEqual(self.deliver("WH-1").status_code, 200)
+            self.assertEqual(self.deliver("WH-2").status_code, 200)
+            self.assertEqual(post.call_count, 3)  # one token fetch, two verifications
+
+            duplicate = self.deliver("WH-1")
+            self.assertEqual(json.loads(duplicate.content)["status"], "duplicate")
+            self.assertEqual(post.call_count, 3)
+        self.assertEqual(UserSubscription.objects.get(user_id=30).status, "active")
+
+    def test_rejected_delivery_can_be_retried(self):
+        with mock.patch("crawler.paypal_webhook.session.post",
+                        side_effect=[paypal_response(access_token="tok"), paypal_response(verification_status="FAILURE")]):
+            self.assertEqual(self.deliver().status_code, 400)
+        with mock.patch("crawler.paypal_webhook.session.post", side_effect=self.fake_post):
+            self.assertEqual(self.deliver().status_code, 200)
+
+    def test_token_refreshes_ahead_of_expiry(self):
+        cache = PayPalTokenCache(refresh_ahead=3600)
+        with mock.patch("crawler.paypal_webhook.session.post",
+                        return_value=paypal_response(access_token="tok", expires_in=60)) as post:
+            self.assertEqual(cache.get(), "tok")
+            self.assertEqual(cache.get(), "tok")
+            time.sleep(0.05)
+        self.assertEqual(post.call_count, 2)
+
+
+class RazorpayWebhookTests(TestCase):
+    def setUp(self):
+        clear_entitlements()
+
+    def deliver(self, user_id, event_id=None, signature=None):
+        payload = json.dumps({
+            "event": "payment.captured",
+            "payload": {"payment": {"entity": {"subscription_id": "sub_9", "notes": {"user_id": user_id}}}},
+        }).encode("utf-8")
+        if signature is None:
+            signature = hmac.new(settings.RAZORPAY_WEBHOOK_SECRET.encode("utf-8"), payload, hashlib.sha256).hexdigest()
+        headers = {"HTTP_X_RAZORPAY_SIGNATURE": signature}
+        if event_id:
+            headers["HTTP_X_RAZORPAY_EVENT_ID"] = event_id
+        return self.client.post("/verification/", payload, content_type="application/json", **headers)
+
+    def test_new_user_is_upserted_once(self):
+        self.assertEqual(self.deliver(40, "evt_1").json()["status"], "success")
+        sub = UserSubscription.objects.get(user_id=40)
+        self.assertEqual((sub.status, sub.subscription_id), ("active", "sub_9"))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.deliver(40, "evt_1").json()["status"], "duplicate")
+
+    def test_payload_digest_dedupes_without_event_id(self):
+        self.deliver(41)
+        self.assertEqual(self.deliver(41).json()["status"], "duplicate")
+
+    def test_bad_or_missing_signature(self):
+        self.assertEqual(self.deliver(42, signature="nope").status_code, 400)
+        self.assertEqual(self.deliver(42, signature="").status_code, 400)
+        self.assertFalse(UserSubscription.objects.filter(user_id=42).exists())
@@ -1,24 +1,50 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
+    AsyncCheckAccessView,
+    AsyncCrawlView,
+    AsyncCreateSubscriptionView,
+    AsyncSubscriptionManagementView,
+    AsyncSubscriptionStatusView,
     CreateSubscriptionView,
     RazorpayWebhookView,
     SubscriptionStatusView,
     CheckAccessView,
     CrawlView,
+    CrawlSearchView,
+    BatchCrawlView,
+    CrawlJobSubmitView,
+    CrawlJobDetailView,
+    CrawlJobCancelView,
+    CrawlJobExportView,
+    MetricsView,
     CreateRazorpayOrderView,
     CreateSubscriptionView,
     SubscriptionManagementView
 )
 
+
+def sync_or_async(sync_view, async_view):
+    """Serves the async twin of an I/O-bound view when running under ASGI (settings.ASYNC_VIEWS)."""
+    return (async_view if settings.ASYNC_VIEWS else sync_view).as_view()
+
+
 urlpatterns = [
-    path('api/subscription/create/', CreateSubscriptionView.as_view(), name='create-subscription'),
-    path('api/subscription/status/<int:user_id>/', SubscriptionStatusView.as_view(), name='subscription-status'),
+    path('api/subscription/create/', sync_or_async(CreateSubscriptionView, AsyncCreateSubscriptionView), name='create-subscription'),
+    path('api/subscription/status/<int:user_id>/', sync_or_async(SubscriptionStatusView, AsyncSubscriptionStatusView), name='subscription-status'),
     path('verification/', RazorpayWebhookView.as_view(), name='razorpay-webhook'),
     
     # Keep your existing URLs
-    path('api/crawl/check-access/', CheckAccessView.as_view(), name='check-access'),
-    path('api/crawl/', CrawlView.as_view(), name='crawl'),
+    path('api/crawl/check-access/', sync_or_async(CheckAccessView, AsyncCheckAccessView), name='check-access'),
+    path('api/crawl/', sync_or_async(CrawlView, AsyncCrawlView), name='crawl'),
+    path('api/crawl/search/', CrawlSearchView.as_view(), name='crawl-search'),
+    path('api/crawl/batch/', BatchCrawlView.as_view(), name='crawl-batch'),
+    path('api/crawl/jobs/', CrawlJobSubmitView.as_view(), name='crawl-job-submit'),
+    path('api/crawl/jobs/<uuid:job_id>/', CrawlJobDetailView.as_view(), name='crawl-job-detail'),
+    path('api/crawl/jobs/<uuid:job_id>/cancel/', CrawlJobCancelView.as_view(), name='crawl-job-cancel'),
+    path('api/crawl/jobs/<uuid:job_id>/export/', CrawlJobExportView.as_view(), name='crawl-job-export'),
     path('api/crawl/create-order/', CreateRazorpayOrderView.as_view(), name='create-order'),
-    path('api/crawl/verify-payment/', CreateSubscriptionView.as_view(), name='verify-payment'),
-    path('api/crawl/subscription/<int:user_id>/', SubscriptionManagementView.as_view(), name='subscription-management'),
+    path('api/crawl/verify-payment/', sync_or_async(CreateSubscriptionView, AsyncCreateSubscriptionView), name='verify-payment'),
+    path('api/crawl/subscription/<int:user_id>/', sync_or_async(SubscriptionManagementView, AsyncSubscriptionManagementView), name='subscription-management'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
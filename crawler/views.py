@@ -1,32 +1,66 @@
 from decimal import Decimal
-import razorpay
 import json
 import logging
-import requests
 import hashlib
 import hmac
+import math
+import os
+import threading
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from django.conf import settings
+from django.db import transaction
 from rest_framework.views import APIView
 
-from .models import UserSubscription
-from .scraper import scrape_page_content, search_web
+from .exports import EXPORT_FORMATS, export_name, export_path, export_response, write_export
+from .entitlements import (
+    aget_entitlement, get_entitlement, invalidate_entitlement, remember_subscription, trial_expired,
+)
+from .metrics import render_metrics
+from .models import CrawlJob, UserSubscription
+from .result_store import RESULT_WRITER
+from .search_index import SEARCH_DEFAULT_LIMIT, search_pages
+from .webhook_ledger import DUPLICATE, IN_PROGRESS, begin_event, fail_event, finish_event
+
+# The crawl stack (scraper, batch, jobs, dedup) and the Razorpay SDK are imported by the
+# views that use them, so subscription and access-check requests on a cold start don't load them.
 
 logger = logging.getLogger(__name__)
 
+TRIAL_SEARCH_RESULTS = 20
+FULL_SEARCH_RESULTS = 100
+
 # -------------------------------
 # ✅ Razorpay Service
 # -------------------------------
+class LazyRazorpayClient:
+    """Class attribute that imports the Razorpay SDK and builds its client on first access."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __get__(self, instance, owner):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import razorpay
+                    self._client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+        return self._client
+
+
 class RazorpayService:
-    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+    client = LazyRazorpayClient()
 
     @staticmethod
     def verify_payment(payment_id, order_id, signature):
+        from razorpay.errors import SignatureVerificationError
+
         try:
             params_dict = {
                 'razorpay_order_id': order_id,
@@ -35,7 +69,7 @@ class RazorpayService:
             }
             RazorpayService.client.utility.verify_payment_signature(params_dict)
             return True
-        except razorpay.errors.SignatureVerificationError:
+        except SignatureVerificationError:
             return False
 
     @staticmethod
@@ -62,12 +96,15 @@ class RazorpayService:
 class RazorpayWebhookView(View):
     def post(self, request, *args, **kwargs):
         try:
-            payload = request.body.decode('utf-8')
+            # Sign the raw bytes exactly as Razorpay sent them
+            payload = request.body
             received_signature = request.headers.get('X-Razorpay-Signature')
-            
+            if not received_signature:
+                return JsonResponse({'status': 'error', 'message': 'Missing signature'}, status=400)
+
             expected_signature = hmac.new(
                 key=settings.RAZORPAY_WEBHOOK_SECRET.encode('utf-8'),
-                msg=payload.encode('utf-8'),
+                msg=payload,
                 digestmod=hashlib.sha256
             ).hexdigest()
 
@@ -76,40 +113,82 @@ class RazorpayWebhookView(View):
                 return JsonResponse({'status': 'error', 'message': 'Invalid signature'}, status=400)
 
             event = json.loads(payload)
-            logger.info(f"Webhook event: {event.get('event')}")
-
-            # Handle subscription events
-            if event.get('event') in ['subscription.charged', 'payment.captured']:
-                payment = event.get('payload', {}).get('payment', {}).get('entity', {})
-                subscription_id = payment.get('subscription_id')
-                user_id = payment.get('notes', {}).get('user_id')
-                
-                if user_id and subscription_id:
-                    try:
-                        user_sub = UserSubscription.objects.get(user_id=user_id)
-                        user_sub.status = 'active'
-                        user_sub.subscription_id = subscription_id
-                        user_sub.save()
-                        logger.info(f"Subscription activated for user {user_id}")
-                    except UserSubscription.DoesNotExist:
-                        logger.error(f"User subscription not found for user_id: {user_id}")
-                        # Create new subscription if not exists
-                        UserSubscription.objects.create(
-                            user_id=user_id,
-                            status='active',
-                            subscription_id=subscription_id,
-                            trial_end=timezone.now() + timezone.timedelta(days=365)
-                        )
-            
+            event_type = event.get('event', '')
+            logger.info(f"Webhook event: {event_type}")
+
+            # Retried deliveries reuse X-Razorpay-Event-Id; fall back to the payload digest
+            event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(payload).hexdigest()
+            ledger_event, state = begin_event('razorpay', event_id, event_type)
+            if state == DUPLICATE:
+                return JsonResponse({'status': 'duplicate'})
+            if state == IN_PROGRESS:
+                return JsonResponse({'status': 'error', 'message': 'Event is being processed'}, status=409)
+
+            try:
+                with transaction.atomic():
+                    user_id = self.apply_event(event_type, event)
+                    finish_event(ledger_event)
+            except Exception:
+                fail_event(ledger_event)
+                raise
+
+            invalidate_entitlement(user_id)
             return JsonResponse({'status': 'success'})
             
         except Exception as e:
             logger.error(f"Webhook processing error: {str(e)}")
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
+    @staticmethod
+    def apply_event(event_type, event):
+        """Upserts the subscription a payment event refers to; returns the user_id it touched."""
+        # Handle subscription events
+        if event_type not in ['subscription.charged', 'payment.captured']:
+            return None
+
+        payment = event.get('payload', {}).get('payment', {}).get('entity', {})
+        subscription_id = payment.get('subscription_id')
+        user_id = payment.get('notes', {}).get('user_id')
+        if not (user_id and subscription_id):
+            return None
+
+        _, created = UserSubscription.objects.update_or_create(
+            user_id=user_id,
+            defaults={'status': 'active', 'subscription_id': subscription_id},
+            create_defaults={
+                'status': 'active',
+                'subscription_id': subscription_id,
+                'trial_end': timezone.now() + timezone.timedelta(days=365)
+            }
+        )
+        if created:
+            logger.info(f"Created active subscription for new user {user_id}")
+        else:
+            logger.info(f"Subscription activated for user {user_id}")
+        return user_id
+
 # -------------------------------
 # ✅ Subscription Views
 # -------------------------------
+def subscription_created_response(subscription):
+    return JsonResponse({
+        'success': True,
+        'subscription_id': subscription.get('id'),
+        'status': subscription.get('status'),
+        'subscription_link': settings.RAZORPAY_SUBSCRIPTION_LINK,
+        'redirect_url': f"{settings.RAZORPAY_SUBSCRIPTION_LINK}?subscription_id={subscription.get('id')}"
+    })
+
+def subscription_status_response(sub):
+    if sub is None:
+        return JsonResponse({'error': 'No subscription found'}, status=404)
+    return JsonResponse({
+        'status': sub.status,
+        'subscription_id': sub.subscription_id,
+        'is_active': sub.is_valid(),
+        'trial_end': sub.trial_end.isoformat() if sub.trial_end else None
+    })
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CreateSubscriptionView(APIView):
     def post(self, request, *args, **kwargs):
@@ -122,14 +201,7 @@ class CreateSubscriptionView(APIView):
                 return JsonResponse({'success': False, 'message': 'User ID required'}, status=400)
 
             subscription = RazorpayService.create_subscription(user_id, email)
-            
-            return JsonResponse({
-                'success': True,
-                'subscription_id': subscription.get('id'),
-                'status': subscription.get('status'),
-                'subscription_link': settings.RAZORPAY_SUBSCRIPTION_LINK,
-                'redirect_url': f"{settings.RAZORPAY_SUBSCRIPTION_LINK}?subscription_id={subscription.get('id')}"
-            })
+            return subscription_created_response(subscription)
 
         except Exception as e:
             logger.error(f"Subscription error: {str(e)}")
@@ -138,22 +210,41 @@ class CreateSubscriptionView(APIView):
 @method_decorator(csrf_exempt, name='dispatch')
 class SubscriptionStatusView(APIView):
     def get(self, request, user_id):
-        try:
-            sub = UserSubscription.objects.get(user_id=user_id)
-            return JsonResponse({
-                'status': sub.status,
-                'subscription_id': sub.subscription_id,
-                'is_active': sub.is_valid(),
-                'trial_end': sub.trial_end.isoformat() if sub.trial_end else None
-            })
-        except UserSubscription.DoesNotExist:
-            return JsonResponse({'error': 'No subscription found'}, status=404)
+        return subscription_status_response(get_entitlement(user_id))
 
 # ... [Keep all your existing views like CheckAccessView, CrawlView, etc.] ...
 
 # -------------------------------
 # ✅ Check Access View (Updated)
 # -------------------------------
+def new_trial_defaults():
+    # Set default trial_end for new users
+    return {'status': 'trial', 'trial_end': timezone.now() + timezone.timedelta(days=3)}
+
+def access_response(user_sub):
+    # Check if trial has expired (the expire_trials sweeper persists it in bulk)
+    if trial_expired(user_sub):
+        return JsonResponse({
+            'access': False,
+            'is_trial': False,
+            'reason': 'trial_expired',
+            'message': 'Your trial has expired. Please subscribe to continue.'
+        })
+
+    if user_sub.is_valid():
+        return JsonResponse({
+            'access': True,
+            'is_trial': user_sub.status == 'trial',
+            'trial_ends': user_sub.trial_end.isoformat() if user_sub.status == 'trial' else None,
+            'status': user_sub.status
+        })
+
+    return JsonResponse({
+        'access': False,
+        'reason': 'subscription_required',
+        'message': 'Please subscribe to access Odin Crawler'
+    })
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CheckAccessView(View):
     def get(self, request, *args, **kwargs):
@@ -163,39 +254,14 @@ class CheckAccessView(View):
             return JsonResponse({'access': False, 'reason': 'Invalid user_id'}, status=400)
 
         try:
-            # Set default trial_end for new users
-            user_sub, created = UserSubscription.objects.get_or_create(
-                user_id=user_id,
-                defaults={
-                    'status': 'trial',
-                    'trial_end': timezone.now() + timezone.timedelta(days=3)
-                }
-            )
-
-            # Check if trial has expired
-            if user_sub.status == 'trial' and user_sub.trial_end < timezone.now():
-                user_sub.status = 'expired'
-                user_sub.save()
-                return JsonResponse({
-                    'access': False,
-                    'is_trial': False,
-                    'reason': 'trial_expired',
-                    'message': 'Your trial has expired. Please subscribe to continue.'
-                })
-
-            if user_sub.is_valid():
-                return JsonResponse({
-                    'access': True,
-                    'is_trial': user_sub.status == 'trial',
-                    'trial_ends': user_sub.trial_end.isoformat() if user_sub.status == 'trial' else None,
-                    'status': user_sub.status
-                })
-
-            return JsonResponse({
-                'access': False,
-                'reason': 'subscription_required',
-                'message': 'Please subscribe to access Odin Crawler'
-            })
+            # Answer from the entitlement cache; only unknown users touch the database
+            user_sub = get_entitlement(user_id)
+            if user_sub is None:
+                user_sub, created = UserSubscription.objects.get_or_create(
+                    user_id=user_id, defaults=new_trial_defaults()
+                )
+                user_sub = remember_subscription(user_sub)
+            return access_response(user_sub)
 
         except Exception as e:
             logger.error(f"Error in CheckAccessView: {str(e)}")
@@ -203,80 +269,132 @@ class CheckAccessView(View):
 # -------------------------------
 # ✅ Subscription Management View
 # -------------------------------
+def subscription_management_response(sub):
+    if sub is None:
+        return JsonResponse({'error': 'No subscription found'}, status=404)
+    return JsonResponse({
+        'status': sub.status,
+        'plan': 'premium',
+        'start_date': sub.created_at.isoformat(),
+        'trial_end': sub.trial_end.isoformat() if sub.status == 'trial' else None,
+        'is_active': sub.is_valid()
+    })
+
 @method_decorator(csrf_exempt, name='dispatch')
 class SubscriptionManagementView(APIView):
     def get(self, request, user_id):
-        try:
-            sub = UserSubscription.objects.get(user_id=user_id)
-            return JsonResponse({
-                'status': sub.status,
-                'plan': 'premium',
-                'start_date': sub.created_at.isoformat(),
-                'trial_end': sub.trial_end.isoformat() if sub.status == 'trial' else None,
-                'is_active': sub.is_valid()
-            })
-        except UserSubscription.DoesNotExist:
-            return JsonResponse({'error': 'No subscription found'}, status=404)
+        return subscription_management_response(get_entitlement(user_id))
 
 # -------------------------------
 # ✅ CrawlView with Trial Enforcement
 # -------------------------------
+def crawl_subscription_check(user_sub):
+    """Returns (user_sub, None) for a user allowed to crawl, else (None, error response)."""
+    if user_sub is None:
+        return None, JsonResponse({"status": "error", "error": "User not registered"}, status=400)
+
+    if not user_sub.is_valid():
+        return None, JsonResponse({
+            "status": "error",
+            "error": "Trial expired or no valid subscription.",
+            "requires_payment": True
+        }, status=403)
+    return user_sub, None
+
+def parse_user_id(user_id):
+    """Returns (user_id as int, None), or (None, 400 response) when it is missing or not an integer."""
+    if user_id in (None, ""):
+        return None, JsonResponse({"status": "error", "error": "Missing user_id"}, status=400)
+    try:
+        return int(user_id), None
+    except (TypeError, ValueError):
+        return None, JsonResponse({"status": "error", "error": "user_id must be an integer"}, status=400)
+
+def json_object_missing():
+    return JsonResponse({"status": "error", "error": "Request body must be a JSON object"}, status=400)
+
+def get_crawl_subscription(user_id):
+    return crawl_subscription_check(get_entitlement(user_id))
+
+async def aget_crawl_subscription(user_id):
+    return crawl_subscription_check(await aget_entitlement(user_id))
+
+def search_limit(user_sub):
+    # Apply limits based on subscription status
+    return TRIAL_SEARCH_RESULTS if user_sub.status == 'trial' else FULL_SEARCH_RESULTS
+
+def crawl_response(title, extracted_data):
+    if not extracted_data:
+        return JsonResponse({
+            "status": "error", 
+            "error": "No data extracted."
+        }, status=400)
+
+    return JsonResponse({
+        "status": "success", 
+        "title": title, 
+        **extracted_data
+    }, status=200)
+
+def quota_exceeded_response(error):
+    """429 telling the client which quota ran out and when to retry."""
+    retry_after = max(1, math.ceil(error.retry_after)) if error.retry_after else None
+    response = JsonResponse({
+        "status": "error",
+        "error": str(error),
+        "quota": error.kind,
+        "retry_after": retry_after
+    }, status=429)
+    if retry_after:
+        response["Retry-After"] = str(retry_after)
+    return response
+
+def crawl_target_missing():
+    return JsonResponse({
+        "status": "error", 
+        "error": "Please provide a keyword or URL."
+    }, status=400)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CrawlView(View):
     def post(self, request, *args, **kwargs):
+        from .quotas import QuotaExceeded, UserQuota
+        from .scraper import scrape_page_content, search_web
+
         try:
             data = json.loads(request.body.decode("utf-8"))
             user_id = data.get("user_id")
             if not user_id:
                 return JsonResponse({"status": "error", "error": "Missing user_id"}, status=400)
 
-            try:
-                user_sub = UserSubscription.objects.get(user_id=int(user_id))
-            except UserSubscription.DoesNotExist:
-                return JsonResponse({"status": "error", "error": "User not registered"}, status=400)
-            
-            if not user_sub.is_valid():
-                return JsonResponse({
-                    "status": "error", 
-                    "error": "Trial expired or no valid subscription.",
-                    "requires_payment": True
-                }, status=403)
+            user_sub, error_response = get_crawl_subscription(user_id)
+            if error_response:
+                return error_response
 
+            quota = UserQuota(user_sub.user_id, user_sub.status)
             if "keyword" in data and data["keyword"].strip():
                 keyword = data["keyword"].strip()
-                links = search_web(keyword)
-
-                # Apply limits based on subscription status
-                if user_sub.status == 'trial':
-                    extracted_data = {"links": links[:20]}  # Trial limit
-                else:
-                    extracted_data = {"links": links}       # Full access
+                quota.admit()
+                extracted_data = {"links": search_web(keyword, search_limit(user_sub))}
 
                 title = f"Results for keyword: {keyword}"
 
             elif "url" in data and data["url"].strip():
                 url = data["url"].strip()
-                extracted_data = scrape_page_content(url)
+                quota.admit()
+                with quota.activate():
+                    extracted_data = scrape_page_content(url)
+                RESULT_WRITER.flush_if_due()
                 title = f"Results for URL: {url}"
 
             else:
-                return JsonResponse({
-                    "status": "error", 
-                    "error": "Please provide a keyword or URL."
-                }, status=400)
-
-            if not extracted_data:
-                return JsonResponse({
-                    "status": "error", 
-                    "error": "No data extracted."
-                }, status=400)
+                return crawl_target_missing()
 
-            return JsonResponse({
-                "status": "success", 
-                "title": title, 
-                **extracted_data
-            }, status=200)
+            quota.meter.flush_if_due()
+            return crawl_response(title, extracted_data)
 
+        except QuotaExceeded as e:
+            return quota_exceeded_response(e)
         except json.JSONDecodeError as e:
             logger.error("JSON Decode Error: %s", str(e))
             return JsonResponse({
@@ -290,6 +408,182 @@ class CrawlView(View):
                 "error": str(e)
             }, status=500)
         
+# -------------------------------
+# ✅ Search Crawled Pages (full-text)
+# -------------------------------
+@method_decorator(csrf_exempt, name='dispatch')
+class CrawlSearchView(View):
+    def get(self, request, *args, **kwargs):
+        user_id, error_response = parse_user_id(request.GET.get('user_id'))
+        if error_response:
+            return error_response
+
+        _, error_response = get_crawl_subscription(user_id)
+        if error_response:
+            return error_response
+
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({"status": "error", "error": "Missing search query 'q'"}, status=400)
+        try:
+            limit = int(request.GET.get('limit', SEARCH_DEFAULT_LIMIT))
+            offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            return JsonResponse({"status": "error", "error": "limit and offset must be integers"}, status=400)
+
+        results = search_pages(query, limit=limit, offset=offset)
+        return JsonResponse({"status": "success", "query": query, "count": len(results), "results": results})
+
+# -------------------------------
+# ✅ Batch Crawl View (NDJSON stream)
+# -------------------------------
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchCrawlView(View):
+    def post(self, request, *args, **kwargs):
+        from .batch import DEFAULT_BATCH_CONCURRENCY, ndjson_lines, parse_batch_items, run_batch
+        from .dedup import parse_dedupe
+        from .quotas import QuotaExceeded, UserQuota
+
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except json.JSONDecodeError as e:
+            logger.error("JSON Decode Error: %s", str(e))
+            return JsonResponse({"status": "error", "error": "Invalid JSON format"}, status=400)
+        if not isinstance(data, dict):
+            return json_object_missing()
+
+        user_id, error_response = parse_user_id(data.get("user_id"))
+        if error_response:
+            return error_response
+
+        user_sub, error_response = get_crawl_subscription(user_id)
+        if error_response:
+            return error_response
+
+        try:
+            items = parse_batch_items(data)
+            concurrency = int(data.get("concurrency", DEFAULT_BATCH_CONCURRENCY))
+            dedupe = parse_dedupe(data.get("dedupe"))
+        except (TypeError, ValueError) as e:
+            return JsonResponse({"status": "error", "error": str(e)}, status=400)
+
+        quota = UserQuota(user_sub.user_id, user_sub.status)
+        try:
+            quota.check()
+        except QuotaExceeded as e:
+            return quota_exceeded_response(e)
+
+        search_results = search_limit(user_sub)
+        results = run_batch(items, concurrency=concurrency, search_results=search_results, dedupe=dedupe, quota=quota)
+        response = StreamingHttpResponse(ndjson_lines(results), content_type="application/x-ndjson")
+        response["X-Accel-Buffering"] = "no"  # Let proxies flush each line as it arrives
+        return response
+
+# -------------------------------
+# ✅ Background Crawl Jobs
+# -------------------------------
+def get_user_job(job_id, user_id):
+    try:
+        return CrawlJob.objects.get(pk=job_id, user_id=int(user_id))
+    except (CrawlJob.DoesNotExist, TypeError, ValueError):
+        return None
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CrawlJobSubmitView(View):
+    def post(self, request, *args, **kwargs):
+        from .batch import DEFAULT_BATCH_CONCURRENCY, parse_batch_items
+        from .dedup import parse_dedupe
+        from .jobs import submit_job
+        from .quotas import QuotaExceeded, UserQuota
+
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except json.JSONDecodeError as e:
+            logger.error("JSON Decode Error: %s", str(e))
+            return JsonResponse({"status": "error", "error": "Invalid JSON format"}, status=400)
+        if not isinstance(data, dict):
+            return json_object_missing()
+
+        user_id, error_response = parse_user_id(data.get("user_id"))
+        if error_response:
+            return error_response
+
+        user_sub, error_response = get_crawl_subscription(user_id)
+        if error_response:
+            return error_response
+
+        # Single url/keyword submissions are queued as one-item batches
+        for single, field in (("url", "urls"), ("keyword", "keywords")):
+            if isinstance(data.get(single), str) and data[single].strip():
+                data[field] = list(data.get(field) or []) + [data[single]]
+
+        try:
+            items = parse_batch_items(data)
+            concurrency = int(data.get("concurrency", DEFAULT_BATCH_CONCURRENCY))
+            dedupe = parse_dedupe(data.get("dedupe"))
+        except (TypeError, ValueError) as e:
+            return JsonResponse({"status": "error", "error": str(e)}, status=400)
+
+        try:
+            UserQuota(user_sub.user_id, user_sub.status).check()
+        except QuotaExceeded as e:
+            return quota_exceeded_response(e)
+
+        search_results = search_limit(user_sub)
+        job = submit_job(
+            user_sub.user_id, items, search_results=search_results, concurrency=concurrency, dedupe=dedupe,
+            plan=user_sub.status,
+        )
+        return JsonResponse({"status": "success", **job.as_dict(include_result=False)}, status=202)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CrawlJobDetailView(View):
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_user_job(job_id, request.GET.get('user_id'))
+        if job is None:
+            return JsonResponse({"status": "error", "error": "Job not found"}, status=404)
+        return JsonResponse(job.as_dict())
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CrawlJobCancelView(View):
+    def post(self, request, job_id, *args, **kwargs):
+        from .jobs import cancel_job
+
+        try:
+            data = json.loads(request.body.decode("utf-8") or "{}")
+        except json.JSONDecodeError:
+            return JsonResponse({"status": "error", "error": "Invalid JSON format"}, status=400)
+
+        job = get_user_job(job_id, data.get('user_id'))
+        if job is None:
+            return JsonResponse({"status": "error", "error": "Job not found"}, status=404)
+        if job.status in CrawlJob.FINISHED_STATUSES:
+            return JsonResponse({"status": "error", "error": f"Job already {job.status}"}, status=409)
+
+        job = cancel_job(job)
+        return JsonResponse(job.as_dict(include_result=False))
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CrawlJobExportView(View):
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_user_job(job_id, request.GET.get('user_id'))
+        if job is None:
+            return JsonResponse({"status": "error", "error": "Job not found"}, status=404)
+        if job.status != CrawlJob.SUCCEEDED:
+            return JsonResponse({"status": "error", "error": f"Job is {job.status}"}, status=409)
+
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return JsonResponse({"status": "error", "error": f"Unsupported format: {fmt}"}, status=400)
+        compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        # Each job/format pair is written once and then served from disk until it expires
+        name = export_name(job.id.hex, fmt, compress)
+        path = export_path(name)
+        if not os.path.exists(path):
+            write_export((job.result or {}).get("results", []), fmt, compress, export_id=job.id.hex)
+        return export_response(request, path, name)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CreateRazorpayOrderView(APIView):
     def post(self, request, *args, **kwargs):
@@ -321,4 +615,116 @@ class CreateRazorpayOrderView(APIView):
 
         except Exception as e:
             logger.error(f"Order creation error: {str(e)}")
-            return JsonResponse({'success': False, 'message': str(e)}, status=500)        
\ No newline at end of file
+            return JsonResponse({'success': False, 'message': str(e)}, status=500)        
+
+# -------------------------------
+# ✅ Prometheus Metrics
+# -------------------------------
+class MetricsView(View):
+    """Serves crawler timings and counters, summed across all worker processes."""
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# -------------------------------
+# ✅ Async Views (ASGI)
+# -------------------------------
+# Served instead of their sync twins when settings.ASYNC_VIEWS is on (asgi.py turns it on).
+# Network waits happen on the event loop; only blocking libraries (Razorpay, DuckDuckGo,
+# Selenium) and database writes are handed to threads.
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCreateSubscriptionView(View):
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+            user_id = data.get("user_id")
+            email = data.get("email", "user@odin.com")
+
+            if not user_id:
+                return JsonResponse({'success': False, 'message': 'User ID required'}, status=400)
+
+            create = sync_to_async(RazorpayService.create_subscription, thread_sensitive=False)
+            return subscription_created_response(await create(user_id, email))
+
+        except Exception as e:
+            logger.error(f"Subscription error: {str(e)}")
+            return JsonResponse({'success': False, 'message': str(e)}, status=500)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSubscriptionStatusView(View):
+    async def get(self, request, user_id):
+        return subscription_status_response(await aget_entitlement(user_id))
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSubscriptionManagementView(View):
+    async def get(self, request, user_id):
+        return subscription_management_response(await aget_entitlement(user_id))
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCheckAccessView(View):
+    async def get(self, request, *args, **kwargs):
+        try:
+            user_id = int(request.GET.get('user_id'))
+        except (TypeError, ValueError):
+            return JsonResponse({'access': False, 'reason': 'Invalid user_id'}, status=400)
+
+        try:
+            user_sub = await aget_entitlement(user_id)
+            if user_sub is None:
+                user_sub, created = await UserSubscription.objects.aget_or_create(
+                    user_id=user_id, defaults=new_trial_defaults()
+                )
+                user_sub = remember_subscription(user_sub)
+            return access_response(user_sub)
+
+        except Exception as e:
+            logger.error(f"Error in AsyncCheckAccessView: {str(e)}")
+            return JsonResponse({'access': False, 'reason': 'internal_error'}, status=500)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCrawlView(View):
+    async def post(self, request, *args, **kwargs):
+        from .quotas import QuotaExceeded, UserQuota
+        from .scraper import ascrape_page_content, asearch_web
+
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+            user_id = data.get("user_id")
+            if not user_id:
+                return JsonResponse({"status": "error", "error": "Missing user_id"}, status=400)
+
+            user_sub, error_response = await aget_crawl_subscription(user_id)
+            if error_response:
+                return error_response
+
+            quota = UserQuota(user_sub.user_id, user_sub.status)
+            if "keyword" in data and data["keyword"].strip():
+                keyword = data["keyword"].strip()
+                await sync_to_async(quota.admit)()
+                extracted_data = {"links": await asearch_web(keyword, search_limit(user_sub))}
+                title = f"Results for keyword: {keyword}"
+
+            elif "url" in data and data["url"].strip():
+                url = data["url"].strip()
+                await sync_to_async(quota.admit)()
+                with quota.activate():
+                    extracted_data = await ascrape_page_content(url)
+                if RESULT_WRITER.due():
+                    await sync_to_async(RESULT_WRITER.flush)()
+                title = f"Results for URL: {url}"
+
+            else:
+                return crawl_target_missing()
+
+            if quota.meter.due():
+                await sync_to_async(quota.meter.flush)()
+            return crawl_response(title, extracted_data)
+
+        except QuotaExceeded as e:
+            return quota_exceeded_response(e)
+        except json.JSONDecodeError as e:
+            logger.error("JSON Decode Error: %s", str(e))
+            return JsonResponse({"status": "error", "error": "Invalid JSON format"}, status=400)
+        except Exception as e:
+            logger.error("Unexpected Error: %s", str(e))
+            return JsonResponse({"status": "error", "error": str(e)}, status=500)
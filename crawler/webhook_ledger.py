@@ -0,0 +1,48 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+# A delivery stuck in "processing" this long is assumed to have died mid-way
+LEDGER_STALE_AFTER = timezone.timedelta(minutes=5)
+
+NEW = 'new'
+DUPLICATE = 'duplicate'
+IN_PROGRESS = 'in_progress'
+
+
+def begin_event(provider, event_id, event_type=''):
+    """Claims an event id in the ledger; returns (event, NEW | DUPLICATE | IN_PROGRESS)."""
+    # Retries are the common case during bursts, so look before inserting
+    event = WebhookEvent.objects.filter(provider=provider, event_id=event_id).first()
+    if event is None:
+        try:
+            with transaction.atomic():
+                event = WebhookEvent.objects.create(provider=provider, event_id=event_id, event_type=event_type)
+            return event, NEW
+        except IntegrityError:
+            event = WebhookEvent.objects.get(provider=provider, event_id=event_id)
+
+    if event.status == WebhookEvent.PROCESSED:
+        return event, DUPLICATE
+
+    # Retry a failed delivery, or take over one whose handler died
+    stale_before = timezone.now() - LEDGER_STALE_AFTER
+    claimable = WebhookEvent.objects.filter(pk=event.pk).exclude(status=WebhookEvent.PROCESSED)
+    if event.status == WebhookEvent.PROCESSING:
+        claimable = claimable.filter(updated_at__lt=stale_before)
+    if claimable.update(status=WebhookEvent.PROCESSING, updated_at=timezone.now()):
+        return event, NEW
+    return event, IN_PROGRESS
+
+
+def finish_event(event):
+    WebhookEvent.objects.filter(pk=event.pk).update(status=WebhookEvent.PROCESSED, updated_at=timezone.now())
+
+
+def fail_event(event):
+    WebhookEvent.objects.filter(pk=event.pk).update(status=WebhookEvent.FAILED, updated_at=timezone.now())
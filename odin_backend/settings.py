@@ -24,9 +24,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crawler.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'crawler.middleware.StaticFilesMiddleware',  # WhiteNoise, usable from async views
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -37,6 +38,13 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'odin_backend.urls'
 
+# Route crawl, access and subscription endpoints to their async views; asgi.py turns this on
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# crawl_worker launches a headless browser at boot so its first render doesn't pay for it. Web processes
+# never do: they start browsers lazily on the first render, keeping selenium off the cold-start path.
+BROWSER_WARM_ON_START = os.environ.get('BROWSER_WARM_ON_START', '1').lower() in ('1', 'true', 'yes')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -59,6 +67,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets readers run alongside the single writer; NORMAL sync is safe under WAL
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA busy_timeout=5000;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 